@@ -7,33 +7,52 @@ import os
 import flask
 
 # Globe Indexer
+from globe_indexer.api.asgi import AsgiApplication
 from globe_indexer.api.controllers import api as api_blueprint
-from globe_indexer.api.database import initialize_db
+from globe_indexer.api.startup import Startup
+from globe_indexer.error import GlobeIndexerError
 
 
 # Interface functions
 def create_app():
     app = flask.Flask(__name__, instance_relative_config=True)
-    app.config.from_object('config.BaseConfig')
+    app.config.from_object(os.getenv('GLOBE_INDEXER_CONFIG',
+                                     'config.BaseConfig'))
     if os.path.exists(os.path.join(app.instance_path, 'config.py')):
         app.config.from_pyfile('config.py')
     app.config.from_envvar('GLOBE_INDEXER_CONFIG_FILE', silent=True)
 
+    from globe_indexer.api.index import query_cache
     from globe_indexer.api.models import db
     db.init_app(app)
-
-    # Initialize database
-    with app.app_context():
-        db.create_all()
-        initialize_db(db, os.path.join(os.path.dirname(__file__), 'input',
-                                       'cities1000.txt'))
-
+    query_cache.init_app(app)
     app.register_blueprint(api_blueprint)
+
+    # Prepare the data once per host, then build or map the indexes
+    if app.config['SCALE_INDEX_PATH'] and not app.config['SNAPSHOT_PATH']:
+        raise GlobeIndexerError("the scale mode requires a snapshot path")
+    url = app.config['DATA_SET_URL']
+    fname = os.path.splitext(os.path.basename(url))[0] + '.txt'
+    startup = Startup(app, os.path.join(os.path.dirname(__file__), 'input',
+                                        fname))
+    mode = app.config['STARTUP_MODE']
+    if mode == 'background':
+        # Serve /health (and 503 elsewhere) while the data is prepared
+        startup.start()
+    elif mode == 'blocking':
+        startup.run()
+    else:
+        fstr = "unsupported startup mode: {}".format(mode)
+        raise GlobeIndexerError(fstr)
     return app
 
 
 # Create application
 application = create_app()
+# Async serving mode of the read only endpoints, e.g.
+# uvicorn application:asgi_application
+asgi_application = AsgiApplication(application,
+                                   workers=application.config['ASYNC_WORKERS'])
 
 
 @application.errorhandler(404)
@@ -0,0 +1,7 @@
+# Filename: __init__.py
+
+"""
+Globe Indexer Benchmarks
+
+Each module can be run on its own, e.g. ``python -m benchmarks.proximity``.
+"""
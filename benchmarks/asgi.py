@@ -0,0 +1,192 @@
+# Filename: asgi.py
+
+"""
+Load test of the async serving mode against the WSGI path.
+
+Sends requests to /<id>, /lexical and /proximity for a fixed duration at an
+increasing concurrency: from as many threads calling the WSGI application,
+and from as many coroutines calling :class:`api.asgi.AsgiApplication` on one
+event loop. The delay of a timer on the event loop shows whether the loop is
+kept free while the requests are handled. Both paths are driven in process,
+leaving out the HTTP server.
+"""
+
+# Standard libraries
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Werkzeug
+from werkzeug.test import EnvironBuilder
+
+# Globe Indexer
+from globe_indexer.api.asgi import AsgiApplication
+from globe_indexer.api.models import db
+from globe_indexer.api.query import city_query
+
+# Benchmarks
+from benchmarks.common import create_app, generate_geoname_file, print_table
+
+
+def percentile(timings, fraction):
+    """
+    Get a percentile of sorted timings
+
+    :param timings: sorted list of float - in seconds
+    :param fraction: float
+    :returns: float - in milliseconds
+    """
+    if not timings:
+        return 0.0
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)] * 1000
+
+
+def run_asgi(asgi, paths, concurrency, duration):
+    """
+    Send requests from many coroutines
+
+    :param asgi: instance of :class:`api.asgi.AsgiApplication`
+    :param paths: callable returning a random tuple (path, query string)
+    :param concurrency: int - number of coroutines sending requests
+    :param duration: float - seconds
+    :returns: tuple (sorted request timings, sorted delays of the timer)
+    """
+    timings = list()
+    delays = list()
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(_):
+        pass
+
+    async def client(seed, deadline):
+        generator = random.Random(seed)
+        while time.perf_counter() < deadline:
+            path, query_string = paths(generator)
+            scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET',
+                     'scheme': 'http', 'path': path, 'root_path': '',
+                     'query_string': query_string.encode(), 'headers': [],
+                     'client': ('127.0.0.1', 50000),
+                     'server': ('localhost', 8000)}
+            start = time.perf_counter()
+            await asgi(scope, receive, send)
+            timings.append(time.perf_counter() - start)
+
+    async def timer(deadline):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            delays.append(time.perf_counter() - start - 0.001)
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(timer(deadline),
+                             *[client(seed, deadline)
+                               for seed in range(concurrency)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    return sorted(timings), sorted(delays)
+
+
+def run_wsgi(app, paths, concurrency, duration):
+    """
+    Send requests from many threads
+
+    :param app: instance of :class:`flask.Flask`
+    :param paths: callable returning a random tuple (path, query string)
+    :param concurrency: int - number of threads sending requests
+    :param duration: float - seconds
+    :returns: sorted request timings
+    """
+    timings = list()
+    deadline = time.perf_counter() + duration
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def client(seed):
+        generator = random.Random(seed)
+        while time.perf_counter() < deadline:
+            path, query_string = paths(generator)
+            environ = EnvironBuilder(path=path,
+                                     query_string=query_string).get_environ()
+            start = time.perf_counter()
+            iterable = app(environ, start_response)
+            b''.join(iterable)
+            iterable.close()
+            timings.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(seed,))
+               for seed in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(timings)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=50000)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+    app.config['QUERY_CACHE_SIZE'] = 0
+    asgi = AsgiApplication(app)
+    asgi.startup()
+    with app.app_context():
+        names = [city.name.lower()
+                 for city in city_query(range(1, args.cities + 1, 97))]
+        db.session.remove()
+
+    endpoints = (
+        ('/<id>', lambda generator: (
+            '/{}'.format(generator.randint(1, args.cities)), '')),
+        ('/lexical', lambda generator: (
+            '/lexical', 'cityName={}'.format(generator.choice(names)))),
+        ('/proximity', lambda generator: (
+            '/proximity/{}'.format(generator.randint(1, args.cities)),
+            'k=10')),
+    )
+
+    rows = list()
+    for name, paths in endpoints:
+        for concurrency in args.concurrency:
+            wsgi = run_wsgi(app, paths, concurrency, args.duration)
+            timings, delays = run_asgi(asgi, paths, concurrency,
+                                       args.duration)
+            rows.append((
+                name, concurrency,
+                '{:.0f}'.format(len(wsgi) / args.duration),
+                '{:.2f}'.format(percentile(wsgi, 0.95)),
+                '{:.0f}'.format(len(timings) / args.duration),
+                '{:.2f}'.format(percentile(timings, 0.95)),
+                '{:.2f}'.format(percentile(delays, 0.99)),
+                '{:.2f}'.format(percentile(delays, 1.0))))
+
+    print_table(('endpoint', 'concurrency', 'WSGI req/s', 'WSGI p95 ms',
+                 'ASGI req/s', 'ASGI p95 ms', 'loop delay p99 ms',
+                 'loop delay max ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Filename: autocomplete.py
+
+"""
+Benchmark of the /autocomplete endpoint while typing a name one keystroke at
+a time, along with the memory held by the prefix index.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+
+# Globe Indexer
+from globe_indexer.api.index import prefix_index
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--word', default='Kolmar')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    client = app.test_client()
+    rows = list()
+    for length in range(1, len(args.word) + 1):
+        prefix = args.word[:length]
+        index = measure(lambda: prefix_index.search(prefix, 10), args.repeat)
+        endpoint = measure(
+            lambda: client.get('/autocomplete?prefix={}'.format(prefix)),
+            args.repeat)
+        rows.append((prefix, '{:.3f}'.format(index),
+                     '{:.3f}'.format(endpoint)))
+    print_table(('prefix', 'index ms', 'endpoint ms'), rows)
+
+    usage = prefix_index.memory_usage()
+    print()
+    print('{} indexed names, {:.1f} MB, {:.1f} bytes per name'.format(
+        usage['names'], usage['bytes'] / 2 ** 20, usage['bytes_per_name']))
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Filename: batch.py
+
+"""
+Benchmark of batch proximity search for an increasing number of origins.
+
+Compares one /proximity request per origin against a single request to
+/batch/proximity, and reports the amortized cost per origin.
+"""
+
+# Standard libraries
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# Benchmarks
+from benchmarks.common import create_app, generate_geoname_file, print_table
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    generator = random.Random(0)
+    client = app.test_client()
+    rows = list()
+    with app.app_context():
+        for count in (10, 100, 1000):
+            ids = [generator.randint(1, args.cities) for _ in range(count)]
+            start = time.perf_counter()
+            for geoname_id in ids:
+                client.get('/proximity/{}?k={}'.format(geoname_id, args.k))
+            single = (time.perf_counter() - start) * 1000 / count
+
+            start = time.perf_counter()
+            client.post('/batch/proximity',
+                        json={'origins': ids, 'k': args.k})
+            batch = (time.perf_counter() - start) * 1000 / count
+            rows.append((count, '{:.3f}'.format(single),
+                         '{:.3f}'.format(batch),
+                         '{:.1f}x'.format(single / batch)))
+
+    print_table(('origins', 'single ms/origin', 'batch ms/origin',
+                 'speedup'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Filename: common.py
+
+"""
+Globe Indexer Benchmark Helper Module
+
+Interface functions:
+    create_app
+    generate_geoname_file
+    measure
+    print_table
+"""
+
+# Standard libraries
+import datetime
+import os
+import random
+import string
+import time
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.controllers import api as api_blueprint
+from globe_indexer.api.models import db
+
+
+# Constants
+COUNTRY_CODES = ('AD', 'DE', 'FI', 'FR', 'ID', 'IN', 'JP', 'US')
+
+
+# Interface functions
+def create_app(fpath, database_uri='sqlite:///:memory:'):
+    """
+    Create the application and load the content of the file into the database
+
+    :param fpath: string - path to the GeoNames formatted file
+    :param database_uri: string
+    :returns: instance of :class:`flask.Flask`
+    """
+    app = flask.Flask(__name__)
+    app.config.from_object('config.TestConfig')
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.register_blueprint(api_blueprint)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        database.initialize_db(db, fpath)
+    return app
+
+
+def generate_geoname_file(fpath, count, seed=0):
+    """
+    Write synthetic cities in the GeoNames table format
+
+    :param fpath: string - path to the output file
+    :param count: int - number of cities
+    :param seed: int - seed of the random generator
+    """
+    generator = random.Random(seed)
+    date = datetime.date(2019, 1, 1).isoformat()
+    with open(fpath, mode='w', encoding='utf-8') as fout:
+        for geoname_id in range(1, count + 1):
+            name = ''.join(generator.choice(string.ascii_lowercase)
+                           for _ in range(generator.randint(4, 12)))
+            name = name.capitalize()
+            alternate_names = ','.join(name + suffix for suffix in ('a', 'o'))
+            row = (
+                geoname_id, name, name, alternate_names,
+                round(generator.uniform(-60, 70), 5),
+                round(generator.uniform(-180, 180), 5),
+                'P', 'PPL', generator.choice(COUNTRY_CODES), '', '01', '', '',
+                '', generator.randint(1000, 10 ** 7), '', 100, 'Etc/UTC', date,
+            )
+            fout.write('\t'.join(str(value) for value in row) + os.linesep)
+
+
+def measure(func, repeat=20):
+    """
+    Measure the median run time of a function
+
+    :param func: callable without arguments
+    :param repeat: int
+    :returns: float - in milliseconds
+    """
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def print_table(headers, rows):
+    """
+    Print the rows as an aligned table
+
+    :param headers: tuple of string
+    :param rows: iterable of tuple
+    """
+    rows = [tuple(str(value) for value in row) for row in rows]
+    widths = [max(len(value) for value in column)
+              for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print('  '.join(value.rjust(width)
+                        for value, width in zip(row, widths)))
@@ -0,0 +1,170 @@
+# Filename: concurrency.py
+
+"""
+Benchmark of concurrent requests against a database file, for the default
+database settings and the production profile (``config.ProductionConfig``).
+
+Each of N threads sends requests to /lexical, /proximity and /radius for a
+fixed duration, with or without a writer committing batches of updates at the
+same time (as an import does). /lexical and /proximity are answered from the
+resident indexes; /radius queries the database for every request.
+"""
+
+# Standard libraries
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Flask
+import flask
+
+# SQLAlchemy
+from sqlalchemy import bindparam
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.controllers import api as api_blueprint
+from globe_indexer.api.models import GeoName, db
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, print_table
+
+
+# Constants
+PROFILES = (
+    ('default', 'config.BaseConfig'),
+    ('production', 'config.ProductionConfig'),
+)
+
+
+def create_app(config_name, database_uri):
+    """
+    Create the application with a database profile
+
+    :param config_name: string - import path of the configuration
+    :param database_uri: string
+    :returns: instance of :class:`flask.Flask`
+    """
+    app = flask.Flask(__name__)
+    app.config.from_object(config_name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    app.config['QUERY_CACHE_SIZE'] = 0
+    app.register_blueprint(api_blueprint)
+    db.init_app(app)
+    return app
+
+
+def run(app, paths, threads, duration, writer):
+    """
+    Send requests from many threads
+
+    :param app: instance of :class:`flask.Flask`
+    :param paths: callable returning a random path
+    :param threads: int - number of threads sending requests
+    :param duration: float - seconds
+    :param writer: boolean - whether updates are written at the same time
+    :returns: tuple (requests per second, median and 95th percentile latency
+              in milliseconds, number of failed requests, writes per second)
+    """
+    stopped = threading.Event()
+    timings = list()
+    failures = list()
+    writes = list()
+
+    def send():
+        client = app.test_client()
+        generator = random.Random(threading.get_ident())
+        while not stopped.is_set():
+            start = time.perf_counter()
+            response = client.get(paths(generator))
+            timings.append(time.perf_counter() - start)
+            # Names without any match are answered with 404
+            if response.status_code not in (200, 404):
+                failures.append(response.status_code)
+
+    def write():
+        statement = GeoName.__table__.update().where(
+            GeoName.id == bindparam('city_id')).values(
+                population=bindparam('value'))
+        generator = random.Random(0)
+        with app.app_context():
+            count = db.session.query(GeoName).count()
+            while not stopped.is_set():
+                start = generator.randint(1, max(count - 5000, 1))
+                db.session.execute(statement, [
+                    {'city_id': city_id,
+                     'value': generator.randint(1000, 10 ** 6)}
+                    for city_id in range(start, start + 5000)])
+                db.session.commit()
+                writes.append(1)
+
+    workers = [threading.Thread(target=send) for _ in range(threads)]
+    if writer:
+        workers.append(threading.Thread(target=write))
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stopped.set()
+    for worker in workers:
+        worker.join()
+
+    timings.sort()
+    return (len(timings) / duration,
+            timings[len(timings) // 2] * 1000 if timings else 0.0,
+            timings[int(len(timings) * 0.95)] * 1000 if timings else 0.0,
+            len(failures), len(writes) / duration)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=100000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    endpoints = (
+        ('lexical', lambda generator: '/lexical?cityName={}*'.format(
+            ''.join(generator.choice('abcdefghij') for _ in range(3)))),
+        ('proximity', lambda generator: '/proximity/{}?k=10'.format(
+            generator.randint(1, args.cities))),
+        ('radius', lambda generator: '/radius/{}?r=200'.format(
+            generator.randint(1, args.cities))),
+    )
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        for profile, config_name in PROFILES:
+            database_uri = 'sqlite:///' + os.path.join(dpath,
+                                                       profile + '.db')
+            app = create_app(config_name, database_uri)
+            with app.app_context():
+                db.create_all()
+                database.initialize_db(db, fpath)
+                database.build_indexes(db)
+            for name, paths in endpoints:
+                for writer in (False, True):
+                    for threads in args.threads:
+                        throughput, median, tail, failures, writes = run(
+                            app, paths, threads, args.duration, writer)
+                        rows.append((
+                            profile, name, 'yes' if writer else 'no', threads,
+                            '{:.0f}'.format(throughput),
+                            '{:.2f}'.format(median), '{:.2f}'.format(tail),
+                            failures, '{:.1f}'.format(writes)))
+
+    print_table(('profile', 'endpoint', 'writer', 'threads', 'requests/s',
+                 'p50 ms', 'p95 ms', 'failed', 'commits/s'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
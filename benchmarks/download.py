@@ -0,0 +1,154 @@
+# Filename: download.py
+
+"""
+Benchmark of the download and parsing of the data set.
+
+Serves a zipped synthetic data set from a local server capping the
+bandwidth of each connection, and compares the previous download (1 KB
+chunks, one connection) with the segmented download, then extracting the
+table before parsing it with parsing it straight from the zip file.
+"""
+
+# Standard libraries
+import argparse
+import http.server
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+
+# Requests
+import requests
+
+# Globe Indexer
+from globe_indexer import utils
+from globe_indexer.config import DATA_PARSE_CHUNK_SIZE
+from globe_indexer.fetch import fetch_file
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, print_table
+
+
+# Constants
+RANGE_RGX = re.compile(r'bytes=(\d+)-(\d+)')
+
+
+class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve the payload of the server, with byte ranges, at a limited rate per
+    connection
+    """
+    def log_message(self, *_):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        payload = self.server.payload
+        start, end = 0, len(payload) - 1
+        match = RANGE_RGX.fullmatch(self.headers.get('Range', ''))
+        if match is not None:
+            start, end = int(match.group(1)), int(match.group(2))
+        self.send_response(206 if match is not None else 200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"benchmark"')
+        self.end_headers()
+        if not body:
+            return
+
+        block = 64 * 1024
+        for offset in range(start, end + 1, block):
+            self.wfile.write(payload[offset:min(offset + block, end + 1)])
+            time.sleep(block / self.server.rate)
+
+
+def legacy_download(url, fpath):
+    """
+    Download as done previously: one connection and 1 KB chunks
+
+    :param url: string
+    :param fpath: string
+    """
+    response = requests.get(url, stream=True)
+    with open(fpath, mode='wb') as fout:
+        for chunk in response.iter_content(chunk_size=1024):
+            fout.write(chunk)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=150000)
+    parser.add_argument('--rate', type=float, default=8.0,
+                        help="bandwidth of a connection (MB/s)")
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities1000.txt')
+        generate_geoname_file(fpath, args.cities)
+        zip_fpath = os.path.join(dpath, 'served.zip')
+        with zipfile.ZipFile(zip_fpath, 'w', zipfile.ZIP_DEFLATED) as fout:
+            fout.write(fpath, 'cities1000.txt')
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                 ThrottledHandler)
+        with open(zip_fpath, 'rb') as fin:
+            server.payload = fin.read()
+        server.rate = args.rate * 2 ** 20
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:{}/cities1000.zip'.format(
+            server.server_address[1])
+        print("zip file: {:.1f} MB".format(len(server.payload) / 2 ** 20))
+
+        try:
+            output_fpath = os.path.join(dpath, 'cities.zip')
+            start = time.perf_counter()
+            legacy_download(url, output_fpath)
+            rows.append(('download (1 KB chunks)', '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+            for connections in (1, 4):
+                os.remove(output_fpath)
+                start = time.perf_counter()
+                fetch_file(url, output_fpath, connections=connections)
+                rows.append(('download ({} connection(s))'.format(
+                    connections), '{:.0f}'.format(
+                        (time.perf_counter() - start) * 1000)))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        extract_dpath = os.path.join(dpath, 'extracted')
+        start = time.perf_counter()
+        with zipfile.ZipFile(output_fpath) as zip_fin:
+            zip_fin.extractall(path=extract_dpath)
+        count = sum(1 for _ in utils.iter_geoname_table_file(
+            os.path.join(extract_dpath, 'cities1000.txt')))
+        rows.append(('extract then parse', '{:.0f}'.format(
+            (time.perf_counter() - start) * 1000)))
+
+        start = time.perf_counter()
+        assert count == sum(
+            len(utils.parse_geoname_table_text(block))
+            for block in utils.iter_zip_blocks(
+                output_fpath, DATA_PARSE_CHUNK_SIZE))
+        rows.append(('parse from the zip file', '{:.0f}'.format(
+            (time.perf_counter() - start) * 1000)))
+
+    print_table(('stage', 'ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Filename: lexical.py
+
+"""
+Benchmark of lexical search.
+
+Compares the ``ILIKE`` query over the ``geo_name`` table (the previous
+approach) against the resident trigram index used by
+:func:`api.query.lexical_query`.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+
+# Globe Indexer
+from globe_indexer import utils
+from globe_indexer.api.index import name_index
+from globe_indexer.api.models import GeoName
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+# Constants
+PATTERNS = ('*ork*', 'ab*', '*ab', 'a*b*c', 'abcd', '*a*')
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    rows = list()
+    with app.app_context():
+        for pattern in PATTERNS:
+            value = utils.get_query_string([pattern])
+            query = GeoName.query.with_entities(GeoName.id).filter(
+                GeoName.name.ilike(value)).order_by(GeoName.id)
+            matches = len(name_index.search(value))
+            ilike = measure(query.all, args.repeat)
+            index = measure(lambda: name_index.search(value), args.repeat)
+            rows.append((pattern, matches, '{:.2f}'.format(ilike),
+                         '{:.2f}'.format(index)))
+
+    print_table(('pattern', 'matches', 'ilike ms', 'index ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
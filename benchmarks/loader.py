@@ -0,0 +1,95 @@
+# Filename: loader.py
+
+"""
+Benchmark of loading the GeoNames table into the database.
+
+Compares adding one ORM instance per row (the previous approach) against the
+streaming, batched loader of :func:`api.database.load_geoname_rows`.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api.database import load_geoname_rows
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.utils import iter_geoname_table_file
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, print_table
+
+
+def load_orm(fpath):
+    """
+    Load the file by adding one ORM instance per row
+
+    :param fpath: string
+    """
+    for row in iter_geoname_table_file(fpath):
+        db.session.add(GeoName(row))
+    db.session.commit()
+
+
+def run(fpath, func):
+    """
+    Run a loader against an empty database
+
+    :param fpath: string
+    :param func: callable taking the path to the file
+    :returns: tuple of (seconds, peak memory in MB)
+    """
+    app = flask.Flask(__name__)
+    app.config.from_object('config.TestConfig')
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(fpath)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.remove()
+        db.drop_all()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, nargs='+',
+                        default=[10000, 40000])
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    def load_batched(fpath):
+        load_geoname_rows(db, iter_geoname_table_file(fpath),
+                          batch_size=args.batch_size)
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        for count in args.cities:
+            fpath = os.path.join(dpath, 'cities.txt')
+            generate_geoname_file(fpath, count)
+            for name, func in (('orm', load_orm), ('batched', load_batched)):
+                elapsed, peak = run(fpath, func)
+                rows.append((count, name, '{:.2f}'.format(elapsed),
+                             '{:.0f}'.format(count / elapsed),
+                             '{:.1f}'.format(peak)))
+
+    print_table(('cities', 'loader', 'seconds', 'cities/s', 'peak MB'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Filename: neighbours.py
+
+"""
+Benchmark of the precomputed nearest neighbour table.
+
+Reports the time to compute the table with one and with all processes, the
+time of an incremental update after a few cities moved, and the latency of
+a top-10 proximity search from the spatial index and from the table.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+import time
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.index import neighbour_table, spatial_index
+from globe_indexer.api.models import GeoName, db
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+        rows = list()
+        geoname_id = args.cities // 2
+        with app.app_context():
+            for processes in sorted({1, os.cpu_count() or 1}):
+                table_dpath = os.path.join(dpath, 'knn{}'.format(processes))
+                start = time.perf_counter()
+                database.precompute_neighbours(db, table_dpath, k=args.k,
+                                               processes=processes)
+                rows.append(('compute ({} processes)'.format(processes),
+                             '{:.0f}'.format(
+                                 (time.perf_counter() - start) * 1000)))
+
+            rows.append(('top-10 from spatial index', '{:.4f}'.format(
+                measure(lambda: spatial_index.nearest(geoname_id, limit=10),
+                        args.repeat))))
+            rows.append(('top-10 from table', '{:.4f}'.format(
+                measure(lambda: neighbour_table.lookup(geoname_id, 10),
+                        args.repeat))))
+
+            for city in GeoName.query.limit(10):
+                city.latitude = -city.latitude
+            db.session.commit()
+            database.build_indexes(db)
+            start = time.perf_counter()
+            count = database.precompute_neighbours(db, table_dpath, k=args.k)
+            rows.append(('update ({} rows)'.format(count), '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+            neighbour_table.unload()
+
+    print_table(('stage', 'ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Filename: parse.py
+
+"""
+Benchmark of parsing and loading the GeoNames table in parallel.
+
+Compares :func:`api.database.load_geoname_file` with one process (the caller
+parses every chunk) against a pool of worker processes, for a plain text file
+and for the zip file as downloaded. Worker processes only help on a machine
+with more than one CPU.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api.database import load_geoname_file
+from globe_indexer.api.models import db
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, print_table
+
+
+def run(fpath, processes):
+    """
+    Load the file into an empty database
+
+    :param fpath: string
+    :param processes: int - number of worker processes
+    :returns: float - seconds
+    """
+    app = flask.Flask(__name__)
+    app.config.from_object('config.TestConfig')
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        load_geoname_file(db, fpath, processes=processes)
+        elapsed = time.perf_counter() - start
+        db.session.remove()
+        db.drop_all()
+    return elapsed
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, nargs='+',
+                        default=[150000, 600000])
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=sorted({1, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        for count in args.cities:
+            fpath = os.path.join(dpath, 'cities.txt')
+            zip_fpath = os.path.join(dpath, 'cities.zip')
+            generate_geoname_file(fpath, count)
+            with zipfile.ZipFile(zip_fpath, 'w',
+                                 zipfile.ZIP_DEFLATED) as fout:
+                fout.write(fpath, 'cities.txt')
+
+            for name, path in (('text', fpath), ('zip', zip_fpath)):
+                baseline = None
+                for processes in args.processes:
+                    elapsed = run(path, processes)
+                    baseline = baseline or elapsed
+                    rows.append((count, name, processes,
+                                 '{:.2f}'.format(elapsed),
+                                 '{:.0f}'.format(count / elapsed),
+                                 '{:.2f}x'.format(baseline / elapsed)))
+
+    print_table(('cities', 'file', 'processes', 'seconds', 'cities/s',
+                 'speedup'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Filename: proximity.py
+
+"""
+Benchmark of the /proximity endpoint for an increasing number of results.
+
+Compares hydrating the results with one query per city (the previous
+approach) against a single ``IN (...)`` query.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+
+# Globe Indexer
+from globe_indexer.api.models import GeoName
+from globe_indexer.api.query import proximity_query
+from globe_indexer.config import MAX_PROXIMITY_LIMIT
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    geoname_id = args.cities // 2
+    client = app.test_client()
+    rows = list()
+    with app.app_context():
+        for k in (1, 10, 100, MAX_PROXIMITY_LIMIT):
+            ids = [value[1] for value in proximity_query(geoname_id, limit=k)]
+            per_row = measure(
+                lambda: [GeoName.query.filter_by(id=value).first()
+                         for value in ids], args.repeat)
+            bulk = measure(
+                lambda: GeoName.query.filter(GeoName.id.in_(ids)).all(),
+                args.repeat)
+            endpoint = measure(
+                lambda: client.get('/proximity/{}?k={}'.format(geoname_id, k)),
+                args.repeat)
+            rows.append((k, '{:.2f}'.format(per_row), '{:.2f}'.format(bulk),
+                         '{:.2f}'.format(endpoint)))
+
+    print_table(('k', 'per-row ms', 'bulk ms', 'endpoint ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
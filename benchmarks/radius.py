@@ -0,0 +1,74 @@
+# Filename: radius.py
+
+"""
+Benchmark of the radius search for an increasing radius.
+
+Compares computing the distance to every city (full scan) against the
+bounding box prefilter of :func:`api.query.radius_query`, whose cost follows
+the number of cities in the result.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+
+# Globe Indexer
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.api.query import radius_query
+from globe_indexer.distance import PointArray
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    def full_scan(latitude, longitude, radius):
+        query = db.session.query(GeoName.id, GeoName.latitude,
+                                 GeoName.longitude)
+        return PointArray.from_rows(query).within(latitude, longitude, radius)
+
+    rows = list()
+    with app.app_context():
+        city = GeoName.query.get(args.cities // 2)
+        client = app.test_client()
+        for radius in (10, 100, 500, 2000):
+            results = radius_query(city.latitude, city.longitude, radius)
+            scan = measure(
+                lambda: full_scan(city.latitude, city.longitude, radius),
+                args.repeat)
+            prefilter = measure(
+                lambda: radius_query(city.latitude, city.longitude, radius),
+                args.repeat)
+            endpoint = measure(
+                lambda: client.get('/radius/{}?r={}'.format(city.id, radius)),
+                args.repeat)
+            rows.append((radius, len(results), '{:.2f}'.format(scan),
+                         '{:.2f}'.format(prefilter),
+                         '{:.2f}'.format(endpoint)))
+
+    print_table(('radius km', 'cities', 'full scan ms', 'prefilter ms',
+                 'endpoint ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
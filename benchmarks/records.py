@@ -0,0 +1,101 @@
+# Filename: records.py
+
+"""
+Benchmark of the read model of the cities.
+
+Reports the memory held by the resident city store and, per request, the
+time taken and the memory allocated to fetch the served cities through the
+ORM (GeoName.query) and through the store.
+"""
+
+# Standard libraries
+import argparse
+import os
+import random
+import tempfile
+import tracemalloc
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.index import city_store
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.api.query import city_query
+
+# Benchmarks
+from benchmarks.common import (
+    create_app,
+    generate_geoname_file,
+    measure,
+    print_table,
+)
+
+
+def allocated(func):
+    """
+    Measure the memory allocated while running a function
+
+    :param func: callable without arguments
+    :returns: tuple of int (peak bytes, number of blocks still referenced by
+              the result)
+    """
+    tracemalloc.start()
+    result = func()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    del result
+    return peak, blocks
+
+
+def orm_query(ids):
+    """
+    Fetch the cities through the ORM, in a single query
+
+    :param ids: list of int
+    :returns: list of :class:`api.models.GeoName`
+    """
+    return GeoName.query.filter(GeoName.id.in_(ids)).all()
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=150000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath, 'sqlite:///' + os.path.join(dpath, 'db'))
+
+        with app.app_context():
+            database.build_indexes(db)
+            usage = city_store.memory_usage()
+            print("store: {} cities, {:.1f} MB, {:.0f} bytes per city".format(
+                usage['cities'], usage['bytes'] / 2 ** 20,
+                usage['bytes_per_city']))
+
+            rng = random.Random(args.seed)
+            for size in (1, 10, 100):
+                ids = rng.sample(range(1, args.cities + 1), size)
+                for name, func in (('GeoName.query', orm_query),
+                                   ('city_query', city_query)):
+                    # Warm up the ORM and the page cache
+                    func(ids)
+                    peak, blocks = allocated(lambda: func(ids))
+                    timing = measure(lambda: func(ids))
+                    db.session.remove()
+                    rows.append((size, name, '{:.3f}'.format(timing),
+                                 '{:.1f}'.format(peak / 1024), blocks))
+
+    print_table(('cities', 'path', 'ms', 'peak KB', 'blocks held'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Filename: reverse.py
+
+"""
+Throughput benchmark of reverse geocoding (the /reverse endpoint).
+
+Reports the number of lookups per second for random coordinates, through
+:func:`api.query.reverse_query` and through the endpoint, along with the
+number of SQL statements executed (none are expected once the resident
+indexes are built).
+"""
+
+# Standard libraries
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# SQLAlchemy
+from sqlalchemy import event
+
+# Globe Indexer
+from globe_indexer.api.models import db
+from globe_indexer.api.query import reverse_query
+
+# Benchmarks
+from benchmarks.common import create_app, generate_geoname_file, print_table
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath)
+
+    generator = random.Random(0)
+    points = [(generator.uniform(-90, 90), generator.uniform(-180, 180))
+              for _ in range(args.requests)]
+    statements = list()
+
+    def count_statement(*_):
+        statements.append(None)
+
+    rows = list()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        client = app.test_client()
+        for k in (1, 10):
+            del statements[:]
+            start = time.perf_counter()
+            for latitude, longitude in points:
+                reverse_query(latitude, longitude, limit=k)
+            query_rate = len(points) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for latitude, longitude in points:
+                client.get('/reverse?lat={}&lon={}&k={}'.format(
+                    latitude, longitude, k))
+            endpoint_rate = len(points) / (time.perf_counter() - start)
+            rows.append((k, '{:.0f}'.format(query_rate),
+                         '{:.0f}'.format(endpoint_rate), len(statements)))
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    print_table(('k', 'query/s', 'endpoint req/s', 'SQL statements'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
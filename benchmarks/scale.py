@@ -0,0 +1,168 @@
+# Filename: scale.py
+
+"""
+Benchmark of the scale mode on a synthetic gazetteer as large as the complete
+GeoNames dump.
+
+Loads the generated table into an SQLite database on disk, writes the
+snapshot and the on-disk indexes, and serves queries from them. The private
+memory of the process (leaving out the pages of the mapped files) is
+sampled throughout and compared against the memory budget.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api import database, query
+from globe_indexer.api.index import city_snapshot
+from globe_indexer.api.models import db
+from globe_indexer.utils import get_memory_usage
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, measure, print_table
+
+
+class MemorySampler(object):
+    """
+    Background sampler of the peak private memory of the process
+    """
+    def __init__(self, interval=0.05):
+        """
+        Constructor
+
+        :param interval: float - seconds between samples
+        """
+        self.peak = 0
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def reset(self):
+        """
+        Start a new phase
+
+        :returns: int - peak private memory (in bytes) of the last phase
+        """
+        peak, self.peak = self.peak, get_memory_usage()['private']
+        return max(peak, self.peak)
+
+    def stop(self):
+        """
+        Stop sampling
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        """
+        Sample until stopped
+        """
+        while not self._stopped.wait(self._interval):
+            self.peak = max(self.peak, get_memory_usage()['private'])
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=10 ** 7)
+    parser.add_argument('--budget', type=int, default=512,
+                        help="memory budget in MiB")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--dpath', default=None,
+                        help="directory of the files (temporary by default)")
+    args = parser.parse_args()
+    budget = args.budget * 2 ** 20
+
+    with tempfile.TemporaryDirectory(dir=args.dpath) as dpath:
+        fpath = os.path.join(dpath, 'allCountries.txt')
+        snapshot_fpath = os.path.join(dpath, 'cities.snapshot')
+        scale_dpath = os.path.join(dpath, 'indexes')
+
+        app = flask.Flask(__name__)
+        app.config.from_object('config.TestConfig')
+        app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+        app.config['SQLALCHEMY_DATABASE_URI'] = \
+            'sqlite:///' + os.path.join(dpath, 'geonames.db')
+        db.init_app(app)
+
+        sampler = MemorySampler()
+        phases = list()
+
+        def phase(name, func):
+            sampler.reset()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            peak = sampler.reset()
+            phases.append((name, '{:.1f}'.format(elapsed),
+                           '{:.0f}'.format(peak / 2 ** 20),
+                           'yes' if peak <= budget else 'NO'))
+
+        with app.app_context():
+            db.create_all()
+            phase('generate', lambda: generate_geoname_file(fpath,
+                                                            args.cities))
+            phase('load database', lambda: database.load_geoname_file(
+                db, fpath, processes=args.processes))
+            phase('write snapshot',
+                  lambda: database.save_snapshot(db, snapshot_fpath))
+            phase('write indexes', lambda: database.load_snapshot(
+                db, snapshot_fpath, scale_dpath=scale_dpath,
+                memory_budget=budget))
+
+            queries = (
+                ('autocomplete', lambda: query.autocomplete_query('abc')),
+                ('lexical', lambda: query.lexical_query(('abcde',))),
+                ('lexical wildcard',
+                 lambda: query.lexical_query(('*bcdef*',))),
+                ('proximity', lambda: query.proximity_query(12345, limit=5)),
+                ('proximity in country', lambda: query.proximity_query(
+                    12345, country_code='FI', limit=5)),
+                ('reverse', lambda: query.reverse_query(48.85, 2.35,
+                                                        limit=5)),
+            )
+            rows = list()
+            for name, func in queries:
+                query.query_cache.invalidate()
+                sampler.reset()
+                milliseconds = measure(
+                    lambda: (query.query_cache.invalidate(), func()))
+                rows.append((name, '{:.2f}'.format(milliseconds),
+                             '{:.0f}'.format(sampler.reset() / 2 ** 20)))
+            city_snapshot.close()
+        sampler.stop()
+
+        sizes = dict()
+        for name in ('geonames.db', 'cities.snapshot', 'indexes'):
+            path = os.path.join(dpath, name)
+            if os.path.isdir(path):
+                sizes[name] = sum(
+                    os.path.getsize(os.path.join(root, fname))
+                    for root, _, fnames in os.walk(path) for fname in fnames)
+            else:
+                sizes[name] = os.path.getsize(path)
+
+    print("{} cities, memory budget {} MiB".format(args.cities, args.budget))
+    print_table(('phase', 'seconds', 'peak private MiB', 'within budget'),
+                phases)
+    print()
+    print_table(('query', 'ms', 'peak private MiB'), rows)
+    print()
+    print_table(('file', 'MiB'), [(name, '{:.0f}'.format(size / 2 ** 20))
+                                  for name, size in sizes.items()])
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Filename: serialization.py
+
+"""
+Microbenchmark of the serialization of lexical search responses over the
+test data set.
+
+Compares the previous approach (``GeoName.json`` round trip through
+``json.dumps``/``json.loads`` and a pretty printed response) against the
+resident fragments of :class:`serializer.FragmentStore`.
+"""
+
+# Standard libraries
+import argparse
+import json
+import os
+
+# Globe Indexer
+from globe_indexer import serializer
+from globe_indexer.api.models import GeoName
+from globe_indexer.api.query import fragment_query
+
+# Benchmarks
+from benchmarks.common import create_app, measure, print_table
+
+
+# Constants
+TEST_DATA_FPATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                               'tests', 'data', 'geoname_example.txt')
+
+
+def previous_json(city):
+    """
+    Compact representation of the city as it used to be computed
+
+    :param city: instance of :class:`api.models.GeoName`
+    :returns: dict
+    """
+    value = {
+        'id': city.id,
+        'name': city.name,
+        'latitude': city.latitude,
+        'longitude': city.longitude,
+        'country_code': city.country_code,
+    }
+    return json.loads(json.dumps(value))
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app(TEST_DATA_FPATH)
+    rows = list()
+    with app.app_context():
+        cities = GeoName.query.order_by(GeoName.id).all()
+        ids = [city.id for city in cities]
+
+        def previous():
+            payload = {'cities': [previous_json(city) for city in cities],
+                       'total': len(cities)}
+            return json.dumps(payload, ensure_ascii=False, indent=2)
+
+        def compact():
+            payload = {'cities': [city.json() for city in cities],
+                       'total': len(cities)}
+            return serializer.dumps(payload)
+
+        def fragments():
+            values = [fragment for _, fragment in fragment_query(ids)]
+            return serializer.dumps_object(
+                {'total': len(ids)}, cities='[' + ','.join(values) + ']')
+
+        for name, func in (('round trip + pretty print', previous),
+                           ('dict + ' + serializer.BACKEND, compact),
+                           ('resident fragments', fragments)):
+            elapsed = measure(lambda: [func() for _ in range(args.repeat)])
+            rows.append((name, '{:.2f}'.format(elapsed / args.repeat * 1000),
+                         len(func())))
+
+    print_table(('serializer', 'us per response', 'bytes'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Filename: snapshot.py
+
+"""
+Benchmark of the startup of a process serving the cities.
+
+Compares building the resident indexes from the SQLite database against
+mapping the columnar snapshot and building them from it.
+"""
+
+# Standard libraries
+import argparse
+import os
+import tempfile
+import time
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.index import city_snapshot
+from globe_indexer.api.models import db
+
+# Benchmarks
+from benchmarks.common import create_app, generate_geoname_file, print_table
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=150000)
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath, 'sqlite:///' + os.path.join(dpath, 'db'))
+        snapshot_fpath = os.path.join(dpath, 'cities.snapshot')
+
+        with app.app_context():
+            start = time.perf_counter()
+            database.save_snapshot(db, snapshot_fpath)
+            rows.append(('write snapshot', '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+
+            start = time.perf_counter()
+            database.build_indexes(db)
+            rows.append(('indexes from database', '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+
+            start = time.perf_counter()
+            city_snapshot.open(snapshot_fpath)
+            rows.append(('map snapshot', '{:.1f}'.format(
+                (time.perf_counter() - start) * 1000)))
+
+            start = time.perf_counter()
+            database.load_snapshot(db, snapshot_fpath)
+            rows.append(('indexes from snapshot', '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+            city_snapshot.close()
+
+        rows.append(('snapshot size (MB)', '{:.1f}'.format(
+            os.path.getsize(snapshot_fpath) / 2 ** 20)))
+
+    print_table(('stage', 'ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Filename: startup.py
+
+"""
+Benchmark of the startup of the application.
+
+Each worker is a separate process creating the application on a shared
+database file, as the workers of a server would. The time to bind is the
+time until the application can answer requests (/health), the time to ready
+is the time until it serves the cities. The blocking mode only binds once
+the data is ready; the background mode binds at once and prepares the data
+in a thread. On a fresh host, the data set is loaded by a single worker
+while the others wait for it, then build their indexes from the database or
+map the snapshot written by the first one. The emptiness check run by every
+worker is timed against counting the cities.
+"""
+
+# Standard libraries
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api.controllers import api as api_blueprint
+from globe_indexer.api.database import is_db_empty
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.api.startup import Startup
+
+# Benchmarks
+from benchmarks.common import generate_geoname_file, measure, print_table
+
+
+def start_worker(db_fpath, fpath, mode, snapshot, results):
+    """
+    Create the application in a worker process and wait until it's ready
+
+    :param db_fpath: string - path to the database file
+    :param fpath: string - path to the GeoNames formatted file
+    :param mode: string - STARTUP_MODE
+    :param snapshot: boolean - whether to write and map a snapshot next to
+                     the database
+    :param results: multiprocessing queue receiving the tuple (seconds to
+                    bind, seconds to ready, set of the phases seen)
+    """
+    start = time.perf_counter()
+    app = flask.Flask(__name__)
+    app.config.from_object('config.BaseConfig')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_fpath
+    app.config['DATA_LOAD_PROCESSES'] = 1
+    app.config['STARTUP_MODE'] = mode
+    if snapshot:
+        app.config['SNAPSHOT_PATH'] = db_fpath + '.snapshot'
+    app.register_blueprint(api_blueprint)
+    db.init_app(app)
+    startup = Startup(app, fpath)
+    phases = set()
+    if mode == 'blocking':
+        startup.run()
+    else:
+        startup.start()
+    bound = time.perf_counter() - start
+    client = app.test_client()
+    while client.get('/health').status_code != 200:
+        phases.add(startup.phase)
+        if startup.phase == 'failed':
+            break
+        time.sleep(0.05)
+    results.put((bound, time.perf_counter() - start, phases))
+
+
+def run_workers(db_fpath, fpath, mode, snapshot, count):
+    """
+    Start workers at the same time
+
+    :returns: list of tuple, see :func:`start_worker`
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=start_worker,
+                                 args=(db_fpath, fpath, mode, snapshot,
+                                       results))
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    values = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return values
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+
+        scenarios = (
+            ('fresh', 'blocking', False, 1),
+            ('fresh', 'background', False, 1),
+            ('prepared', 'background', False, 1),
+            ('fresh', 'background', False, args.workers),
+            ('prepared', 'background', False, args.workers),
+            ('fresh', 'background', True, args.workers),
+            ('prepared', 'background', True, args.workers),
+        )
+        db_fpath = None
+        for host, mode, snapshot, count in scenarios:
+            if host == 'fresh':
+                db_fpath = os.path.join(dpath, '{}-{}-{}.db'.format(
+                    mode, snapshot, count))
+            values = run_workers(db_fpath, fpath, mode, snapshot, count)
+            rows.append((
+                host, mode, 'yes' if snapshot else 'no', count,
+                '{:.0f}'.format(max(value[0] for value in values) * 1000),
+                '{:.0f}'.format(max(value[1] for value in values) * 1000),
+                sum('loading' in value[2] for value in values),
+                sum('waiting' in value[2] for value in values)))
+
+        app = flask.Flask(__name__)
+        app.config.from_object('config.BaseConfig')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_fpath
+        db.init_app(app)
+        with app.app_context():
+            count_ms = measure(lambda: db.session.query(GeoName).count())
+            empty_ms = measure(lambda: is_db_empty(db))
+            db.session.remove()
+            db.engine.dispose()
+
+    print_table(('host', 'mode', 'snapshot', 'workers', 'bind ms', 'ready ms',
+                 'loaded by', 'waited'), rows)
+    print()
+    print_table(('emptiness check', 'ms'), (
+        ('count()', '{:.2f}'.format(count_ms)),
+        ('LIMIT 1', '{:.3f}'.format(empty_ms)),
+    ))
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
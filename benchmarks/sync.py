@@ -0,0 +1,87 @@
+# Filename: sync.py
+
+"""
+Benchmark of the incremental sync with the daily files of GeoNames.
+
+Applies a modification file (cities moved or renamed, and new cities) and a
+deletion file to a loaded database, and compares the time taken with a full
+rebuild of the resident indexes.
+"""
+
+# Standard libraries
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+# Globe Indexer
+from globe_indexer.api import database
+from globe_indexer.api.models import db
+from globe_indexer.api.query import lexical_id_query
+
+# Benchmarks
+from benchmarks.common import create_app, generate_geoname_file, print_table
+
+
+def main():
+    """
+    Main function for the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=150000)
+    parser.add_argument('--changes', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    date = datetime.date(2024, 1, 30)
+    rows = list()
+    with tempfile.TemporaryDirectory() as dpath:
+        fpath = os.path.join(dpath, 'cities.txt')
+        generate_geoname_file(fpath, args.cities)
+        app = create_app(fpath, 'sqlite:///' + os.path.join(dpath, 'db'))
+
+        # Modify, add and delete as many cities
+        with open(fpath, encoding='utf-8') as fin:
+            lines = fin.read().splitlines()
+        modified = rng.sample(lines, args.changes)
+        deleted = rng.sample(lines, args.changes)
+        updates_dpath = os.path.join(dpath, 'updates')
+        os.mkdir(updates_dpath)
+        with open(os.path.join(updates_dpath, 'modifications-{}.txt'.format(
+                date.isoformat())), 'w', encoding='utf-8') as fout:
+            for index, line in enumerate(modified):
+                values = line.split('\t')
+                values[4] = str(round(rng.uniform(-60, 70), 5))
+                values[18] = date.isoformat()
+                fout.write('\t'.join(values) + '\n')
+                values[0] = str(args.cities + index + 1)
+                values[1] = values[2] = values[1] + 'ville'
+                fout.write('\t'.join(values) + '\n')
+        with open(os.path.join(updates_dpath, 'deletes-{}.txt'.format(
+                date.isoformat())), 'w', encoding='utf-8') as fout:
+            for line in deleted:
+                fout.write('\t'.join(line.split('\t')[:2] + ['']) + '\n')
+
+        with app.app_context():
+            start = time.perf_counter()
+            database.build_indexes(db)
+            rows.append(('full rebuild of the indexes', '{:.0f}'.format(
+                (time.perf_counter() - start) * 1000)))
+
+            start = time.perf_counter()
+            counts = database.sync_db(db, updates_dpath)
+            rows.append(('sync ({inserted} inserted, {updated} updated, '
+                         '{deleted} deleted)'.format(**counts),
+                         '{:.0f}'.format(
+                             (time.perf_counter() - start) * 1000)))
+            assert lexical_id_query(['*ville'])
+
+    print_table(('stage', 'ms'), rows)
+
+
+# Entry point
+if __name__ == '__main__':
+    main()
@@ -3,20 +3,47 @@
 # Standard libraries
 import os
 
+# Globe Indexer
+from globe_indexer import config as defaults
+
 
 class BaseConfig(object):
     """
-    Base configuration of the application
+    Base configuration of the application. The tuning settings take their
+    defaults from :mod:`globe_indexer.config`.
     """
+    ASYNC_WORKERS = defaults.ASYNC_WORKERS
+    CITY_MIN_POPULATION = defaults.CITY_MIN_POPULATION
+    COUNTRIES_MAX_AGE = defaults.COUNTRIES_MAX_AGE
+    DATA_CONNECTIONS = defaults.DATA_CONNECTIONS
+    DATA_LOAD_BATCH_SIZE = defaults.DATA_LOAD_BATCH_SIZE
+    DATA_LOAD_PROCESSES = None
+    DATA_SET_CHECKSUM = None
+    DATA_SET_URL = defaults.DATA_SET_URL
     DEBUG = False
     LOG_LEVEL = 'INFO'
     MAIL_FROM_EMAIL = 'ahartoto.dev@gmail.com'
     JSON_AS_ASCII = False
     JSONIFY_MIMETYPE = 'application/json; charset=utf-8'
-    JSONIFY_PRETTYPRINT_REGULAR = True
+    JSONIFY_PRETTYPRINT_REGULAR = False
+    KNN_TABLE_PATH = None
+    KNN_TABLE_PROCESSES = None
+    KNN_TABLE_SIZE = defaults.KNN_TABLE_SIZE
+    QUERY_CACHE_BACKEND = None
+    QUERY_CACHE_SIZE = defaults.QUERY_CACHE_SIZE
+    QUERY_CACHE_TTL = defaults.QUERY_CACHE_TTL
+    SCALE_INDEX_PATH = None
+    SCALE_MEMORY_BUDGET = defaults.SCALE_MEMORY_BUDGET
+    SNAPSHOT_PATH = None
     SQLALCHEMY_DATABASE_URI = 'sqlite:///globe_indexer.db'
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = ()
+    SQLITE_READERS = 0
+    SQLITE_SHARED_CACHE = False
+    STARTUP_LOCK_PATH = None
+    STARTUP_MODE = 'blocking'
+    UPDATES_PATH = None
 
     if os.getenv('APPLICATION_SECRET_KEY') is not None:
         SECRET_KEY = os.getenv('APPLICATION_SECRET_KEY')
@@ -29,3 +56,30 @@ class TestConfig(BaseConfig):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TESTING = True
     WTF_CSRF_ENABLED = False
+
+
+class ScaleConfig(BaseConfig):
+    """
+    Configuration serving the complete GeoNames gazetteer from on-disk
+    indexes, within the memory budget
+    """
+    CITY_MIN_POPULATION = None
+    DATA_SET_URL = 'http://download.geonames.org/export/dump/allCountries.zip'
+    SCALE_INDEX_PATH = os.path.join('scale', 'indexes')
+    SNAPSHOT_PATH = os.path.join('scale', 'cities.snapshot')
+
+
+class ProductionConfig(BaseConfig):
+    """
+    Configuration of a database file served by concurrent workers: write
+    ahead logging and memory mapping, read only connections for the queries
+    and a dedicated writer connection for the loads
+    """
+    SQLITE_PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', 256 * 1024 * 1024),
+        ('busy_timeout', 5000),
+    )
+    SQLITE_READERS = 8
+    SQLITE_SHARED_CACHE = True
@@ -0,0 +1,338 @@
+# Filename: asgi.py
+
+"""
+Globe Indexer API ASGI Module
+
+Async serving mode of the read only endpoints of the JSON API, for an ASGI
+server such as ``uvicorn application:asgi_application``.
+
+This is a bridge from ASGI to the WSGI application, not an async query path:
+the event loop only receives the requests and sends the responses, while
+each request is handled by the Flask application in a pool of worker
+threads, where the queries run synchronously. The body of the response is
+handed back to the loop one chunk at a time (so that NDJSON streams are sent
+as they are produced). The HTML forms and the static files are only served
+by the WSGI application.
+
+Interface classes:
+    AsgiApplication
+"""
+
+# Standard libraries
+import asyncio
+import concurrent.futures
+import io
+import json
+import sys
+import threading
+
+# Werkzeug
+from werkzeug.exceptions import HTTPException
+
+# Globe Indexer
+from globe_indexer.api.database import build_indexes
+from globe_indexer.api.index import (
+    city_store,
+    fragment_store,
+    name_index,
+    spatial_index,
+    token_index,
+)
+from globe_indexer.api.models import db
+from globe_indexer.api.startup import STARTUP_EXTENSION
+from globe_indexer.config import ASYNC_QUEUE_SIZE, ASYNC_WORKERS
+from globe_indexer.error import GlobeIndexerError
+
+
+# Constants
+ASYNC_ENDPOINTS = frozenset((
+    'api.autocomplete', 'api.batch_proximity', 'api.countries',
+    'api.geoname', 'api.health', 'api.lexical', 'api.proximity',
+    'api.radius', 'api.reverse',
+))
+CLOSED_POLL_INTERVAL = 0.5
+
+
+# Interface classes
+class AsgiApplication(object):
+    """
+    ASGI application serving :data:`ASYNC_ENDPOINTS` of a Flask application
+    in worker threads. The other endpoints (the HTML forms and the static
+    files) are answered with 404 and stay on the WSGI path.
+    """
+    def __init__(self, app, workers=ASYNC_WORKERS):
+        """
+        Constructor
+
+        :param app: instance of :class:`flask.Flask`
+        :param workers: int - number of worker threads, or None for the
+                        default of
+                        :class:`concurrent.futures.ThreadPoolExecutor`
+        """
+        self.app = app
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers)
+
+    async def __call__(self, scope, receive, send):
+        """
+        Handle a connection
+
+        :param scope: dict - ASGI connection scope
+        :param receive: coroutine function receiving the ASGI events
+        :param send: coroutine function sending the ASGI events
+        """
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            fstr = "unsupported connection type: {}".format(scope['type'])
+            raise GlobeIndexerError(fstr)
+
+    def startup(self):
+        """
+        Build the resident indexes if they haven't been built yet, unless
+        the application builds them itself (see :mod:`api.startup`)
+        """
+        if STARTUP_EXTENSION in self.app.extensions:
+            return
+        indexes = (city_store, fragment_store, name_index, spatial_index,
+                   token_index)
+        if not all(index.loaded for index in indexes):
+            with self.app.app_context():
+                build_indexes(db)
+
+    async def _http(self, scope, receive, send):
+        """
+        Handle a request
+
+        :param scope: dict - ASGI connection scope
+        :param receive: coroutine function receiving the ASGI events
+        :param send: coroutine function sending the ASGI events
+        """
+        body = list()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+
+        if not self._is_served(scope):
+            payload = {
+                'error': {
+                    'message': "the resource is not served in the async "
+                               "mode: {}".format(scope['path']),
+                    'type': 'INVALID_PATH',
+                }
+            }
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body',
+                        'body': json.dumps(payload).encode('utf-8')})
+            return
+
+        loop = asyncio.get_event_loop()
+        channel = _Channel(loop)
+        future = loop.run_in_executor(
+            self._executor, self._respond,
+            _build_environ(scope, b''.join(body)), channel)
+        try:
+            done = False
+            while not done:
+                messages, done = await channel.get()
+                for message in messages:
+                    await send(message)
+        finally:
+            channel.close()
+        await future
+
+    def _is_served(self, scope):
+        """
+        Check if the request is for one of :data:`ASYNC_ENDPOINTS`. Requests
+        that don't match any endpoint are served, so that the application
+        answers them with its own errors.
+
+        :param scope: dict - ASGI connection scope
+        :returns: boolean
+        """
+        adapter = self.app.url_map.bind('localhost')
+        try:
+            endpoint, _ = adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return True
+        return endpoint in ASYNC_ENDPOINTS
+
+    async def _lifespan(self, receive, send):
+        """
+        Handle the startup and the shutdown of the server
+
+        :param receive: coroutine function receiving the ASGI events
+        :param send: coroutine function sending the ASGI events
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await loop.run_in_executor(self._executor, self.startup)
+                except Exception as exc:  # pylint: disable=broad-except
+                    await send({'type': 'lifespan.startup.failed',
+                                'message': str(exc)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _respond(self, environ, channel):
+        """
+        Run the Flask application in a worker thread, handing the ASGI
+        events of the response to the event loop
+
+        :param environ: dict - WSGI environment
+        :param channel: instance of :class:`_Channel`
+        """
+        response = dict()
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]
+
+        def events(chunk, more_body):
+            values = list()
+            if 'started' not in response:
+                response['started'] = True
+                values.append({'type': 'http.response.start',
+                               'status': response['status'],
+                               'headers': response['headers']})
+            values.append({'type': 'http.response.body', 'body': chunk,
+                           'more_body': more_body})
+            return values
+
+        complete = False
+        try:
+            iterable = self.app(environ, start_response)
+            try:
+                # One chunk is held back, so that the last one closes the
+                # response
+                pending = None
+                for chunk in iterable:
+                    if not chunk:
+                        continue
+                    if pending is not None and \
+                            not channel.put(events(pending, True), False):
+                        return
+                    pending = chunk
+                complete = channel.put(events(pending or b'', False), True)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            if not complete:
+                channel.put(list(), True)
+
+
+# Private functions
+def _build_environ(scope, body):
+    """
+    Build the WSGI environment of a request
+
+    :param scope: dict - ASGI connection scope
+    :param body: bytes - body of the request
+    :returns: dict
+    """
+    server = scope.get('server') or ('localhost', None)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME':
+            scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        environ[name] = environ[name] + ',' + value if name in environ \
+            else value
+    # The body was read whole, even if it was sent in chunks
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+# Private classes
+class _Channel(object):
+    """
+    Bounded hand-off of the ASGI events of a response from the worker thread
+    producing them to the event loop sending them
+    """
+    def __init__(self, loop, size=ASYNC_QUEUE_SIZE):
+        """
+        Constructor
+
+        :param loop: event loop sending the events
+        :param size: int - maximum number of batches of events waiting to be
+                     sent
+        """
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = threading.Event()
+
+    def close(self):
+        """
+        Stop the producer, called by the loop once it stops sending
+        """
+        self._closed.set()
+
+    async def get(self):
+        """
+        Wait for the next batch of events
+
+        :returns: tuple (list of ASGI events, boolean - whether the response
+                  is complete)
+        """
+        item = await self._queue.get()
+        self._slots.release()
+        return item
+
+    def put(self, events, done):
+        """
+        Hand a batch of events to the loop, waiting while too many batches
+        are waiting to be sent
+
+        :param events: list of ASGI events
+        :param done: boolean - whether the response is complete
+        :returns: boolean - False if the loop stopped sending the response
+        """
+        while not self._slots.acquire(timeout=CLOSED_POLL_INTERVAL):
+            if self._closed.is_set():
+                return False
+        if self._closed.is_set():
+            return False
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait,
+                                            (events, done))
+        except RuntimeError:
+            # The loop is closed
+            return False
+        return True
@@ -5,7 +5,9 @@ Globe Indexer API Controller Module
 """
 
 # Standard libraries
+import bisect
 import json
+import math
 import os
 
 # Python 3.5+
@@ -20,19 +22,52 @@ import flask
 
 # Globe Indexer
 from globe_indexer import config
+from globe_indexer import serializer
 from globe_indexer import utils
 from globe_indexer.api.forms import LexicalForm, ProximityForm
-from globe_indexer.api.models import GeoName
 from globe_indexer.api.query import (
+    autocomplete_query,
+    batch_proximity_query,
+    city_query,
+    country_catalogue_query,
     country_code_query,
+    fragment_query,
+    lexical_id_query,
     lexical_query,
     proximity_query,
+    proximity_total,
+    radius_query,
+    reverse_query,
 )
+from globe_indexer.api.startup import STARTUP_EXTENSION
 from globe_indexer.error import GlobeIndexerError
 
 # Constants
 api = flask.Blueprint('api', __name__,
                       static_folder='static', template_folder='templates')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Endpoints served while the application is starting
+STARTUP_ENDPOINTS = frozenset(('api.favicon', 'api.health', 'api.static',
+                               'api.style_css'))
+
+
+@api.before_request
+def require_ready():
+    """
+    Answer 503 while the data of the application is being prepared in the
+    background (see :mod:`api.startup`), except for /health
+
+    :returns: Flask response, or None to handle the request
+    """
+    startup = flask.current_app.extensions.get(STARTUP_EXTENSION)
+    if startup is None or startup.ready or \
+            flask.request.endpoint in STARTUP_ENDPOINTS:
+        return None
+    message = "the application is starting (phase: {}), see /health".format(
+        startup.phase)
+    error_type = 'NOT_READY'
+    return utils.formulate_json_error(message, error_type,
+                                      StatusCodes.SERVICE_UNAVAILABLE)
 
 
 @api.route('/form/proximity', methods=['GET', 'POST'])
@@ -66,9 +101,10 @@ def proximity_form():
 
         try:
             k = int(form.query_limit.data)
-            if k < 1:
-                raise ValueError("value of search limit should be a positive "
-                                 "integer")
+            if not 1 <= k <= config.MAX_PROXIMITY_LIMIT:
+                raise ValueError("value of search limit should be an "
+                                 "integer between 1 and {}".format(
+                                     config.MAX_PROXIMITY_LIMIT))
         except ValueError as exc:
             flask.flash(str(exc), "error")
             return flask.render_template(template_fname, **kwargs)
@@ -80,16 +116,17 @@ def proximity_form():
                 flask.flash("invalid country code format provided", "error")
                 return flask.render_template(template_fname, **kwargs)
 
-        center = GeoName.query.filter_by(id=geoname_id).first()
-        if center:
-            results = proximity_query(geoname_id, country_code=country_code)
-            cities = [GeoName.query.filter_by(id=elem[1]).first()
-                      for elem in results[:k]]
-            kwargs['center'] = center
-            kwargs['cities'] = cities
-        else:
+        try:
+            results = proximity_query(geoname_id, country_code=country_code,
+                                      limit=k)
+        except GlobeIndexerError:
             flask.flash("Cannot find city with the given ID. Try again",
                         "error")
+        else:
+            cities = city_query([geoname_id] +
+                                [elem[1] for elem in results])
+            kwargs['center'] = cities[0]
+            kwargs['cities'] = cities[1:]
     return flask.render_template(template_fname, **kwargs)
 
 
@@ -126,6 +163,141 @@ def lexical_form():
                                  response=response, lexical_form=form)
 
 
+@api.route('/autocomplete')
+def autocomplete():
+    """
+    Get the most populated cities whose names start with the given prefix.
+
+    :returns: Flask response
+    """
+    extra_query_params = [key for key in flask.request.args
+                          if key not in {'prefix', 'limit'}]
+    if extra_query_params:
+        message = 'invalid query parameters: {}'.format(
+            ','.join(extra_query_params))
+        error_type = 'UNSUPPORTED_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    prefix = flask.request.args.get('prefix', '').strip()
+    if not prefix:
+        message = 'no value was provided to prefix query parameter'
+        error_type = 'MISSING_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    try:
+        limit = int(flask.request.args['limit'])
+        if not 1 <= limit <= config.MAX_AUTOCOMPLETE_LIMIT:
+            raise ValueError("invalid value for parameter limit")
+    except KeyError:
+        # Choose default
+        limit = config.DEFAULT_AUTOCOMPLETE_LIMIT
+    except ValueError:
+        message = "query parameter 'limit' needs to be an integer between " \
+                  "1 and {}: {}".format(config.MAX_AUTOCOMPLETE_LIMIT,
+                                        flask.request.args['limit'])
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    matches = autocomplete_query(prefix, limit=limit)
+    fragments = dict(fragment_query([city.id for _, city in matches]))
+    cities = [serializer.dumps_object({'match': name,
+                                       'population': city.population},
+                                      city=fragments[city.id])
+              for name, city in matches]
+
+    return serializer.json_response(serializer.dumps_object(
+        {'limit': limit, 'prefix': prefix},
+        cities='[' + ','.join(cities) + ']'))
+
+
+@api.route('/batch/proximity', methods=['POST'])
+def batch_proximity():
+    """
+    Get the cities closest to each of many origins, given in a JSON body:
+    {"origins": [<cityID> or {"lat": <latitude>, "lon": <longitude>}, ...],
+    "k": <limit>, "countryCode": <code>}
+
+    :returns: Flask response
+    """
+    body = flask.request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('origins'),
+                                                    list):
+        message = "request body needs to be a JSON object with a list of " \
+                  "origins"
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    extra_fields = [key for key in body
+                    if key not in {'origins', 'k', 'countryCode'}]
+    if extra_fields:
+        message = 'invalid fields: {}'.format(','.join(sorted(extra_fields)))
+        error_type = 'UNSUPPORTED_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    try:
+        origins = _parse_origins(body['origins'])
+        k = body.get('k', config.DEFAULT_PROXIMITY_LIMIT)
+        if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+            raise ValueError("field 'k' needs to be a positive integer: "
+                             "{}".format(k))
+        if len(origins) * k > config.MAX_BATCH_RESULTS:
+            fstr = "number of origins times k needs to be at most {}: {}"
+            raise ValueError(fstr.format(config.MAX_BATCH_RESULTS,
+                                         len(origins) * k))
+    except ValueError as exc:
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(str(exc), error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    country_code = body.get('countryCode')
+    if country_code is not None:
+        country_code = str(country_code).upper()
+
+    try:
+        values = batch_proximity_query(origins, country_code=country_code,
+                                       limit=k)
+    except GlobeIndexerError as exc:
+        error_type = 'INVALID_PARAMETER_VALUE'
+        return utils.formulate_json_error(exc.message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    fragments = dict(fragment_query(
+        {value[1] for results in values for value in results}))
+    results = list()
+    for origin_values in values:
+        cities = [serializer.dumps_object({'distance': distance},
+                                          city=fragments[city_id])
+                  for distance, city_id in origin_values
+                  if city_id in fragments]
+        results.append('{"cities":[' + ','.join(cities) + ']}')
+
+    return serializer.json_response(serializer.dumps_object(
+        {'limit': k}, results='[' + ','.join(results) + ']'))
+
+
+@api.route('/countries')
+def countries():
+    """
+    Get the country codes present in the data, with the name of the country
+    and the number of cities. The response carries the version of the
+    catalogue as its ETag, so clients can revalidate it cheaply.
+
+    :returns: Flask response
+    """
+    catalogue = country_catalogue_query()
+    response = serializer.json_response(catalogue.body)
+    response.set_etag(catalogue.version)
+    response.cache_control.public = True
+    response.cache_control.max_age = flask.current_app.config.get(
+        'COUNTRIES_MAX_AGE', config.COUNTRIES_MAX_AGE)
+    return response.make_conditional(flask.request)
+
+
 # Icon for the website
 # taken from http://findicons.com/files/icons/98/nx11/256/internet_real.png
 @api.route('/favicon.ico')
@@ -147,14 +319,14 @@ def geoname(geoname_id):
     :param geoname_id: int - ID associated with a city
     :returns: Flask response
     """
-    result = GeoName.query.filter_by(id=geoname_id).first()
+    result = city_query([geoname_id])
     if not result:
         message = "no city is found with ID: {}".format(geoname_id)
         error_type = 'INVALID_PATH'
         return utils.formulate_json_error(message, error_type,
                                           StatusCodes.NOT_FOUND)
 
-    return flask.jsonify(result.json(compact=False))
+    return flask.jsonify(result[0].json(compact=False))
 
 
 @api.route('/health')
@@ -164,7 +336,17 @@ def health():
 
     :returns: Flask response
     """
-    return flask.jsonify({'message': 'API is available'})
+    startup = flask.current_app.extensions.get(STARTUP_EXTENSION)
+    if startup is None:
+        return flask.jsonify({'message': 'API is available'})
+
+    payload = startup.status()
+    if startup.ready:
+        payload['message'] = 'API is available'
+        return flask.jsonify(payload)
+    payload['message'] = 'API is starting' if startup.phase != 'failed' \
+        else 'API failed to start'
+    return flask.jsonify(payload), StatusCodes.SERVICE_UNAVAILABLE
 
 
 @api.route('/lexical')
@@ -181,7 +363,8 @@ def lexical():
                                           StatusCodes.BAD_REQUEST)
 
     extra_query_params = [key for key in flask.request.args
-                          if key not in {'cityName'}]
+                          if key not in {'cityName', 'limit', 'afterId',
+                                         'format'}]
     if extra_query_params:
         message = 'invalid query parameters: {}'.format(
             ','.join(extra_query_params))
@@ -189,6 +372,12 @@ def lexical():
         return utils.formulate_json_error(message, error_type,
                                           StatusCodes.BAD_REQUEST)
 
+    if 'cityName' not in flask.request.args:
+        message = 'no cityName query string was provided'
+        error_type = 'MISSING_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
     city_name = flask.request.args['cityName']
     if utils.has_invalid_chars(city_name):
         message = 'found invalid chars in parameter: {}'.format(city_name)
@@ -204,15 +393,53 @@ def lexical():
         return utils.formulate_json_error(message, error_type,
                                           StatusCodes.BAD_REQUEST)
 
-    results = lexical_query(words)
-    if not results:
+    try:
+        limit = _get_positive_int_arg('limit')
+        after_id = _get_positive_int_arg('afterId')
+    except ValueError as exc:
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(str(exc), error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    response_format = flask.request.args.get('format', 'json')
+    if response_format not in {'json', 'ndjson'}:
+        message = "query parameter 'format' needs to be either json or " \
+                  "ndjson: {}".format(response_format)
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    ids = lexical_id_query(words)
+    if not ids:
         message = 'found no city with the provided name: {}'.format(city_name)
         error_type = 'INVALID_PARAMETER_VALUE'
         return utils.formulate_json_error(message, error_type,
                                           StatusCodes.NOT_FOUND)
 
-    cities = [city.json() for city in results]
-    return flask.jsonify({'cities': cities, 'total': len(cities)})
+    # Keyset pagination over the IDs, which are sorted
+    page = ids
+    if after_id is not None:
+        page = page[bisect.bisect_right(page, after_id):]
+    if limit is not None:
+        page = page[:limit]
+
+    if response_format == 'ndjson':
+        def generate():
+            for start in range(0, len(page), config.SQL_IN_CLAUSE_LIMIT):
+                chunk = page[start:start + config.SQL_IN_CLAUSE_LIMIT]
+                for _, fragment in fragment_query(chunk):
+                    yield fragment + '\n'
+        return flask.Response(flask.stream_with_context(generate()),
+                              mimetype=NDJSON_MIMETYPE)
+
+    payload = {'total': len(ids)}
+    if limit is not None:
+        payload['limit'] = limit
+        has_next = page and page[-1] != ids[-1]
+        payload['next_after_id'] = page[-1] if has_next else None
+    cities = [fragment for _, fragment in fragment_query(page)]
+    return serializer.json_response(serializer.dumps_object(
+        payload, cities='[' + ','.join(cities) + ']'))
 
 
 @api.route('/proximity/<int:geoname_id>')
@@ -234,14 +461,15 @@ def proximity(geoname_id):
 
     try:
         k = int(flask.request.args['k'])
-        if k < 1:
+        if not 1 <= k <= config.MAX_PROXIMITY_LIMIT:
             raise ValueError("invalid value for parameter k")
     except KeyError:
         # Choose default
         k = config.DEFAULT_PROXIMITY_LIMIT
     except ValueError:
-        message = "query parameter 'k' needs to be a positive " \
-                  "integer: {}".format(flask.request.args['k'])
+        message = "query parameter 'k' needs to be an integer between " \
+                  "1 and {}: {}".format(config.MAX_PROXIMITY_LIMIT,
+                                        flask.request.args['k'])
         error_type = 'VALIDATION_ERROR'
         return utils.formulate_json_error(message, error_type,
                                           StatusCodes.BAD_REQUEST)
@@ -252,18 +480,146 @@ def proximity(geoname_id):
         country_code = None
 
     try:
-        values = proximity_query(geoname_id, country_code=country_code)
+        values = proximity_query(geoname_id, country_code=country_code,
+                                 limit=k)
+        total = proximity_total(geoname_id, country_code=country_code)
     except GlobeIndexerError as exc:
         error_type = 'INVALID_PARAMETER_VALUE'
         return utils.formulate_json_error(exc.message, error_type,
                                           StatusCodes.BAD_REQUEST)
 
-    cities = [{'city': GeoName.query.filter_by(id=value[1]).first().json(),
-               'distance': value[0]}
-              for value in values[:k]]
+    distances = {value[1]: value[0] for value in values}
+    cities = [serializer.dumps_object({'distance': distances[city_id]},
+                                      city=fragment)
+              for city_id, fragment in
+              fragment_query([value[1] for value in values])]
+
+    return serializer.json_response(serializer.dumps_object(
+        {'limit': k, 'total_available': total},
+        cities='[' + ','.join(cities) + ']'))
+
+
+@api.route('/radius')
+@api.route('/radius/<int:geoname_id>')
+def radius(geoname_id=None):
+    """
+    Get every city within a radius (in kilometers) of a city or of a
+    coordinate, sorted by distance.
+
+    :param geoname_id: int - ID associated with a city. The coordinate is
+                       taken from the lat and lon query parameters if it's not
+                       specified.
+    :returns: Flask response
+    """
+    allowed = {'r', 'countryCode'}
+    if geoname_id is None:
+        allowed.update(('lat', 'lon'))
+    extra_query_params = [key for key in flask.request.args
+                          if key not in allowed]
+    if extra_query_params:
+        message = 'invalid query parameters: {}'.format(
+            ','.join(extra_query_params))
+        error_type = 'UNSUPPORTED_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    missing = [key for key in sorted(allowed - {'countryCode'})
+               if key not in flask.request.args]
+    if missing:
+        message = 'missing query parameters: {}'.format(','.join(missing))
+        error_type = 'MISSING_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    try:
+        distance = _get_float_arg('r', 0, config.MAX_RADIUS)
+        if geoname_id is None:
+            latitude = _get_float_arg('lat', -90, 90)
+            longitude = _get_float_arg('lon', -180, 180)
+    except ValueError as exc:
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(str(exc), error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    if geoname_id is not None:
+        center = city_query([geoname_id])
+        if not center:
+            message = "no city is found with ID: {}".format(geoname_id)
+            error_type = 'INVALID_PATH'
+            return utils.formulate_json_error(message, error_type,
+                                              StatusCodes.NOT_FOUND)
+        latitude, longitude = center[0].latitude, center[0].longitude
+
+    try:
+        country_code = str(flask.request.args['countryCode']).upper()
+    except KeyError:
+        country_code = None
+
+    values = radius_query(latitude, longitude, distance,
+                          country_code=country_code, exclude=geoname_id)
+    distances = {value[1]: value[0] for value in values}
+    cities = [serializer.dumps_object({'distance': distances[city_id]},
+                                      city=fragment)
+              for city_id, fragment in
+              fragment_query([value[1] for value in values])]
 
-    return flask.jsonify({'cities': cities, 'limit': k,
-                          'total_available': len(values)})
+    return serializer.json_response(serializer.dumps_object(
+        {'latitude': latitude, 'longitude': longitude, 'radius': distance,
+         'total': len(cities)},
+        cities='[' + ','.join(cities) + ']'))
+
+
+@api.route('/reverse')
+def reverse():
+    """
+    Get the cities closest to a coordinate, e.g. the nearest city of a GPS
+    position. Served from the resident spatial index only.
+
+    :returns: Flask response
+    """
+    extra_query_params = [key for key in flask.request.args
+                          if key not in {'lat', 'lon', 'k', 'countryCode'}]
+    if extra_query_params:
+        message = 'invalid query parameters: {}'.format(
+            ','.join(extra_query_params))
+        error_type = 'UNSUPPORTED_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    missing = [key for key in ('lat', 'lon')
+               if key not in flask.request.args]
+    if missing:
+        message = 'missing query parameters: {}'.format(','.join(missing))
+        error_type = 'MISSING_QUERY_PARAMETER'
+        return utils.formulate_json_error(message, error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    try:
+        latitude = _get_float_arg('lat', -90, 90)
+        longitude = _get_float_arg('lon', -180, 180)
+        k = _get_positive_int_arg('k', maximum=config.MAX_REVERSE_LIMIT) \
+            or config.DEFAULT_REVERSE_LIMIT
+    except ValueError as exc:
+        error_type = 'VALIDATION_ERROR'
+        return utils.formulate_json_error(str(exc), error_type,
+                                          StatusCodes.BAD_REQUEST)
+
+    try:
+        country_code = str(flask.request.args['countryCode']).upper()
+    except KeyError:
+        country_code = None
+
+    values = reverse_query(latitude, longitude, country_code=country_code,
+                           limit=k)
+    distances = {value[1]: value[0] for value in values}
+    cities = [serializer.dumps_object({'distance': distances[city_id]},
+                                      city=fragment)
+              for city_id, fragment in
+              fragment_query([value[1] for value in values])]
+
+    return serializer.json_response(serializer.dumps_object(
+        {'latitude': latitude, 'longitude': longitude, 'limit': k},
+        cities='[' + ','.join(cities) + ']'))
 
 
 @api.route('/static/style.css')
@@ -274,3 +630,85 @@ def style_css():
     """
     return flask.send_from_directory(os.path.join(api.root_path, 'static'),
                                      'style.css')
+
+
+# Private functions
+def _get_float_arg(name, minimum, maximum):
+    """
+    Get the value of a query parameter that should be a number within the
+    given bounds
+
+    :param name: string - name of the query parameter
+    :param minimum: float - inclusive lower bound
+    :param maximum: float - inclusive upper bound
+    :returns: float
+    :raises ValueError: if the value is not a finite number within the
+                        bounds
+    """
+    value = flask.request.args[name]
+    try:
+        result = float(value)
+    except ValueError:
+        result = float('nan')
+    if not math.isfinite(result) or not minimum <= result <= maximum:
+        raise ValueError("query parameter '{}' needs to be a number between "
+                         "{} and {}: {}".format(name, minimum, maximum, value))
+    return result
+
+
+def _parse_origins(values):
+    """
+    Validate the origins of a batch request
+
+    :param values: list - each element is either the ID of a city or a dict
+                   with lat and lon keys
+    :returns: list of int or tuple (latitude, longitude)
+    :raises ValueError: if an origin is invalid or there are too many
+    """
+    if not 1 <= len(values) <= config.MAX_BATCH_ORIGINS:
+        fstr = "number of origins needs to be between 1 and {}: {}"
+        raise ValueError(fstr.format(config.MAX_BATCH_ORIGINS, len(values)))
+
+    origins = list()
+    for index, value in enumerate(values):
+        if isinstance(value, int) and not isinstance(value, bool):
+            origins.append(value)
+            continue
+
+        try:
+            latitude, longitude = float(value['lat']), float(value['lon'])
+        except (KeyError, TypeError, ValueError):
+            latitude = longitude = float('nan')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("origin {} needs to be a city ID or an object "
+                             "with valid lat and lon: {}".format(index, value))
+        origins.append((latitude, longitude))
+    return origins
+
+
+def _get_positive_int_arg(name, maximum=None):
+    """
+    Get the value of an optional query parameter that should be a positive
+    integer
+
+    :param name: string - name of the query parameter
+    :param maximum: int - greatest value allowed, if any
+    :returns: int or None if the parameter was not provided
+    :raises ValueError: if the value is not a positive integer or is
+                        greater than the maximum
+    """
+    if name not in flask.request.args:
+        return None
+
+    value = flask.request.args[name]
+    try:
+        result = int(value)
+    except ValueError:
+        result = 0
+    if maximum is not None and not 1 <= result <= maximum:
+        raise ValueError("query parameter '{}' needs to be an integer "
+                         "between 1 and {}: {}".format(name, maximum, value))
+    if result < 1:
+        raise ValueError("query parameter '{}' needs to be a positive "
+                         "integer: {}".format(name, value))
+    return result
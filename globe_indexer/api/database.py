@@ -4,42 +4,803 @@
 Globe Indexer API Database Module
 
 Interface functions:
+    apply_geoname_updates
+    build_indexes
+    build_scale_indexes
     initialize_db
+    is_db_empty
+    load_geoname_file
+    load_geoname_rows
+    load_snapshot
+    open_scale_indexes
+    precompute_neighbours
+    save_snapshot
+    sync_db
+    update_indexes
 """
 
 # Standard libraries
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import multiprocessing
 import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+
+# SQLAlchemy
+from sqlalchemy import bindparam, func, text
 
 # Globe Indexer
-from globe_indexer.config import DATA_SET_URL
-from globe_indexer.api.models import GeoName
+from globe_indexer.config import (
+    CITY_MIN_POPULATION,
+    DATA_CONNECTIONS,
+    DATA_LOAD_BATCH_SIZE,
+    DATA_PARSE_CHUNK_SIZE,
+    DATA_PARSE_QUEUE_SIZE,
+    DATA_SET_URL,
+    KNN_TABLE_SIZE,
+    SCALE_MEMORY_BUDGET,
+    SCALE_ROW_COST,
+    SQL_IN_CLAUSE_LIMIT,
+)
+from globe_indexer.api.index import (
+    city_snapshot,
+    city_store,
+    country_catalogue,
+    fragment_store,
+    name_index,
+    neighbour_table,
+    prefix_index,
+    query_cache,
+    spatial_index,
+    token_index,
+)
+from globe_indexer.api.models import COMPACT_JSON_FIELDS, GeoName
+from globe_indexer.distance import PointArray
 from globe_indexer.error import GlobeIndexerError
-from globe_indexer.utils import download_file, parse_geoname_table_file, unzip
+from globe_indexer.neighbours import NeighbourTable
+from globe_indexer.prefix import write_prefix_index
+from globe_indexer.snapshot import FIELDS, Row, write_snapshot
+from globe_indexer.spatial import write_grid
+from globe_indexer.trigram import write_trigram_index
+from globe_indexer.utils import (
+    GEONAME_DELETES_HEADERS,
+    download_file,
+    get_memory_usage,
+    is_city_row,
+    iter_geoname_table_file,
+    iter_zip_blocks,
+    parse_geoname_table_text,
+    split_file,
+)
+
+
+# Constants
+LOGGER = logging.getLogger(__name__)
+
+# SQLite settings trading durability for speed while the table is loaded.
+# A failed load is simply retried from the source file.
+BULK_LOAD_PRAGMAS = (
+    ('synchronous', 'OFF'),
+    ('journal_mode', 'MEMORY'),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', '-65536'),
+)
+
+# Files of the on-disk indexes of the scale mode, see build_scale_indexes
+SCALE_MANIFEST = 'manifest.json'
+SCALE_INDEXES = (
+    ('grid', write_grid, spatial_index),
+    ('trigram', write_trigram_index, name_index),
+    ('prefix', write_prefix_index, prefix_index),
+)
+
+# Daily files of GeoNames, e.g. modifications-2024-01-31.txt
+UPDATE_FILE_RGX = re.compile(
+    r'(?P<kind>modifications|deletes)-(?P<date>\d{4}-\d{2}-\d{2})\.txt')
 
 
 # Interface functions
-def initialize_db(db, fpath, **kwargs):
+def apply_geoname_updates(db, rows, deleted_ids,
+                          min_population=CITY_MIN_POPULATION,
+                          memory_budget=SCALE_MEMORY_BUDGET):
+    """
+    Upsert rows of the GeoNames table and delete cities, keyed by ID, and
+    bring the resident indexes up to date in place (see
+    :func:`update_indexes`).
+
+    A row older (by modification date) than the city stored in the database
+    is skipped. A row that no longer describes a city of the data set (see
+    :func:`utils.is_city_row`) removes the city, and is skipped if the city
+    is unknown. Every row is kept if the minimum population is None, as in
+    the complete gazetteer.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param rows: iterable of dict - rows of the GeoNames table
+    :param deleted_ids: iterable of int - IDs of the cities to delete, taking
+                        precedence over the rows
+    :param min_population: int - see :func:`utils.is_city_row`, or None to
+                           keep every row
+    :param memory_budget: int - see :func:`update_indexes`
+    :returns: dict - number of cities inserted, updated, deleted and
+              skipped
+    """
+    deleted = set(deleted_ids)
+    values = dict()
+    skipped = 0
+    for row in rows:
+        geoname_id = int(row['geonameid'])
+        if min_population is None or \
+                is_city_row(row, min_population=min_population):
+            values[geoname_id] = GeoName.parse_row(row)
+        else:
+            deleted.add(geoname_id)
+    for geoname_id in deleted:
+        values.pop(geoname_id, None)
+
+    existing = _select_rows(db, list(values) + list(deleted))
+    for geoname_id, value in list(values.items()):
+        stored_date = existing.get(geoname_id, (None, None))[0]
+        if stored_date is not None and value['modification_date'] is not None \
+                and stored_date > value['modification_date']:
+            del values[geoname_id]
+            skipped += 1
+    skipped += len(deleted.difference(existing))
+    deleted.intersection_update(existing)
+
+    table = GeoName.__table__
+    inserts = [value for geoname_id, value in values.items()
+               if geoname_id not in existing]
+    updates = list()
+    for geoname_id, value in values.items():
+        if geoname_id in existing:
+            value = dict(value, geoname_id=geoname_id)
+            del value['id']
+            updates.append(value)
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+    if updates:
+        # The columns to set are taken from the parameters
+        statement = table.update().where(table.c.id == bindparam('geoname_id'))
+        db.session.execute(statement, updates)
+    ids = sorted(deleted)
+    for start in range(0, len(ids), SQL_IN_CLAUSE_LIMIT):
+        chunk = ids[start:start + SQL_IN_CLAUSE_LIMIT]
+        db.session.execute(table.delete().where(table.c.id.in_(chunk)))
+    db.session.commit()
+
+    update_indexes(
+        db, [Row(*[value[field] for field in FIELDS])
+             for value in values.values()],
+        [existing[geoname_id][1] for geoname_id in sorted(existing)
+         if geoname_id in values or geoname_id in deleted],
+        memory_budget=memory_budget)
+    counts = {'inserted': len(inserts), 'updated': len(updates),
+              'deleted': len(deleted), 'skipped': skipped}
+    LOGGER.info("applied updates: %s", counts)
+    return counts
+
+
+def build_indexes(db, snapshot=None):
+    """
+    Build the resident indexes from the content of the database (or of a
+    snapshot), and drop the cached query results. The nearest neighbour
+    table is released until :func:`precompute_neighbours` brings it up to
+    date again.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param snapshot: instance of :class:`snapshot.Snapshot` to read the
+                     cities from instead of the database
+    """
+    if snapshot is None:
+        rows = [Row(*row) for row in _query_snapshot_rows(db)]
+    else:
+        rows = list(snapshot.rows())
+
+    for index, values in _index_rows(rows):
+        index.load(values)
+    country_catalogue.load(spatial_index.catalogue())
+    neighbour_table.unload()
+    query_cache.invalidate()
+
+
+def build_scale_indexes(dpath, snapshot, memory_budget=SCALE_MEMORY_BUDGET):
+    """
+    Write the on-disk indexes of the cities of a snapshot under a directory,
+    to be memory mapped by :func:`open_scale_indexes`. The cities are read
+    from the snapshot one chunk at a time, the size of the chunks being set
+    by the memory budget (see :data:`config.SCALE_ROW_COST`), so that the
+    memory used doesn't grow with the number of cities.
+
+    :param dpath: string - path to the directory
+    :param snapshot: instance of :class:`snapshot.Snapshot`
+    :param memory_budget: int - budget (in bytes) of the private memory of
+                          the process
+    :returns: int - number of cities indexed
+    """
+    start = time.time()
+    size = max(1, memory_budget // SCALE_ROW_COST)
+
+    def chunks(index):
+        def iter_chunks():
+            for position in range(0, len(snapshot), size):
+                rows = list(snapshot.rows(position, position + size))
+                yield list(dict(_index_rows(rows))[index])
+        return iter_chunks
+
+    # The indexes are written into a new directory renamed into place once
+    # complete, so that no process maps a partial or mixed set of indexes
+    parent_dpath = os.path.dirname(os.path.abspath(dpath))
+    os.makedirs(parent_dpath, exist_ok=True)
+    tmp_dpath = tempfile.mkdtemp(dir=parent_dpath,
+                                 prefix=os.path.basename(dpath) + '.')
+    os.chmod(tmp_dpath, 0o755)
+    try:
+        for name, writer, index in SCALE_INDEXES:
+            writer(os.path.join(tmp_dpath, name), chunks(index))
+        with open(os.path.join(tmp_dpath, SCALE_MANIFEST), 'w') as fout:
+            json.dump(_snapshot_identity(snapshot.fpath), fout)
+        _replace_directory(tmp_dpath, dpath)
+    except BaseException:
+        shutil.rmtree(tmp_dpath, ignore_errors=True)
+        raise
+
+    usage = get_memory_usage()
+    LOGGER.info("wrote the on-disk indexes of %d cities in %.1fs (private "
+                "memory: %d MiB)", len(snapshot), time.time() - start,
+                usage['private'] // 2 ** 20)
+    if usage['private'] > memory_budget:
+        LOGGER.warning("private memory above the budget of %d MiB",
+                       memory_budget // 2 ** 20)
+    return len(snapshot)
+
+
+def initialize_db(db, fpath, batch_size=DATA_LOAD_BATCH_SIZE, progress=None,
+                  url=DATA_SET_URL, checksum=None,
+                  connections=DATA_CONNECTIONS, processes=1, indexes=True,
+                  **kwargs):
     """
-    Initialize the content of the database if none exists.
+    Initialize the content of the database if none exists, and build the
+    resident indexes. If the file doesn't exist, the data set is downloaded
+    into a zip file next to it and parsed straight from the zip file.
 
     :param db: instance of :class:`flask_alchemy.SQLAlchemy`
     :param fpath: string - Path to the input csv/text file
+    :param batch_size: int - number of rows per INSERT statement
+    :param progress: callable - see :func:`load_geoname_rows`
+    :param url: string - URL of the zipped data set
+    :param checksum: string - expected SHA-256 digest of the zipped data set
+    :param connections: int - maximum number of parallel range requests
+                        downloading the data set
+    :param processes: int - number of worker processes parsing the data set,
+                      see :func:`load_geoname_file`
+    :param indexes: boolean - whether to build the resident indexes
     :param kwargs: dict - extra arguments to be passed to
-                   :function:`utils.parse_geoname_table_file`
+                   :function:`utils.parse_geoname_table_text`
     """
     # Load the data if none is present
-    if db.session.query(GeoName).count() == 0:
+    if is_db_empty(db):
+        member = None
         if not os.path.isfile(fpath):
-            # download from the source and place it in the fpath
+            # A zip file is only left once complete and verified
             zip_fpath = os.path.join(os.path.dirname(fpath), 'cities.zip')
-            download_file(DATA_SET_URL, zip_fpath)
-            unzip(zip_fpath, os.path.dirname(fpath))
+            if not os.path.isfile(zip_fpath):
+                download_file(url, zip_fpath, checksum=checksum,
+                              connections=connections)
+            fpath, member = zip_fpath, os.path.basename(fpath)
+
+        load_geoname_file(db, fpath, member=member, processes=processes,
+                          batch_size=batch_size, progress=progress, **kwargs)
+
+    if indexes:
+        build_indexes(db)
+
+
+def is_db_empty(db):
+    """
+    Check if no city has been loaded into the database yet, without counting
+    them
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :returns: boolean
+    """
+    return db.session.query(GeoName.id).limit(1).scalar() is None
+
+
+def load_geoname_rows(db, rows, batch_size=DATA_LOAD_BATCH_SIZE,
+                      progress=None):
+    """
+    Stream rows of the GeoNames table into the database using one
+    executemany INSERT per batch, so that only one batch is held in memory.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param rows: iterable of dict - rows of the GeoNames table
+    :param batch_size: int - number of rows per INSERT statement
+    :param progress: callable - called after each batch with the number of
+                     rows loaded so far and the elapsed time in seconds
+    :returns: int - number of rows loaded
+    """
+    return _insert_values(db, (GeoName.parse_row(row) for row in rows),
+                          batch_size=batch_size, progress=progress)
+
+
+def load_geoname_file(db, fpath, member=None, processes=None,
+                      batch_size=DATA_LOAD_BATCH_SIZE, progress=None,
+                      chunk_size=DATA_PARSE_CHUNK_SIZE, **kwargs):
+    """
+    Load a file of the GeoNames table (plain or zipped) into the database,
+    parsing it in parallel.
+
+    The file is split into chunks of whole lines (byte ranges read by the
+    workers themselves, or blocks of text decompressed by the caller for a
+    zip file) parsed and converted by a pool of worker processes. The parsed
+    chunks are handed in order to the caller, the only writer, through a
+    queue bounded to :data:`config.DATA_PARSE_QUEUE_SIZE` chunks per worker.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param fpath: string - path to the text or zip file
+    :param member: string - name of the table in the zip file, see
+                   :func:`utils.iter_zip_blocks`
+    :param processes: int - number of worker processes. Defaults to the
+                      number of CPUs. The file is parsed by the caller if
+                      it's 1.
+    :param batch_size: int - number of rows per INSERT statement
+    :param progress: callable - see :func:`load_geoname_rows`
+    :param chunk_size: int - approximate size of a chunk in bytes
+    :param kwargs: dict - extra arguments to be passed to
+                   :func:`utils.parse_geoname_table_text`
+    :returns: int - number of rows loaded
+    """
+    if not os.path.isfile(fpath):
+        fstr = "path is not a file: {}".format(fpath)
+        raise GlobeIndexerError(fstr)
+    if zipfile.is_zipfile(fpath):
+        chunks = iter_zip_blocks(fpath, chunk_size, member=member)
+    else:
+        chunks = ((fpath, start, end)
+                  for start, end in split_file(fpath, chunk_size))
+
+    processes = processes or os.cpu_count() or 1
+    return _insert_values(db, _iter_parsed_chunks(chunks, processes, kwargs),
+                          batch_size=batch_size, progress=progress)
+
+
+def load_snapshot(db, fpath, scale_dpath=None,
+                  memory_budget=SCALE_MEMORY_BUDGET):
+    """
+    Map a snapshot written by :func:`save_snapshot` and build the resident
+    indexes from it, without querying the database.
+
+    In scale mode, the cities are served from on-disk indexes instead (see
+    :func:`open_scale_indexes`), which are written first if they are
+    missing or were written from another snapshot.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param fpath: string - path to the snapshot file
+    :param scale_dpath: string - path to the directory of the on-disk
+                        indexes, enabling the scale mode
+    :param memory_budget: int - see :func:`build_scale_indexes`
+    :returns: int - number of cities
+    """
+    start = time.time()
+    city_snapshot.open(fpath)
+    if scale_dpath is None:
+        build_indexes(db, snapshot=city_snapshot)
+    else:
+        if _read_manifest(scale_dpath) != _snapshot_identity(fpath):
+            build_scale_indexes(scale_dpath, city_snapshot,
+                                memory_budget=memory_budget)
+        open_scale_indexes(scale_dpath, city_snapshot)
+    LOGGER.info("loaded %d cities from the snapshot in %.1fs",
+                len(city_snapshot), time.time() - start)
+    return len(city_snapshot)
+
+
+def open_scale_indexes(dpath, snapshot):
+    """
+    Serve the cities from a snapshot and from the on-disk indexes written by
+    :func:`build_scale_indexes`, all memory mapped, in place of the resident
+    indexes. The memory used doesn't grow with the number of cities, but
+    the indexes can only be updated by writing them again (see
+    :func:`update_indexes`).
+
+    :param dpath: string - path to the directory of the indexes
+    :param snapshot: instance of :class:`snapshot.Snapshot`
+    """
+    for name, _, index in SCALE_INDEXES:
+        index.open(os.path.join(dpath, name))
+    # The token index shares the sorted names of the prefix index
+    token_index.open(os.path.join(dpath, 'prefix'))
+    city_store.open(snapshot)
+    fragment_store.open(_select_fragments)
+    country_catalogue.load(spatial_index.catalogue())
+    neighbour_table.unload()
+    query_cache.invalidate()
+
+
+def precompute_neighbours(db, dpath, k=KNN_TABLE_SIZE, processes=None):
+    """
+    Materialize the k nearest neighbours of every city into a table saved
+    under the directory, and serve it (memory mapped) for proximity queries
+    without country filter. A table previously saved there is updated
+    incrementally: only the rows affected by the cities added, moved or
+    removed since then are recomputed.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param dpath: string - path to the directory of the table
+    :param k: int - number of neighbours per city
+    :param processes: int - number of worker processes. Defaults to the
+                      number of CPUs.
+    :returns: int - number of rows recomputed
+    """
+    start = time.time()
+    points = PointArray.from_rows(
+        db.session.query(GeoName.id, GeoName.latitude, GeoName.longitude))
+
+    table = NeighbourTable()
+    exists = os.path.isfile(os.path.join(dpath, 'ids.npy'))
+    if exists:
+        table.load(dpath)
+    count = table.update(points, k=k, processes=processes)
+    if count or not exists:
+        table.save(dpath)
+
+    neighbour_table.load(dpath)
+    query_cache.invalidate()
+    LOGGER.info("recomputed %d of %d nearest neighbour rows in %.1fs", count,
+                len(points), time.time() - start)
+    return count
+
+
+def save_snapshot(db, fpath):
+    """
+    Write a snapshot (see :mod:`snapshot`) of the cities in the database
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param fpath: string - path to the snapshot file
+    :returns: int - number of cities written
+    """
+    rows = _query_snapshot_rows(db).yield_per(DATA_LOAD_BATCH_SIZE)
+    return write_snapshot(fpath, rows)
 
-            if not os.path.isfile(fpath):
-                fstr = "cannot retrieve the file: {}".format(fpath)
-                raise GlobeIndexerError(fstr)
 
-        for row in parse_geoname_table_file(fpath, **kwargs):
-            point = GeoName(row)
-            db.session.add(point)
+def sync_db(db, dpath, since=None, min_population=CITY_MIN_POPULATION,
+            memory_budget=SCALE_MEMORY_BUDGET):
+    """
+    Apply the daily modification and deletion files of GeoNames found in a
+    directory (modifications-YYYY-MM-DD.txt and deletes-YYYY-MM-DD.txt) in
+    date order, with the modifications of a day applied before its
+    deletions. See :func:`apply_geoname_updates`.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param dpath: string - path to the directory of the files
+    :param since: datetime.date - only apply the files of this date or
+                  later. Defaults to the latest modification date of the
+                  cities in the database, applying every file if it's empty.
+    :param min_population: int - see :func:`apply_geoname_updates`
+    :param memory_budget: int - see :func:`update_indexes`
+    :returns: dict - number of cities inserted, updated, deleted and
+              skipped
+    """
+    if since is None:
+        since = db.session.query(func.max(GeoName.modification_date)).scalar()
+
+    fpaths = list()
+    for fname in os.listdir(dpath):
+        match = UPDATE_FILE_RGX.fullmatch(fname)
+        if match is None:
+            continue
+        date = datetime.datetime.strptime(match.group('date'),
+                                          '%Y-%m-%d').date()
+        if since is None or date >= since:
+            fpaths.append((date, match.group('kind') == 'deletes',
+                           os.path.join(dpath, fname)))
+
+    # Later files override earlier ones
+    changes = dict()
+    for _, deletes, fpath in sorted(fpaths):
+        LOGGER.info("reading updates from %s", fpath)
+        if deletes:
+            for row in iter_geoname_table_file(
+                    fpath, fieldnames=GEONAME_DELETES_HEADERS):
+                changes[int(row['geonameid'])] = None
+        else:
+            for row in iter_geoname_table_file(fpath):
+                changes[int(row['geonameid'])] = row
+
+    return apply_geoname_updates(
+        db, [row for row in changes.values() if row is not None],
+        [geoname_id for geoname_id, row in changes.items() if row is None],
+        min_population=min_population, memory_budget=memory_budget)
+
+
+def update_indexes(db, rows, removed, memory_budget=SCALE_MEMORY_BUDGET):
+    """
+    Bring the resident indexes up to date with cities added, changed or
+    removed, without rebuilding them from the whole data. The nearest
+    neighbour table is updated incrementally (and saved) if it's being
+    served, the snapshot is rewritten if it's mapped, and the cached query results are
+    dropped. Indexes that haven't been built yet are left alone, since they
+    are built from the database on first use.
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param rows: list of :class:`snapshot.Row` - cities added or changed
+    :param removed: list of :class:`snapshot.Row` - cities removed or
+                    changed, as they were indexed
+    :param memory_budget: int - budget (in bytes) of the private memory of
+                          the process while the on-disk indexes are written
+                          again, see :func:`build_scale_indexes`
+    """
+    if spatial_index.dpath is not None:
+        # The on-disk indexes are written again from the updated snapshot
+        dpath = os.path.dirname(spatial_index.dpath)
+        save_snapshot(db, city_snapshot.fpath)
+        city_snapshot.open(city_snapshot.fpath)
+        build_scale_indexes(dpath, city_snapshot,
+                            memory_budget=memory_budget)
+        open_scale_indexes(dpath, city_snapshot)
+        return
+
+    if spatial_index.loaded:
+        start = time.time()
+        for (index, values), (_, removed_values) in zip(_index_rows(rows),
+                                                        _index_rows(removed)):
+            index.update(list(values), list(removed_values))
+        country_catalogue.load(spatial_index.catalogue())
+        if neighbour_table.loaded:
+            count = neighbour_table.update(spatial_index.points(),
+                                           k=neighbour_table.k)
+            dpath = neighbour_table.dpath
+            if count and dpath is not None:
+                # Saved for the other processes, and mapped again
+                neighbour_table.save(dpath)
+                neighbour_table.load(dpath)
+        LOGGER.info("updated the indexes with %d cities (%d removed) in "
+                    "%.1fs", len(rows), len(removed), time.time() - start)
+
+    if city_snapshot.loaded:
+        fpath = city_snapshot.fpath
+        save_snapshot(db, fpath)
+        city_snapshot.open(fpath)
+    query_cache.invalidate()
+
+
+# Private functions
+@contextlib.contextmanager
+def _bulk_load_pragmas(db):
+    """
+    Apply :data:`BULK_LOAD_PRAGMAS` while loading into an SQLite database and
+    restore the previous settings afterwards
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    """
+    if db.engine.dialect.name != 'sqlite':
+        yield
+        return
+
+    previous = list()
+    for name, value in BULK_LOAD_PRAGMAS:
+        statement = text('PRAGMA {}'.format(name))
+        current = db.session.execute(statement).scalar()
+        # Leaving write ahead logging needs the readers to be disconnected,
+        # and it already spares the load a rollback journal
+        if name == 'journal_mode' and str(current).lower() == 'wal':
+            continue
+        previous.append((name, current))
+        db.session.execute(text('PRAGMA {} = {}'.format(name, value)))
+    try:
+        yield
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        for name, value in previous:
+            db.session.execute(text('PRAGMA {} = {}'.format(name, value)))
+
+
+def _index_rows(rows):
+    """
+    Get the values of the cities held by each of the resident indexes
+    (besides the country catalogue and the nearest neighbour table)
+
+    :param rows: list of :class:`snapshot.Row`
+    :returns: list of tuple (index, iterable of values in the format of its
+              load method)
+    """
+    names = [
+        (row.id, [row.name, row.ascii_name] +
+         (row.alternate_names or '').split(','), row.population)
+        for row in rows
+    ]
+    return [
+        (spatial_index, ((row.id, row.latitude, row.longitude,
+                          row.country_code, row.cc2) for row in rows)),
+        (city_store, rows),
+        (name_index, ((row.id, row.name) for row in rows)),
+        (fragment_store, ((row.id, {field: getattr(row, field)
+                                    for field in COMPACT_JSON_FIELDS})
+                          for row in rows)),
+        (prefix_index, names),
+        (token_index, ((geoname_id, values)
+                       for geoname_id, values, _ in names)),
+    ]
+
+
+def _insert_values(db, values, batch_size=DATA_LOAD_BATCH_SIZE,
+                   progress=None):
+    """
+    Insert the values of the cities using one executemany INSERT per batch
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param values: iterable of dict - see :meth:`api.models.GeoName.parse_row`
+    :param batch_size: int - number of rows per INSERT statement
+    :param progress: callable - see :func:`load_geoname_rows`
+    :returns: int - number of rows loaded
+    """
+    if batch_size < 1:
+        fstr = "batch size should be a positive integer: {}".format(batch_size)
+        raise GlobeIndexerError(fstr)
+
+    statement = GeoName.__table__.insert()
+    start = time.time()
+    count = 0
+
+    def flush(batch):
+        db.session.execute(statement, batch)
+        elapsed = time.time() - start
+        LOGGER.info("loaded %d cities (%.0f cities/s)", count + len(batch),
+                    (count + len(batch)) / elapsed if elapsed else 0)
+        if progress is not None:
+            progress(count + len(batch), elapsed)
+        return len(batch)
+
+    with _bulk_load_pragmas(db):
+        batch = list()
+        for value in values:
+            batch.append(value)
+            if len(batch) == batch_size:
+                count += flush(batch)
+                batch = list()
+        if batch:
+            count += flush(batch)
         db.session.commit()
+
+    return count
+
+
+def _iter_parsed_chunks(chunks, processes, kwargs):
+    """
+    Parse the chunks in worker processes, keeping a bounded number of parsed
+    chunks waiting to be consumed
+
+    :param chunks: iterable of chunks, see :func:`_parse_chunk`
+    :param processes: int - number of worker processes
+    :param kwargs: dict - see :func:`utils.parse_geoname_table_text`
+    :returns: generator of dict - values of the cities in the order of the
+              chunks
+    """
+    if processes == 1:
+        for chunk in chunks:
+            yield from _parse_chunk(chunk, kwargs)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            if len(pending) >= processes * DATA_PARSE_QUEUE_SIZE:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(_parse_chunk, (chunk, kwargs)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def _parse_chunk(chunk, kwargs):
+    """
+    Parse a chunk of the GeoNames table and convert its rows
+
+    :param chunk: string (whole lines) or tuple (path to the file, start
+                  offset, end offset)
+    :param kwargs: dict - see :func:`utils.parse_geoname_table_text`
+    :returns: list of dict - see :meth:`api.models.GeoName.parse_row`
+    """
+    if not isinstance(chunk, str):
+        fpath, start, end = chunk
+        with open(fpath, 'rb') as fin:
+            fin.seek(start)
+            chunk = fin.read(end - start).decode('utf-8')
+    return [GeoName.parse_row(row)
+            for row in parse_geoname_table_text(chunk, **kwargs)]
+
+
+def _query_snapshot_rows(db):
+    """
+    Query the columns of the snapshot from the database
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :returns: query yielding the values of :data:`snapshot.FIELDS` sorted by
+              ID
+    """
+    query = db.session.query(*[getattr(GeoName, field) for field in FIELDS])
+    return query.order_by(GeoName.id)
+
+
+def _read_manifest(dpath):
+    """
+    Read the manifest of the on-disk indexes written by
+    :func:`build_scale_indexes`
+
+    :param dpath: string - path to the directory of the indexes
+    :returns: dict or None if the indexes are missing
+    """
+    try:
+        with open(os.path.join(dpath, SCALE_MANIFEST)) as fin:
+            return json.load(fin)
+    except FileNotFoundError:
+        return None
+
+
+def _replace_directory(src_dpath, dst_dpath):
+    """
+    Move a directory in place of another one (if any), which is removed.
+    Processes mapping files of the removed directory keep reading them.
+
+    :param src_dpath: string - path to the new directory
+    :param dst_dpath: string - path to replace
+    """
+    if not os.path.isdir(dst_dpath):
+        os.rename(src_dpath, dst_dpath)
+        return
+    # A directory can only be renamed over an empty one
+    old_dpath = tempfile.mkdtemp(dir=os.path.dirname(src_dpath),
+                                 prefix=os.path.basename(dst_dpath) + '.')
+    os.rename(dst_dpath, old_dpath)
+    os.rename(src_dpath, dst_dpath)
+    shutil.rmtree(old_dpath, ignore_errors=True)
+
+
+def _select_fragments(geoname_ids):
+    """
+    Get the compact JSON representation of the cities from the city store,
+    see :meth:`serializer.FragmentStore.open`
+
+    :param geoname_ids: list of int
+    :returns: list of tuple (ID, JSON object)
+    """
+    return [(city.id, city.json()) for city in city_store.select(geoname_ids)]
+
+
+def _select_rows(db, geoname_ids):
+    """
+    Get the cities with the given IDs from the database
+
+    :param db: instance of :class:`flask_alchemy.SQLAlchemy`
+    :param geoname_ids: list of int
+    :returns: dict - ID to tuple (modification date, :class:`snapshot.Row`)
+              for the cities that can be found
+    """
+    columns = [getattr(GeoName, field) for field in FIELDS]
+    rows = dict()
+    for start in range(0, len(geoname_ids), SQL_IN_CLAUSE_LIMIT):
+        chunk = geoname_ids[start:start + SQL_IN_CLAUSE_LIMIT]
+        query = db.session.query(GeoName.modification_date, *columns)
+        for values in query.filter(GeoName.id.in_(chunk)):
+            row = Row(*values[1:])
+            rows[row.id] = (values[0], row)
+    return rows
+
+
+def _snapshot_identity(fpath):
+    """
+    Identify the content of a snapshot file, which is only ever replaced
+
+    :param fpath: string - path to the snapshot file
+    :returns: dict
+    """
+    stat = os.stat(fpath)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
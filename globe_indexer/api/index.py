@@ -0,0 +1,271 @@
+# Filename: index.py
+
+"""
+Globe Indexer API Index Module
+
+Interface classes:
+    SpatialIndex
+"""
+
+# Standard libraries
+import collections
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer.api.records import CityStore
+from globe_indexer.cache import QueryCache
+from globe_indexer.countries import CountryCatalogue
+from globe_indexer.distance import PointArray
+from globe_indexer.error import GlobeIndexerError
+from globe_indexer.neighbours import NeighbourTable
+from globe_indexer.prefix import PrefixIndex
+from globe_indexer.serializer import FragmentStore
+from globe_indexer.snapshot import Snapshot
+from globe_indexer.spatial import Grid, KDTree
+from globe_indexer.tokens import TokenIndex
+from globe_indexer.trigram import TrigramIndex
+
+
+# Interface classes
+class SpatialIndex(object):
+    """
+    Resident spatial index of the cities, with one tree for all cities and
+    one tree per country code so that filtered queries never scan other
+    countries. A city belongs to the partition of its country code and to
+    the partitions of its alternate country codes (cc2).
+
+    A grid written by :func:`spatial.write_grid` can be memory mapped in
+    place of the trees (see :meth:`SpatialIndex.open`), in which case the
+    index cannot be updated.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._locations = dict()
+        self._alternate_codes = dict()
+        self._trees = dict()
+        self.dpath = None
+        self.loaded = False
+
+    def load(self, rows):
+        """
+        (Re)build the index
+
+        :param rows: iterable of tuple (ID, latitude, longitude, country code,
+                     alternate country codes separated by comma or None)
+        """
+        locations = dict()
+        alternate_codes = dict()
+        partitions = collections.defaultdict(list)
+        for geoname_id, latitude, longitude, country_code, cc2 in rows:
+            locations[geoname_id] = (latitude, longitude, country_code)
+            partitions[country_code].append((geoname_id, latitude, longitude))
+            codes = {code for code in (cc2 or '').split(',')
+                     if code and code != country_code}
+            if codes:
+                alternate_codes[geoname_id] = frozenset(codes)
+            for code in codes:
+                partitions[code].append((geoname_id, latitude, longitude))
+
+        trees = {code: KDTree(points) for code, points in partitions.items()}
+        trees[None] = KDTree((geoname_id, value[0], value[1])
+                             for geoname_id, value in locations.items())
+
+        self._locations = locations
+        self._alternate_codes = alternate_codes
+        self._trees = trees
+        self.dpath = None
+        self.loaded = True
+
+    def catalogue(self):
+        """
+        Get the partitions of the index
+
+        :returns: dict - country code to the number of cities in its
+                  partition
+        """
+        return {code: len(tree) for code, tree in self._trees.items()
+                if code is not None}
+
+    def location(self, geoname_id):
+        """
+        Get the coordinate of the city with the given ID
+
+        :param geoname_id: int
+        :returns: tuple of (latitude, longitude, country code)
+        """
+        try:
+            return self._locations[geoname_id]
+        except KeyError:
+            fstr = "cannot find city with ID: {}".format(geoname_id)
+            raise GlobeIndexerError(fstr)
+
+    def nearest(self, geoname_id, limit=None, country_code=None):
+        """
+        Get the cities closest to the city with the given ID
+
+        :param geoname_id: int
+        :param limit: int - maximum number of cities to return
+        :param country_code: string - only consider cities in this country
+        :returns: a sorted list where each element is a tuple of float and
+                  int (distance in kilometers, city ID)
+        """
+        latitude, longitude, _ = self.location(geoname_id)
+        return self.reverse(latitude, longitude, limit=limit,
+                            country_code=country_code, exclude=geoname_id)
+
+    def nearest_many(self, origins, limit=None, country_code=None):
+        """
+        Get the cities closest to each of the origins in one pass, sharing
+        the work between identical origins
+
+        :param origins: iterable where each element is either the ID of a
+                        city (which is left out of its own results) or a
+                        tuple of (latitude, longitude)
+        :param limit: int - maximum number of cities to return per origin
+        :param country_code: string - only consider cities in this country
+        :returns: list with a sorted list of tuple (distance in kilometers,
+                  city ID) per origin
+        """
+        keys = list()
+        for origin in origins:
+            if isinstance(origin, tuple):
+                keys.append((origin[0], origin[1], None))
+            else:
+                latitude, longitude, _ = self.location(origin)
+                keys.append((latitude, longitude, origin))
+
+        tree = self._trees.get(country_code)
+        if tree is None:
+            return [list() for _ in keys]
+
+        unique = list(dict.fromkeys(keys))
+        results = tree.nearest_many([key[0] for key in unique],
+                                    [key[1] for key in unique], k=limit,
+                                    excludes=[key[2] for key in unique])
+        results = dict(zip(unique, results))
+        return [list(results[key]) for key in keys]
+
+    def open(self, dpath):
+        """
+        Map a grid written by :func:`spatial.write_grid`, serving the same
+        queries from its partitions
+
+        :param dpath: string - path to the directory of the grid
+        """
+        grid = Grid(dpath)
+        self._locations = grid.locations
+        self._alternate_codes = grid.alternate_codes
+        self._trees = grid.trees()
+        self.dpath = dpath
+        self.loaded = True
+
+    def points(self):
+        """
+        Get the location of every city
+
+        :returns: instance of :class:`distance.PointArray`
+        """
+        return self._trees[None].points if self.loaded else \
+            PointArray.from_rows(())
+
+    def reverse(self, latitude, longitude, limit=None, country_code=None,
+                exclude=None):
+        """
+        Get the cities closest to the specified coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param limit: int - maximum number of cities to return
+        :param country_code: string - only consider cities in this country
+        :param exclude: ID of a city that should not be part of the results
+        :returns: a sorted list where each element is a tuple of float and
+                  int (distance in kilometers, city ID)
+        """
+        tree = self._trees.get(country_code)
+        if tree is None:
+            return list()
+        return tree.nearest(latitude, longitude, k=limit, exclude=exclude)
+
+    def update(self, rows, removed):
+        """
+        Update the index in place of rebuilding it. Only the trees of the
+        countries of the cities added or removed are rebuilt (from the
+        points of the previous trees), along with the tree of all cities.
+
+        :param rows: list of tuple (ID, latitude, longitude, country code,
+                     alternate country codes) to add, replacing the cities
+                     with the same IDs
+        :param removed: list of tuple in the same format of the cities to
+                        remove
+        """
+        dropped = [row[0] for row in removed] + [row[0] for row in rows]
+        added = collections.defaultdict(list)
+        codes = set()
+        for geoname_id in dropped:
+            if geoname_id in self._locations:
+                codes.add(self._locations.pop(geoname_id)[2])
+                codes.update(self._alternate_codes.pop(geoname_id, ()))
+        for geoname_id, latitude, longitude, country_code, cc2 in rows:
+            self._locations[geoname_id] = (latitude, longitude, country_code)
+            alternate_codes = {code for code in (cc2 or '').split(',')
+                               if code and code != country_code}
+            if alternate_codes:
+                self._alternate_codes[geoname_id] = frozenset(alternate_codes)
+            for code in (None, country_code) + tuple(alternate_codes):
+                added[code].append((geoname_id, latitude, longitude))
+        codes.update(added)
+        codes.add(None)
+
+        trees = dict(self._trees)
+        for code in codes:
+            tree = trees.get(code)
+            points = PointArray.from_rows(added.get(code, ()))
+            if tree is not None:
+                kept = ~np.isin(tree.points.ids, dropped)
+                points = PointArray(
+                    np.concatenate((tree.points.ids[kept], points.ids)),
+                    np.concatenate((tree.points.latitudes[kept],
+                                    points.latitudes)),
+                    np.concatenate((tree.points.longitudes[kept],
+                                    points.longitudes)))
+            if len(points) or code is None:
+                trees[code] = KDTree(points)
+            else:
+                trees.pop(code, None)
+        self._trees = trees
+        self.loaded = True
+
+    def total(self, geoname_id, country_code=None):
+        """
+        Get the number of cities that can be returned by
+        :meth:`SpatialIndex.nearest`
+
+        :param geoname_id: int
+        :param country_code: string
+        :returns: int
+        """
+        _, _, center_country_code = self.location(geoname_id)
+        tree = self._trees.get(country_code)
+        if tree is None:
+            return 0
+        if country_code is None or country_code == center_country_code or \
+                country_code in self._alternate_codes.get(geoname_id, ()):
+            return len(tree) - 1
+        return len(tree)
+
+
+# Constants
+city_snapshot = Snapshot()
+city_store = CityStore()
+country_catalogue = CountryCatalogue()
+fragment_store = FragmentStore()
+name_index = TrigramIndex()
+neighbour_table = NeighbourTable()
+prefix_index = PrefixIndex()
+query_cache = QueryCache()
+spatial_index = SpatialIndex()
+token_index = TokenIndex()
@@ -9,16 +9,178 @@ Interface Classes:
 
 # Standard libraries
 import datetime
-import json
-import re
+import functools
+import sqlite3
+import threading
+import urllib.parse
+import weakref
 
 # Flask-SQLAlchemy
 from flask_sqlalchemy import SQLAlchemy
 
+# SQLAlchemy
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Globe Indexer
+from globe_indexer.api.records import COMPACT_JSON_FIELDS, CityMixin
+from globe_indexer.config import SQLITE_POOL_TIMEOUT
+
 
 # Constants
-SPECIAL_CHARS_REGEX = re.compile(r"[^A-Za-z0-9_]+")
-db = SQLAlchemy()
+READER_EXTENSION = 'globe_indexer_reader'
+
+
+# Private functions
+def _apply_pragmas(pragmas, connection, _):
+    """
+    Apply the SQLite settings to a new connection
+
+    :param pragmas: iterable of tuple (name, value)
+    :param connection: DB-API connection
+    """
+    cursor = connection.cursor()
+    for name, value in pragmas:
+        cursor.execute('PRAGMA {} = {}'.format(name, value))
+    cursor.close()
+
+
+def _is_sqlite_file(sa_url):
+    """
+    Check if the URL points to an SQLite database file, which can be shared
+    by several connections
+
+    :param sa_url: instance of :class:`sqlalchemy.engine.url.URL`
+    :returns: boolean
+    """
+    return sa_url.get_backend_name() == 'sqlite' and \
+        sa_url.database not in (None, '', ':memory:')
+
+
+# Private classes
+class _Database(SQLAlchemy):
+    """
+    Database of the application. SQLITE_PRAGMAS are applied to every SQLite
+    connection. When SQLITE_READERS is set, the queries of the API go through
+    a pool of that many read only connections (see :attr:`_Database.reader`)
+    while loads go through a single, dedicated writer connection.
+    """
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor
+        """
+        super(_Database, self).__init__(*args, **kwargs)
+        self._reader_lock = threading.Lock()
+        self._pragma_engines = weakref.WeakSet()
+
+    @property
+    def reader(self):
+        """
+        Session of the read only queries: bound to the pool of read only
+        connections if there is one, the default session otherwise
+
+        :returns: instance of :class:`sqlalchemy.orm.scoped_session`
+        """
+        app = self.get_app()
+        with self._reader_lock:
+            if app.extensions.get(READER_EXTENSION) is None:
+                app.extensions[READER_EXTENSION] = self._create_reader(app)
+        return app.extensions[READER_EXTENSION]
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        """
+        Keep a single connection to write into an SQLite database file
+        shared with read only connections, see
+        :meth:`flask_sqlalchemy.SQLAlchemy.apply_driver_hacks`
+        """
+        # The options are updated in place: older versions of
+        # Flask-SQLAlchemy return nothing, newer ones return the URL and the
+        # options
+        result = super(_Database, self).apply_driver_hacks(app, sa_url,
+                                                            options)
+        if app.config['SQLITE_READERS'] and _is_sqlite_file(sa_url):
+            options.update(poolclass=QueuePool, pool_size=1, max_overflow=0,
+                           pool_timeout=SQLITE_POOL_TIMEOUT)
+            options.setdefault('connect_args', dict())
+            options['connect_args']['check_same_thread'] = False
+        return result
+
+    def get_engine(self, app=None, bind=None):
+        """
+        Get the engine of the application, applying SQLITE_PRAGMAS to its
+        connections, see :meth:`flask_sqlalchemy.SQLAlchemy.get_engine`
+        """
+        engine = super(_Database, self).get_engine(app=app, bind=bind)
+        if engine not in self._pragma_engines:
+            self._pragma_engines.add(engine)
+            pragmas = self.get_app(app).config['SQLITE_PRAGMAS']
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect',
+                             functools.partial(_apply_pragmas,
+                                               tuple(pragmas)))
+        return engine
+
+    def init_app(self, app):
+        """
+        Register the application, see
+        :meth:`flask_sqlalchemy.SQLAlchemy.init_app`
+
+        :param app: instance of :class:`flask.Flask`
+        """
+        app.config.setdefault('SQLITE_PRAGMAS', ())
+        app.config.setdefault('SQLITE_READERS', 0)
+        app.config.setdefault('SQLITE_SHARED_CACHE', False)
+        app.extensions[READER_EXTENSION] = None
+        super(_Database, self).init_app(app)
+
+        @app.teardown_appcontext
+        def remove_reader(response_or_exc):
+            reader = app.extensions.get(READER_EXTENSION)
+            if reader is not None:
+                reader.remove()
+            return response_or_exc
+
+    def _create_reader(self, app):
+        """
+        Create the session of the read only queries of the application
+
+        :param app: instance of :class:`flask.Flask`
+        :returns: instance of :class:`sqlalchemy.orm.scoped_session`
+        """
+        engine = self.get_engine(app)
+        readers = app.config['SQLITE_READERS']
+        if not readers or not _is_sqlite_file(engine.url):
+            return self.session
+
+        # Create the database (in the journal mode of the pragmas) before
+        # read only connections open it
+        connection = sqlite3.connect(engine.url.database)
+        try:
+            _apply_pragmas(app.config['SQLITE_PRAGMAS'], connection, None)
+        finally:
+            connection.close()
+        query = {'mode': 'ro'}
+        if app.config['SQLITE_SHARED_CACHE']:
+            query['cache'] = 'shared'
+        uri = 'file:{}?{}'.format(urllib.parse.quote(engine.url.database),
+                                  urllib.parse.urlencode(query))
+
+        def connect():
+            return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+        reader = sqlalchemy.create_engine(
+            'sqlite://', creator=connect, poolclass=QueuePool,
+            pool_size=readers, max_overflow=0,
+            pool_timeout=SQLITE_POOL_TIMEOUT)
+        if app.config['SQLITE_PRAGMAS']:
+            event.listen(reader, 'connect', functools.partial(
+                _apply_pragmas, tuple(app.config['SQLITE_PRAGMAS'])))
+        return self.create_scoped_session({'bind': reader, 'binds': dict()})
+
+
+# Database of the application
+db = _Database()
 
 
 # pylint: disable=too-few-public-methods
@@ -35,16 +197,24 @@ class _BaseModel(db.Model):
     date_created = db.Column(db.DateTime, nullable=False,
                              default=db.func.current_timestamp())
     date_updated = db.Column(db.DateTime, nullable=True,
-                             onupdate=db.func.current_timestmap())
+                             onupdate=db.func.current_timestamp())
 # pylint: enable=too-few-public-methods
 
 
 # pylint: disable=too-many-instance-attributes,too-few-public-methods
-class GeoName(_BaseModel):
+class GeoName(CityMixin, _BaseModel):
     """
     Model representation of a city
     """
     __tablename__ = 'geo_name'
+    __table_args__ = (
+        # Bounding box lookups of the radius search, see
+        # :func:`api.query.radius_query`
+        db.Index('ix_geo_name_latitude_longitude', 'latitude', 'longitude'),
+        db.Index('ix_geo_name_longitude_latitude', 'longitude', 'latitude'),
+        # Country filter of the radius search
+        db.Index('ix_geo_name_country_code', 'country_code'),
+    )
 
     name = db.Column(db.String(200), nullable=False)
     ascii_name = db.Column(db.String(200), nullable=False)
@@ -77,50 +247,48 @@ class GeoName(_BaseModel):
 
         :param doc: dictionary-like instance
         """
-        # pylint: disable=invalid-name
-        self.id = int(doc['geonameid'])
-        # pylint: enable=invalid-name
-
-        self.name = doc['name']
-        self.ascii_name = doc['asciiname']
+        for key, value in self.parse_row(doc).items():
+            setattr(self, key, value)
 
-        alternate_names = [
-            name for name in set(doc['alternatenames'].split(','))
-        ]
-        if alternate_names:
-            self.alternate_names = ','.join(alternate_names)
-        else:
-            self.alternate_names = None
-
-        self.latitude = float(doc['latitude'])
-        self.longitude = float(doc['longitude'])
-
-        if doc['feature_class']:
-            self.feature_class = doc['feature_class']
-        else:
-            self.feature_class = None
-
-        self.feature_code = doc['feature_code'] if doc['feature_code'] else None
-
-        self.country_code = doc['country_code']
+    @staticmethod
+    def parse_row(doc):
+        """
+        Convert a row of the GeoNames table into the values of the columns
 
+        :param doc: dictionary-like instance
+        :returns: dict - column name to value
+        """
+        # Duplicates are dropped, keeping the order of the names
+        alternate_names = list(dict.fromkeys(doc['alternatenames'].split(',')))
         alternate_cc = [
             code for code in doc['cc2'].split(',') if code]
-        self.cc2 = ','.join(alternate_cc) if alternate_cc else None
 
-        self.admin1_code = doc['admin1_code'] if doc['admin1_code'] else None
-        self.admin2_code = doc['admin2_code'] if doc['admin2_code'] else None
-        self.admin3_code = doc['admin3_code'] if doc['admin3_code'] else None
-        self.admin4_code = doc['admin4_code'] if doc['admin4_code'] else None
-
-        self.population = int(doc['population']) if doc['population'] else None
-        self.elevation = int(doc['elevation']) if doc['elevation'] else None
-        self.dem = int(doc['dem']) if doc['dem'] else None
-
-        self.timezone = doc['timezone']
-
-        self.modification_date = datetime.datetime.strptime(
-            doc['modification_date'], '%Y-%m-%d').date()
+        return {
+            'id': int(doc['geonameid']),
+            'name': doc['name'],
+            'ascii_name': doc['asciiname'],
+            'alternate_names':
+                ','.join(alternate_names) if alternate_names else None,
+            'latitude': float(doc['latitude']),
+            'longitude': float(doc['longitude']),
+            'feature_class':
+                doc['feature_class'] if doc['feature_class'] else None,
+            'feature_code':
+                doc['feature_code'] if doc['feature_code'] else None,
+            'country_code': doc['country_code'],
+            'cc2': ','.join(alternate_cc) if alternate_cc else None,
+            'admin1_code': doc['admin1_code'] if doc['admin1_code'] else None,
+            'admin2_code': doc['admin2_code'] if doc['admin2_code'] else None,
+            'admin3_code': doc['admin3_code'] if doc['admin3_code'] else None,
+            'admin4_code': doc['admin4_code'] if doc['admin4_code'] else None,
+            'population':
+                int(doc['population']) if doc['population'] else None,
+            'elevation': int(doc['elevation']) if doc['elevation'] else None,
+            'dem': int(doc['dem']) if doc['dem'] else None,
+            'timezone': doc['timezone'],
+            'modification_date': datetime.datetime.strptime(
+                doc['modification_date'], '%Y-%m-%d').date(),
+        }
 
     def __repr__(self):
         """
@@ -138,38 +306,4 @@ class GeoName(_BaseModel):
         :returns: boolean
         """
         return self.id == other.id
-
-    def json(self, compact=True):
-        """
-        Represent the city in JSON format
-
-        :returns: JSON object
-        """
-        value = {
-            'id': self.id,
-            'name': self.name,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'country_code': self.country_code,
-        }
-        if not compact:
-            value['ascii_name'] = self.ascii_name
-            if self.alternate_names:
-                value['alternate_names'] = self.alternate_names.split(',')
-            if self.population is not None:
-                value['population'] = self.population
-            if self.cc2 is not None:
-                value['cc2'] = self.cc2.split(',')
-        return json.loads(json.dumps(value))
-
-    @property
-    def variable_name(self):
-        """
-        Create an alias name that can be used in templates as unique ID
-
-        :return: string
-        """
-        name = SPECIAL_CHARS_REGEX.sub('', self.ascii_name)
-        elements = name.split() + [str(self.id)]
-        return '_'.join(elements)
 # pylint: enable=too-many-instance-attributes,too-few-public-methods
@@ -4,88 +4,244 @@
 Globe Indexer API Query Module
 """
 
-# PyCountry
-import pycountry
-
 # SQLAlchemy
-from sqlalchemy import distinct
+from sqlalchemy import or_
 
 # Globe indexer
-from globe_indexer import utils
+from globe_indexer import config, utils
+from globe_indexer.api.database import build_indexes
+from globe_indexer.api.index import (
+    city_store,
+    country_catalogue,
+    fragment_store,
+    name_index,
+    neighbour_table,
+    prefix_index,
+    query_cache,
+    spatial_index,
+    token_index,
+)
 from globe_indexer.api.models import GeoName, db
-from globe_indexer.error import GlobeIndexerError
+from globe_indexer.distance import PointArray, bounding_box
 
 
 # Interface functions
+def autocomplete_query(prefix, limit=config.DEFAULT_AUTOCOMPLETE_LIMIT):
+    """
+    Get the most populated cities with a name (including the ASCII and
+    alternate names) starting with the prefix.
+
+    :param prefix: string
+    :param limit: int - maximum number of cities to return
+    :returns: list of tuple (matched name, :class:`api.records.City`)
+              sorted by population
+    """
+    matches = _get_index(prefix_index).search(prefix, limit)
+    cities = {city.id: city
+              for city in city_query([value[1] for value in matches])}
+    return [(name, cities[geoname_id]) for name, geoname_id in matches
+            if geoname_id in cities]
+
+
+def batch_proximity_query(origins, country_code=None,
+                          limit=config.DEFAULT_PROXIMITY_LIMIT):
+    """
+    Get the cities closest to each of many origins in a single pass over the
+    resident spatial index
+
+    :param origins: list where each element is either the ID of a city or a
+                    tuple of (latitude, longitude)
+    :param country_code: string - only consider cities in this country
+    :param limit: int - maximum number of cities to return per origin
+    :returns: list with a sorted list of tuple (distance in kilometers, city
+              ID) per origin
+    """
+    return _get_index(spatial_index).nearest_many(origins, limit=limit,
+                                                  country_code=country_code)
+
+
+def city_query(geoname_ids):
+    """
+    Get the records of the cities with the given IDs from the resident
+    store, without going through the database
+
+    :param geoname_ids: iterable of int
+    :returns: list of :class:`api.records.City` in the same order as the
+              given IDs. IDs that cannot be found are skipped.
+    """
+    return _get_index(city_store).select(geoname_ids)
+
+
+def country_catalogue_query():
+    """
+    Get the resident country catalogue
+
+    :returns: instance of :class:`countries.CountryCatalogue`
+    """
+    return _get_index(country_catalogue)
+
+
 def country_code_query():
     """
-    Get all country codes
+    Get all country codes (including the alternate country codes) from the
+    resident country catalogue
+
+    :returns: list of tuple (code, label)
+    """
+    return list(_get_index(country_catalogue).choices)
+
 
-    :returns: list of string
+def fragment_query(geoname_ids):
     """
-    # pylint: disable=no-member
-    query = db.session.query(distinct(GeoName.country_code))
-    # pylint: enable=no-member
+    Get the compact JSON representation (see :meth:`api.models.GeoName.json`)
+    of the cities with the given IDs from the resident fragment store.
 
-    codes = [('', '')]
-    for code in query.order_by(GeoName.country_code):
-        try:
-            country = pycountry.countries.get(alpha_2=code[0])
-            if country:
-                country_name = country.name
-            else:
-                country_name = code[0]
-        except KeyError:
-            country_name = code[0]
-        choice = '{} - {}'.format(code[0], country_name)
-        codes.append((code[0], choice))
-    return codes
+    :param geoname_ids: iterable of int
+    :returns: list of tuple (ID, encoded JSON object) in the same order as the
+              given IDs. IDs that cannot be found are skipped.
+    """
+    return _get_index(fragment_store).select(geoname_ids)
 
 
-def lexical_query(names):
+def lexical_id_query(names):
     """
-    Perform lexical search based on the name provided by the user.
+    Get the IDs of the cities matching the name provided by the user. The
+    matching names are looked up from the resident trigram index. When no
+    wildcard is used, cities with an ASCII or alternate name equal to the
+    given one (ignoring case and accents) are included as well.
 
     :param names: list of string
-    :returns: iterable of query
+    :returns: list of int sorted by ID
     """
     value = utils.get_query_string(names)
-    query = GeoName.query.filter(GeoName.name.ilike(value))
-    results = query.order_by(GeoName.id).all()
-    return results
+    token = None if any('*' in name for name in names) else ' '.join(names)
+    key = ('lexical', value.lower(),
+           None if token is None else utils.normalize_name(token))
+    ids = query_cache.get(key)
+    if ids is None:
+        ids = set(_get_index(name_index).search(value))
+        if token is not None:
+            ids.update(_get_index(token_index).search(token))
+        ids = tuple(sorted(ids))
+        query_cache.set(key, ids)
+    return list(ids)
+
+
+def lexical_query(names):
+    """
+    Perform lexical search based on the name provided by the user. See
+    :func:`lexical_id_query`.
 
+    :param names: list of string
+    :returns: list of :class:`api.records.City` sorted by ID
+    """
+    return city_query(lexical_id_query(names))
 
-def proximity_query(geoname_id, country_code=None):
+
+def proximity_query(geoname_id, country_code=None, limit=None):
     """
-    Get all cities sorted by their distances from the city whose ID is given.
+    Get cities sorted by their distances from the city whose ID is given.
 
     :param geoname_id: int
     :param country_code: string
+    :param limit: int - maximum number of cities to return. All cities are
+                  returned if it's not specified.
     :returns: a sorted tuple where each element is a tuple of float and int.
               The float value signifies the distance between the city with the
               specified ID. The integer value is the ID of the city.
     """
-    result = GeoName.query.filter_by(id=geoname_id).first()
-    if not result:
-        fstr = "cannot find city with ID: {}".format(geoname_id)
-        raise GlobeIndexerError(fstr)
-
-    # Get all points in the table
-    # pylint: disable=no-member
-    query = db.session.query(GeoName.id, GeoName.latitude,
-                             GeoName.longitude)
-    # pylint: enable=no-member
     if country_code is None:
-        results = query.all()
-    else:
-        results = query.filter_by(country_code=country_code).all()
-
-    distances = list()
-    for other_id, other_lat, other_long in results:
-        if other_id == geoname_id:
-            continue
-        distances.append((utils.get_distance(result.longitude, result.latitude,
-                                             other_long, other_lat),
-                          other_id))
-
-    return sorted(distances)
+        results = neighbour_table.lookup(geoname_id, limit)
+        if results is not None:
+            return results
+
+    index = _get_index(spatial_index)
+    if limit is None:
+        # Listings of every city aren't worth their memory in the cache,
+        # neither are limits reaching every city
+        return index.nearest(geoname_id, country_code=country_code)
+
+    # A cached result computed with a greater limit holds the answer as its
+    # first elements
+    key = ('proximity', geoname_id, country_code)
+    cached = query_cache.get(key, usable=lambda value: limit <= value[0])
+    if cached is not None:
+        return list(cached[1][:limit])
+
+    results = index.nearest(geoname_id, limit=limit,
+                            country_code=country_code)
+    if limit < index.total(geoname_id, country_code=country_code):
+        query_cache.set(key, (limit, tuple(results)))
+    return results
+
+
+def proximity_total(geoname_id, country_code=None):
+    """
+    Get the number of cities available for proximity search from the city
+    whose ID is given.
+
+    :param geoname_id: int
+    :param country_code: string
+    :returns: int
+    """
+    return _get_index(spatial_index).total(geoname_id, country_code=country_code)
+
+
+def radius_query(latitude, longitude, radius, country_code=None,
+                 exclude=None):
+    """
+    Get every city within the radius of the specified coordinate. The
+    candidates are narrowed down by an indexed bounding box query before
+    computing the exact distances, so the cost depends on the size of the
+    result rather than on the number of cities.
+
+    :param latitude: float
+    :param longitude: float
+    :param radius: float - in kilometers
+    :param country_code: string - only consider cities in this country
+    :param exclude: ID of a city that should not be part of the results
+    :returns: a sorted list where each element is a tuple of float and int
+              (distance in kilometers, city ID)
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius)
+    query = db.reader.query(GeoName.id, GeoName.latitude, GeoName.longitude)
+    query = query.filter(GeoName.latitude.between(min_lat, max_lat))
+    if lon_ranges != [(-180.0, 180.0)]:
+        query = query.filter(or_(*[GeoName.longitude.between(lower, upper)
+                                   for lower, upper in lon_ranges]))
+    if country_code:
+        query = query.filter(GeoName.country_code == country_code)
+
+    points = PointArray.from_rows(query)
+    return points.within(latitude, longitude, radius, exclude=exclude)
+
+
+def reverse_query(latitude, longitude, country_code=None,
+                  limit=config.DEFAULT_REVERSE_LIMIT):
+    """
+    Get the cities closest to an arbitrary coordinate, from the resident
+    spatial index
+
+    :param latitude: float
+    :param longitude: float
+    :param country_code: string - only consider cities in this country
+    :param limit: int - maximum number of cities to return
+    :returns: a sorted list where each element is a tuple of float and int
+              (distance in kilometers, city ID)
+    """
+    return _get_index(spatial_index).reverse(latitude, longitude, limit=limit,
+                                             country_code=country_code)
+
+
+# Private functions
+def _get_index(index):
+    """
+    Get the resident index, building the indexes if they haven't been built
+    yet
+
+    :param index: one of the indexes in :mod:`api.index`
+    :returns: the given index
+    """
+    if not index.loaded:
+        build_indexes(db)
+    return index
@@ -0,0 +1,288 @@
+# Filename: records.py
+
+"""
+Globe Indexer API Records Module
+
+Lightweight read model of the cities served by the API, in place of the
+SQLAlchemy entities of :mod:`api.models`.
+
+Interface classes:
+    City
+    CityMixin
+    CityStore
+"""
+
+# Standard libraries
+import re
+import sys
+
+# NumPy
+import numpy as np
+
+
+# Constants
+COMPACT_JSON_FIELDS = ('id', 'name', 'latitude', 'longitude', 'country_code')
+MISSING_INT = -1
+RECORD_FIELDS = ('id', 'name', 'ascii_name', 'alternate_names', 'latitude',
+                 'longitude', 'country_code', 'cc2', 'population')
+SPECIAL_CHARS_REGEX = re.compile(r"[^A-Za-z0-9_]+")
+
+
+# Interface classes
+class CityMixin(object):
+    """
+    Representation of a city shared by the entities and the records
+    """
+    __slots__ = ()
+
+    def json(self, compact=True):
+        """
+        Represent the city in JSON format
+
+        :returns: JSON object
+        """
+        value = {field: getattr(self, field) for field in COMPACT_JSON_FIELDS}
+        if not compact:
+            value['ascii_name'] = self.ascii_name
+            if self.alternate_names:
+                value['alternate_names'] = self.alternate_names.split(',')
+            if self.population is not None:
+                value['population'] = self.population
+            if self.cc2 is not None:
+                value['cc2'] = self.cc2.split(',')
+        return value
+
+    @property
+    def variable_name(self):
+        """
+        Create an alias name that can be used in templates as unique ID
+
+        :return: string
+        """
+        name = SPECIAL_CHARS_REGEX.sub('', self.ascii_name)
+        elements = name.split() + [str(self.id)]
+        return '_'.join(elements)
+
+
+class City(CityMixin):
+    """
+    Read only record of a city, holding only the fields served by the API
+    """
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, *values):
+        """
+        Constructor
+
+        :param values: values of :data:`RECORD_FIELDS`
+        """
+        for field, value in zip(RECORD_FIELDS, values):
+            setattr(self, field, value)
+
+    def __eq__(self, other):
+        """
+        Check if two records are equal.
+
+        :param other: instance of :class:`City` or
+                      :class:`api.models.GeoName`
+        :returns: boolean
+        """
+        return self.id == other.id
+
+    def __hash__(self):
+        """
+        Hash the record by its ID
+
+        :returns: int
+        """
+        return hash(self.id)
+
+    def __repr__(self):
+        """
+        Represent the city in a more readable format
+
+        :returns: str
+        """
+        return '<City {}>'.format(self.id)
+
+
+class CityStore(object):
+    """
+    Resident struct of arrays holding the fields of :class:`City` for every
+    city. Records are only materialized for the cities being served.
+
+    The columns of a snapshot can be served in place of the arrays (see
+    :meth:`CityStore.open`), in which case the store cannot be updated.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._ids = np.empty(0, dtype=np.int64)
+        self._latitudes = np.empty(0, dtype=np.float64)
+        self._longitudes = np.empty(0, dtype=np.float64)
+        self._populations = np.empty(0, dtype=np.int64)
+        self._strings = {field: list() for field in
+                         ('name', 'ascii_name', 'alternate_names',
+                          'country_code', 'cc2')}
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of cities
+
+        :returns: int
+        """
+        return len(self._ids)
+
+    def load(self, rows):
+        """
+        (Re)build the store
+
+        :param rows: list of tuple with the values of :data:`RECORD_FIELDS`
+                     sorted by ID
+        """
+        columns = list(zip(*rows)) if rows else [()] * len(RECORD_FIELDS)
+        values = dict(zip(RECORD_FIELDS, columns))
+        self._ids = np.array(values['id'], dtype=np.int64)
+        self._latitudes = np.array(values['latitude'], dtype=np.float64)
+        self._longitudes = np.array(values['longitude'], dtype=np.float64)
+        self._populations = np.array(
+            [MISSING_INT if value is None else value
+             for value in values['population']], dtype=np.int64)
+        self._strings = {field: list(values[field])
+                         for field in self._strings}
+        self.loaded = True
+
+    def memory_usage(self):
+        """
+        Get the approximate memory held by the store
+
+        :returns: dict with the number of cities, the total size in bytes,
+                  and the size per city
+        """
+        size = sum(array.nbytes for array in (self._ids, self._latitudes,
+                                              self._longitudes,
+                                              self._populations))
+        seen = set()
+        for values in self._strings.values():
+            size += sys.getsizeof(values)
+            for value in values:
+                # Interned and shared strings are only counted once
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    size += sys.getsizeof(value)
+        return {
+            'cities': len(self),
+            'bytes': size,
+            'bytes_per_city': size / len(self) if len(self) else 0.0,
+        }
+
+    def update(self, rows, removed):
+        """
+        Update the store in place of rebuilding it
+
+        :param rows: list of tuple with the values of :data:`RECORD_FIELDS`
+                     to add, replacing the cities with the same IDs
+        :param removed: list of tuple with the values of
+                        :data:`RECORD_FIELDS` of the cities to remove
+        """
+        dropped = np.array([row[0] for row in removed] +
+                           [row[0] for row in rows], dtype=np.int64)
+        kept = np.flatnonzero(~np.isin(self._ids, dropped))
+        added = CityStore()
+        added.load(rows)
+
+        order = np.argsort(np.concatenate((self._ids[kept], added._ids)),
+                           kind='stable')
+        for name in ('_ids', '_latitudes', '_longitudes', '_populations'):
+            values = np.concatenate((getattr(self, name)[kept],
+                                     getattr(added, name)))
+            setattr(self, name, values[order])
+        positions = kept.tolist()
+        order = order.tolist()
+        for field, values in self._strings.items():
+            values = [values[position] for position in positions] + \
+                added._strings[field]
+            self._strings[field] = [values[position] for position in order]
+        self.loaded = True
+
+    def open(self, snapshot):
+        """
+        Serve the cities from the memory mapped columns of a snapshot
+
+        :param snapshot: instance of :class:`snapshot.Snapshot`
+        """
+        self._ids = snapshot.column('id')
+        self._latitudes = snapshot.column('latitude')
+        self._longitudes = snapshot.column('longitude')
+        self._populations = snapshot.column('population')
+        self._strings = {field: _SnapshotStrings(snapshot, field)
+                         for field in self._strings}
+        self.loaded = True
+
+    def select(self, city_ids):
+        """
+        Get the records of the given IDs
+
+        :param city_ids: iterable of int
+        :returns: list of :class:`City` in the same order as the IDs. IDs
+                  that cannot be found are skipped.
+        """
+        city_ids = np.fromiter(city_ids, dtype=np.int64)
+        positions = np.searchsorted(self._ids, city_ids)
+        found = positions < len(self._ids)
+        found[found] = self._ids[positions[found]] == city_ids[found]
+        return [self._record(position)
+                for position in positions[found].tolist()]
+
+    def _record(self, position):
+        """
+        Materialize the record at the given position
+
+        :param position: int
+        :returns: instance of :class:`City`
+        """
+        population = int(self._populations[position])
+        strings = self._strings
+        return City(int(self._ids[position]), strings['name'][position],
+                    strings['ascii_name'][position],
+                    strings['alternate_names'][position],
+                    float(self._latitudes[position]),
+                    float(self._longitudes[position]),
+                    strings['country_code'][position],
+                    strings['cc2'][position],
+                    None if population == MISSING_INT else population)
+
+
+# Private classes
+class _SnapshotStrings(object):
+    """
+    String column of a snapshot, indexed like the lists of the store
+    """
+    def __init__(self, snapshot, name):
+        """
+        Constructor
+
+        :param snapshot: instance of :class:`snapshot.Snapshot`
+        :param name: string - name of the column
+        """
+        self._snapshot = snapshot
+        self._name = name
+
+    def __getitem__(self, position):
+        """
+        Get the value of a row
+
+        :param position: int
+        :returns: string or None for a missing value
+        """
+        return self._snapshot.string(self._name, position) or None
+
+    def __len__(self):
+        """
+        Get the number of rows
+
+        :returns: int
+        """
+        return len(self._snapshot)
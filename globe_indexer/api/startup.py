@@ -0,0 +1,311 @@
+# Filename: startup.py
+
+"""
+Globe Indexer API Startup Module
+
+Preparation of the data served by the application: loading the data set into
+the database, writing the snapshot, applying the daily updates and
+precomputing the nearest neighbour table, then building (or mapping) the
+indexes of the process.
+
+The preparation is shared by the processes of a host: it runs under an
+exclusive lock on a file next to the database, which also records what was
+prepared, so only the first process to start does the work. The others wait
+for the lock and then attach to the prepared data, only building their own
+indexes. The lock is skipped when the database isn't a file, since every
+process then has its own database.
+
+In the background mode (see :meth:`Startup.start`), the application answers
+requests while its data is being prepared: /health reports the phase of the
+startup and the other endpoints answer 503 until it's ready.
+
+Interface classes:
+    Startup
+"""
+
+# Standard libraries
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+# Globe Indexer
+from globe_indexer.api.database import (
+    UPDATE_FILE_RGX,
+    build_indexes,
+    initialize_db,
+    is_db_empty,
+    load_snapshot,
+    precompute_neighbours,
+    save_snapshot,
+    sync_db,
+)
+from globe_indexer.api.index import neighbour_table
+from globe_indexer.api.models import db
+from globe_indexer.error import GlobeIndexerError
+
+
+# Constants
+LOGGER = logging.getLogger(__name__)
+STARTUP_EXTENSION = 'globe_indexer_startup'
+
+# Phases of the startup, in order. A failed startup stays in the 'failed'
+# phase.
+STARTUP_PHASES = ('starting', 'waiting', 'loading', 'snapshot', 'syncing',
+                  'neighbours', 'indexing', 'ready')
+
+
+# Interface classes
+class Startup(object):
+    """
+    Startup of an application, registered in its extensions under
+    :data:`STARTUP_EXTENSION`
+    """
+    def __init__(self, app, fpath):
+        """
+        Constructor
+
+        :param app: instance of :class:`flask.Flask`
+        :param fpath: string - path to the data set file, see
+                      :func:`database.initialize_db`
+        """
+        self.app = app
+        self.fpath = fpath
+        self.phase = 'starting'
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self._thread = None
+        app.extensions[STARTUP_EXTENSION] = self
+
+    @property
+    def ready(self):
+        """
+        Check if the application is ready to serve its data
+
+        :returns: boolean
+        """
+        return self.phase == 'ready'
+
+    def run(self):
+        """
+        Prepare the data and build the indexes, returning once the
+        application is ready
+        """
+        try:
+            with self.app.app_context():
+                try:
+                    with self._lock() as marker:
+                        indexed = self._prepare(marker)
+                    self._attach(indexed)
+                finally:
+                    db.session.remove()
+        except Exception as exc:
+            self.error = str(exc)
+            self._set_phase('failed')
+            raise
+        self._set_phase('ready')
+
+    def start(self):
+        """
+        Prepare the data and build the indexes in a background thread, see
+        :meth:`Startup.run`. The data is loaded and the nearest neighbour
+        table is computed without worker processes.
+        """
+        if self._thread is not None:
+            raise GlobeIndexerError("the startup has already been started")
+        self._thread = threading.Thread(target=self._run_logged,
+                                        name='globe_indexer_startup',
+                                        daemon=True)
+        self._thread.start()
+
+    def status(self):
+        """
+        Get the status of the startup
+
+        :returns: dict
+        """
+        end = self.finished if self.finished is not None else time.time()
+        payload = {
+            'phase': self.phase,
+            'elapsed': round(end - self.started, 3),
+        }
+        if self.error is not None:
+            payload['error'] = self.error
+        return payload
+
+    def wait(self, timeout=None):
+        """
+        Wait for the background startup to finish
+
+        :param timeout: float - in seconds, or None to wait until it finishes
+        :returns: boolean - whether the application is ready
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _attach(self, indexed):
+        """
+        Build (or map) the indexes of the process from the prepared data
+
+        :param indexed: boolean - whether the indexes were already mapped
+                        while preparing the data
+        """
+        config = self.app.config
+        if not indexed:
+            self._set_phase('indexing')
+            if config['SNAPSHOT_PATH']:
+                load_snapshot(db, config['SNAPSHOT_PATH'],
+                              scale_dpath=config['SCALE_INDEX_PATH'],
+                              memory_budget=config['SCALE_MEMORY_BUDGET'])
+            else:
+                build_indexes(db)
+        # Building the indexes drops the table
+        if config['KNN_TABLE_PATH'] and not neighbour_table.loaded:
+            neighbour_table.load(config['KNN_TABLE_PATH'])
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Hold the lock of the preparation of the data on the host
+
+        :returns: context manager yielding the marker of the data prepared
+                  by a previous startup (dict) and saving it back on exit
+        """
+        fpath = self.app.config['STARTUP_LOCK_PATH']
+        if fpath is None:
+            database = db.get_engine(self.app).url.database
+            if database in (None, '', ':memory:'):
+                yield dict()
+                return
+            fpath = database + '.startup'
+
+        with open(fpath, mode='a+', encoding='utf-8') as fobj:
+            try:
+                fcntl.flock(fobj, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._set_phase('waiting')
+                fcntl.flock(fobj, fcntl.LOCK_EX)
+            try:
+                fobj.seek(0)
+                content = fobj.read()
+                marker = json.loads(content) if content else dict()
+                yield marker
+                fobj.seek(0)
+                fobj.truncate()
+                json.dump(marker, fobj)
+                fobj.flush()
+            finally:
+                fcntl.flock(fobj, fcntl.LOCK_UN)
+
+    def _prepare(self, marker):
+        """
+        Prepare the data shared by the processes of the host, skipping what
+        a previous startup already did
+
+        :param marker: dict - data prepared by a previous startup, updated
+                       in place
+        :returns: boolean - whether the indexes of the process were mapped
+        """
+        config = self.app.config
+        snapshot_fpath = config['SNAPSHOT_PATH']
+        load_processes = config['DATA_LOAD_PROCESSES']
+        knn_processes = config['KNN_TABLE_PROCESSES']
+        if self._thread is not None:
+            # Worker processes forked while other threads serve requests
+            # could inherit locks held by these threads
+            load_processes = knn_processes = 1
+        db.create_all()
+        saved = bool(snapshot_fpath) and os.path.isfile(snapshot_fpath)
+        # The database is checked even if there is a snapshot, since some
+        # queries (e.g. /radius) still run against it
+        if is_db_empty(db):
+            self._set_phase('loading')
+            initialize_db(db, self.fpath,
+                          batch_size=config['DATA_LOAD_BATCH_SIZE'],
+                          url=config['DATA_SET_URL'],
+                          checksum=config['DATA_SET_CHECKSUM'],
+                          connections=config['DATA_CONNECTIONS'],
+                          processes=load_processes,
+                          indexes=False)
+            marker.clear()
+            # A snapshot of the previous database is written again
+            saved = False
+        if snapshot_fpath and not saved:
+            self._set_phase('snapshot')
+            save_snapshot(db, snapshot_fpath)
+
+        # Apply the daily modification and deletion files of GeoNames
+        updates = _list_updates(config['UPDATES_PATH'])
+        if updates is not None and marker.get('updates') != updates:
+            self._set_phase('syncing')
+            sync_db(db, config['UPDATES_PATH'],
+                    min_population=config['CITY_MIN_POPULATION'],
+                    memory_budget=config['SCALE_MEMORY_BUDGET'])
+            if snapshot_fpath:
+                save_snapshot(db, snapshot_fpath)
+            marker.pop('neighbours', None)
+        marker['updates'] = updates
+
+        indexed = bool(config['SCALE_INDEX_PATH'])
+        if indexed:
+            # The on-disk indexes are written once for the host
+            self._set_phase('indexing')
+            load_snapshot(db, snapshot_fpath,
+                          scale_dpath=config['SCALE_INDEX_PATH'],
+                          memory_budget=config['SCALE_MEMORY_BUDGET'])
+
+        neighbours = [config['KNN_TABLE_PATH'], config['KNN_TABLE_SIZE']]
+        if config['KNN_TABLE_PATH'] and marker.get('neighbours') != neighbours:
+            self._set_phase('neighbours')
+            precompute_neighbours(db, config['KNN_TABLE_PATH'],
+                                  k=config['KNN_TABLE_SIZE'],
+                                  processes=knn_processes)
+            marker['neighbours'] = neighbours
+        return indexed
+
+    def _run_logged(self):
+        """
+        Run the startup, logging the error instead of raising it
+        """
+        try:
+            self.run()
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("failed to start the application")
+
+    def _set_phase(self, phase):
+        """
+        Move the startup to another phase
+
+        :param phase: string - one of :data:`STARTUP_PHASES` or 'failed'
+        """
+        self.phase = phase
+        if phase in ('ready', 'failed'):
+            self.finished = time.time()
+        LOGGER.info("startup phase %s after %.1fs", phase,
+                    time.time() - self.started)
+
+
+# Private functions
+def _list_updates(dpath):
+    """
+    List the daily files of GeoNames in a directory, with their size and
+    modification time, to tell whether they changed since the last startup
+
+    :param dpath: string - path to the directory, or None
+    :returns: list of list (file name, size, modification time), or None if
+              there is no directory
+    """
+    if not dpath:
+        return None
+    listing = list()
+    for fname in sorted(os.listdir(dpath)):
+        if UPDATE_FILE_RGX.fullmatch(fname) is None:
+            continue
+        stat = os.stat(os.path.join(dpath, fname))
+        listing.append([fname, stat.st_size, stat.st_mtime_ns])
+    return listing
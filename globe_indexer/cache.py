@@ -0,0 +1,221 @@
+# Filename: cache.py
+
+"""
+Globe Indexer Cache Module
+
+Interface classes:
+    CacheBackend
+    MemoryCache
+    QueryCache
+"""
+
+# Standard libraries
+import abc
+import collections
+import importlib
+import threading
+import time
+
+# Globe Indexer
+from globe_indexer import config
+
+
+# Interface classes
+class CacheBackend(abc.ABC):
+    """
+    Interface of the storage used by :class:`QueryCache`. Keys are tuples of
+    hashable (and printable) values, values are picklable. A backend holds
+    the results of a single process, and must not be shared by several
+    processes (see :meth:`QueryCache.invalidate`).
+    """
+    @abc.abstractmethod
+    def clear(self):
+        """
+        Remove every entry
+        """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """
+        Get the value stored for the key
+
+        :param key: tuple
+        :returns: the value or None if there is no (unexpired) entry
+        """
+
+    @abc.abstractmethod
+    def set(self, key, value):
+        """
+        Store the value for the key
+
+        :param key: tuple
+        :param value: any value other than None
+        """
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process cache evicting the least recently used entries beyond its
+    maximum size, and entries older than the time to live
+    """
+    def __init__(self, max_size=config.QUERY_CACHE_SIZE,
+                 ttl=config.QUERY_CACHE_TTL, clock=time.monotonic):
+        """
+        Constructor
+
+        :param max_size: int - maximum number of entries
+        :param ttl: float - time to live of an entry in seconds. Entries never
+                    expire if it's None.
+        :param clock: callable returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Get the number of entries (including the expired ones not evicted
+        yet)
+
+        :returns: int
+        """
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key):
+        """
+        Get the value stored for the key
+
+        :param key: tuple
+        :returns: the value or None if there is no (unexpired) entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if expiry is not None and expiry <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store the value for the key
+
+        :param key: tuple
+        :param value: any value other than None
+        """
+        if self.max_size < 1:
+            return
+        expiry = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class QueryCache(object):
+    """
+    Cache of the query results of the process, counting hits and misses.
+    Invalidating the cache moves it to a new generation that is part of every
+    key, so a result computed from the previous data and stored after the
+    invalidation is never returned.
+    """
+    def __init__(self, backend=None):
+        """
+        Constructor
+
+        :param backend: instance of :class:`CacheBackend`. Defaults to a
+                        :class:`MemoryCache`.
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, usable=None):
+        """
+        Get the cached result
+
+        :param key: tuple
+        :param usable: callable telling whether the cached result can answer
+                       the query. A result it rejects is counted as a miss.
+        :returns: the result or None if it's not cached
+        """
+        value = self.backend.get((self.generation,) + key)
+        if value is not None and usable is not None and not usable(value):
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def init_app(self, app):
+        """
+        Configure the cache from the configuration of the application:
+        QUERY_CACHE_BACKEND (an instance of :class:`CacheBackend` or the
+        import path of a class constructed without arguments), or else
+        QUERY_CACHE_SIZE and QUERY_CACHE_TTL for a :class:`MemoryCache`
+
+        :param app: instance of :class:`flask.Flask`
+        """
+        backend = app.config.get('QUERY_CACHE_BACKEND')
+        if isinstance(backend, str):
+            module_name, _, class_name = backend.rpartition('.')
+            backend = getattr(importlib.import_module(module_name),
+                              class_name)()
+        elif backend is None:
+            backend = MemoryCache(
+                max_size=app.config.get('QUERY_CACHE_SIZE',
+                                        config.QUERY_CACHE_SIZE),
+                ttl=app.config.get('QUERY_CACHE_TTL', config.QUERY_CACHE_TTL))
+        self.backend = backend
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drop every cached result, to be called whenever the data of the
+        process changes. The whole backend is cleared, which is why it can't
+        be shared with other processes, whose data may not have changed.
+        """
+        with self._lock:
+            self.generation += 1
+        self.backend.clear()
+
+    def set(self, key, value):
+        """
+        Cache the result
+
+        :param key: tuple
+        :param value: any value other than None
+        """
+        self.backend.set((self.generation,) + key, value)
+
+    def stats(self):
+        """
+        Get the counters of the cache
+
+        :returns: dict
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
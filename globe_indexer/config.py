@@ -7,14 +7,100 @@ Globe Indexer Configuration Module
 # Original data set
 DATA_SET_URL = 'http://download.geonames.org/export/dump/cities1000.zip'
 
-# Download file
-DATA_CHUNK_SIZE = 1024
+# Download file: size of the first read (in bytes), grown up to the maximum
+# while reads take less than the target duration (in seconds) and shrunk when
+# they take longer
+DATA_CHUNK_SIZE = 64 * 1024
+DATA_MAX_CHUNK_SIZE = 4 * 1024 * 1024
+DATA_CHUNK_DURATION = 0.2
+
+# Download file: number of parallel range requests, minimum size of the range
+# fetched by each of them, attempts per range and timeout (in seconds)
+DATA_CONNECTIONS = 4
+DATA_MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+DATA_RETRIES = 5
+DATA_RETRY_BACKOFF = 1.0
+DATA_TIMEOUT = 30
+
+# Number of rows per INSERT statement when loading the data set
+DATA_LOAD_BATCH_SIZE = 5000
+
+# Parallel loading of the data set: size (in bytes) of the chunks of the file
+# parsed by each worker process, and number of parsed chunks waiting for the
+# writer per worker process
+DATA_PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+DATA_PARSE_QUEUE_SIZE = 2
+
+# Cities kept from the daily modification files of GeoNames, as in the data
+# set: populated places with a population of at least 1000 or being the seat
+# of an administrative division, except the historical, abandoned and
+# destroyed ones
+CITY_FEATURE_CLASS = 'P'
+CITY_MIN_POPULATION = 1000
+CITY_SEAT_FEATURE_CODES = ('PPLC', 'PPLA', 'PPLA2', 'PPLA3')
+CITY_EXCLUDED_FEATURE_CODES = ('PPLCH', 'PPLH', 'PPLQ', 'PPLW')
+
+# Query result cache: maximum number of entries and time to live (seconds)
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 3600
+
+# Time (seconds) clients may cache the country catalogue before revalidating
+COUNTRIES_MAX_AGE = 300
+
+# Maximum number of values bound to a single SQL IN clause
+SQL_IN_CLAUSE_LIMIT = 500
+
+# Time (seconds) a query worker waits for one of the read only connections
+# of the production database profile, or a load for the writer connection
+SQLITE_POOL_TIMEOUT = 30
+
+# Async serving mode: number of worker threads handling the requests (None
+# for the default of concurrent.futures) and number of chunks of a response
+# waiting to be sent by the event loop
+ASYNC_WORKERS = None
+ASYNC_QUEUE_SIZE = 16
+
+# For autocomplete limit
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
 
 # For proximity search limit
 DEFAULT_PROXIMITY_LIMIT = 5
+MAX_PROXIMITY_LIMIT = 500
+
+# For reverse geocoding limit
+DEFAULT_REVERSE_LIMIT = 1
+MAX_REVERSE_LIMIT = 50
+
+# Batch proximity search: maximum number of origins per request, maximum
+# number of cities returned per request (origins times k), maximum number of
+# distances computed at once, and size of the point sets below which a
+# vectorized scan is faster than the spatial index
+MAX_BATCH_ORIGINS = 5000
+MAX_BATCH_RESULTS = 50000
+BATCH_BLOCK_SIZE = 1 << 22
+BATCH_SCAN_SIZE = 1024
+
+# Number of neighbours per city in the precomputed nearest neighbour table
+KNN_TABLE_SIZE = 50
 
 # The radius of earth in kilometers
 EARTH_RADIUS = 6371
 
+# Maximum radius of the radius search in kilometers: half the circumference
+# of the earth, within which every point lies
+MAX_RADIUS = 20016
+
+# Maximum number of cities held by a leaf of the spatial index
+SPATIAL_LEAF_SIZE = 16
+
+# Scale mode, serving the cities from on-disk indexes: budget (in bytes) of
+# the private memory of the process, estimated private memory held per row
+# while the indexes are written (setting the number of rows written at
+# once), and size (in degrees) of the cells of the spatial grid
+SCALE_MEMORY_BUDGET = 512 * 1024 * 1024
+SCALE_ROW_COST = 8 * 1024
+SCALE_GRID_CELL_SIZE = 0.5
+
 # New line character
 NEW_LINE = '\n'
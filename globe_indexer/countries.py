@@ -0,0 +1,67 @@
+# Filename: countries.py
+
+"""
+Globe Indexer Countries Module
+
+Interface classes:
+    CountryCatalogue
+"""
+
+# Standard libraries
+import hashlib
+
+# PyCountry
+import pycountry
+
+# Globe Indexer
+from globe_indexer.serializer import dumps
+
+
+# Interface classes
+class CountryCatalogue(object):
+    """
+    Resident catalogue of the country codes present in the data, with their
+    names resolved once when the data is loaded. The catalogue is versioned
+    by a digest of its content, to be used as an ETag.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.body = '{"countries":[],"version":""}'
+        self.choices = [('', '')]
+        self.version = ''
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of countries
+
+        :returns: int
+        """
+        return len(self.choices) - 1
+
+    def load(self, counts):
+        """
+        (Re)build the catalogue
+
+        :param counts: dict - country code to the number of cities
+        """
+        countries = list()
+        for code in sorted(counts):
+            try:
+                country = pycountry.countries.get(alpha_2=code)
+            except KeyError:
+                country = None
+            name = country.name if country else code
+            countries.append({'code': code, 'name': name,
+                              'cities': counts[code]})
+
+        content = dumps(countries)
+        self.version = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        self.body = '{{"countries":{},"version":{}}}'.format(
+            content, dumps(self.version))
+        self.choices = [('', '')] + [
+            (value['code'], '{} - {}'.format(value['code'], value['name']))
+            for value in countries]
+        self.loaded = True
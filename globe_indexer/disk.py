@@ -0,0 +1,338 @@
+# Filename: disk.py
+
+"""
+Globe Indexer Disk Module
+
+Building blocks of the indexes written to disk and memory mapped when
+serving: flat arrays and columns of strings written one chunk at a time, and
+values grouped by integer keys. Neither writing nor reading them needs the
+whole data in memory.
+
+Arrays are stored as raw little endian files. A column of strings is stored
+as a heap of UTF-8 bytes (.heap) and the offsets of the strings into it
+(.offsets). Grouped values are stored as the sorted distinct keys (.keys),
+the offset of the values of each key (.offsets) and one array per field.
+
+Interface classes:
+    ArrayWriter
+    Groups
+    StringColumn
+    StringWriter
+
+Interface functions:
+    open_array
+    write_groups
+"""
+
+# Standard libraries
+import mmap
+import os
+
+# NumPy
+import numpy as np
+
+
+# Constants
+BUFFER_SIZE = 65536
+
+
+# Interface functions
+def open_array(fpath, dtype):
+    """
+    Map an array written by :class:`ArrayWriter`
+
+    :param fpath: string - path to the file
+    :param dtype: numpy data type of the values
+    :returns: read only numpy.ndarray
+    """
+    dtype = np.dtype(dtype).newbyteorder('<')
+    with open(fpath, 'rb') as fin:
+        if not os.fstat(fin.fileno()).st_size:
+            return np.empty(0, dtype=dtype)
+        mapping = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(mapping, dtype=dtype)
+
+
+def write_groups(fpath, chunks, dtypes):
+    """
+    Write values grouped by integer key, keeping the order in which the
+    values of a key are given. The chunks are gone through twice (counting
+    the values of each key, then writing them in place), so that only one
+    chunk is held in memory at a time.
+
+    :param fpath: string - path of the files, without extension
+    :param chunks: callable returning an iterable of tuple (keys, values)
+                   where keys is a 1D array of int and values a dict of
+                   field name to 1D array of the same length
+    :param dtypes: dict - field name to numpy data type
+    :returns: int - number of values written
+    """
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    for chunk_keys, _ in chunks():
+        values, chunk_counts = np.unique(chunk_keys, return_counts=True)
+        keys, inverse = np.unique(np.concatenate((keys, values)),
+                                  return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys),
+                             weights=np.concatenate((counts, chunk_counts)))
+        counts = counts.astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    total = int(offsets[-1])
+
+    outputs = dict()
+    for field, dtype in dtypes.items():
+        tmp_fpath = '{}.{}.tmp'.format(fpath, field)
+        with open(tmp_fpath, 'wb') as fout:
+            fout.truncate(total * np.dtype(dtype).itemsize)
+        if total:
+            outputs[field] = np.memmap(tmp_fpath, mode='r+', shape=(total,),
+                                       dtype=np.dtype(dtype).newbyteorder(
+                                           '<'))
+
+    written = offsets[:-1].copy()
+    for chunk_keys, values in chunks():
+        chunk_keys = np.asarray(chunk_keys, dtype=np.int64)
+        order = np.argsort(chunk_keys, kind='stable')
+        sorted_keys = chunk_keys[order]
+        positions = np.searchsorted(keys, sorted_keys)
+        # Rank of each value among the values of its key in the chunk
+        ranks = np.arange(len(sorted_keys)) - \
+            np.searchsorted(sorted_keys, sorted_keys)
+        destinations = written[positions] + ranks
+        for field, output in outputs.items():
+            output[destinations] = np.asarray(values[field])[order]
+        written += np.bincount(positions, minlength=len(keys))
+
+    for field in dtypes:
+        if field in outputs:
+            outputs.pop(field).flush()
+        os.replace('{}.{}.tmp'.format(fpath, field),
+                   '{}.{}'.format(fpath, field))
+    for extension, values in (('keys', keys), ('offsets', offsets)):
+        with ArrayWriter('{}.{}'.format(fpath, extension), np.int64) as fout:
+            fout.append(values)
+    return total
+
+
+# Interface classes
+class ArrayWriter(object):
+    """
+    Writer of an array appended to one chunk at a time. The file is written
+    under a temporary name and renamed once closed, so that readers never
+    open a partial file.
+    """
+    def __init__(self, fpath, dtype):
+        """
+        Constructor
+
+        :param fpath: string - path to the file
+        :param dtype: numpy data type of the values
+        """
+        self.fpath = fpath
+        self.count = 0
+        self._dtype = np.dtype(dtype).newbyteorder('<')
+        self._buffer = list()
+        self._fout = open(fpath + '.tmp', 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._fout.close()
+            os.remove(self.fpath + '.tmp')
+
+    def add(self, value):
+        """
+        Append a single value
+
+        :param value: scalar
+        """
+        self._buffer.append(value)
+        self.count += 1
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._flush()
+
+    def append(self, values):
+        """
+        Append values
+
+        :param values: 1D array or iterable of scalars
+        """
+        self._flush()
+        values = np.asarray(values, dtype=self._dtype)
+        values.tofile(self._fout)
+        self.count += len(values)
+
+    def close(self):
+        """
+        Write the remaining values and rename the file
+        """
+        self._flush()
+        self._fout.close()
+        os.replace(self.fpath + '.tmp', self.fpath)
+
+    def _flush(self):
+        """
+        Write the values appended one at a time
+        """
+        if self._buffer:
+            np.asarray(self._buffer, dtype=self._dtype).tofile(self._fout)
+            self._buffer = list()
+
+
+class StringWriter(object):
+    """
+    Writer of a column of strings appended to one value at a time, see
+    :class:`StringColumn`
+    """
+    def __init__(self, fpath):
+        """
+        Constructor
+
+        :param fpath: string - path of the files, without extension
+        """
+        self._size = 0
+        self._heap = ArrayWriter(fpath + '.heap', np.uint8)
+        self._offsets = ArrayWriter(fpath + '.offsets', np.int64)
+        self._offsets.add(0)
+        self._buffer = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        for writer in (self._heap, self._offsets):
+            writer.__exit__(exc_type, exc_value, traceback)
+
+    def add(self, value):
+        """
+        Append a string
+
+        :param value: string
+        """
+        value = value.encode('utf-8')
+        self._buffer.append(value)
+        self._size += len(value)
+        self._offsets.add(self._size)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._heap.append(np.frombuffer(b''.join(self._buffer),
+                                            dtype=np.uint8))
+            self._buffer = list()
+
+    def close(self):
+        """
+        Write the remaining strings and rename the files
+        """
+        self._heap.append(np.frombuffer(b''.join(self._buffer),
+                                        dtype=np.uint8))
+        self._buffer = list()
+        self._heap.close()
+        self._offsets.close()
+
+
+class StringColumn(object):
+    """
+    Read only, memory mapped column of strings written by
+    :class:`StringWriter`. It's a sequence, so sorted columns can be searched
+    with :mod:`bisect`.
+    """
+    def __init__(self, fpath):
+        """
+        Constructor
+
+        :param fpath: string - path of the files, without extension
+        """
+        self._heap = open_array(fpath + '.heap', np.uint8)
+        self._offsets = open_array(fpath + '.offsets', np.int64)
+
+    def __getitem__(self, position):
+        """
+        Get the string at the given position
+
+        :param position: int
+        :returns: string
+        """
+        position = int(position)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start, end = self._offsets[position:position + 2].tolist()
+        return self._heap[start:end].tobytes().decode('utf-8')
+
+    def __len__(self):
+        """
+        Get the number of strings
+
+        :returns: int
+        """
+        return max(len(self._offsets) - 1, 0)
+
+    def slice(self, start, end):
+        """
+        Get the strings between two positions at once
+
+        :param start: int
+        :param end: int - excluded
+        :returns: list of string
+        """
+        offsets = self._offsets[start:end + 1].tolist()
+        heap = self._heap[offsets[0]:offsets[-1]].tobytes() if offsets else b''
+        base = offsets[0] if offsets else 0
+        return [heap[lower - base:upper - base].decode('utf-8')
+                for lower, upper in zip(offsets, offsets[1:])]
+
+
+class Groups(object):
+    """
+    Read only, memory mapped values grouped by integer key, written by
+    :func:`write_groups`
+    """
+    def __init__(self, fpath, dtypes):
+        """
+        Constructor
+
+        :param fpath: string - path of the files, without extension
+        :param dtypes: dict - field name to numpy data type
+        """
+        self.keys = open_array(fpath + '.keys', np.int64)
+        self.offsets = open_array(fpath + '.offsets', np.int64)
+        self.fields = {field: open_array('{}.{}'.format(fpath, field), dtype)
+                       for field, dtype in dtypes.items()}
+
+    def __len__(self):
+        """
+        Get the number of keys
+
+        :returns: int
+        """
+        return len(self.keys)
+
+    def bounds(self, lower, upper):
+        """
+        Get the range of the values of the keys between two keys
+
+        :param lower: int - first key
+        :param upper: int - key after the last one (excluded)
+        :returns: tuple of int (start, end) - positions of the values
+        """
+        positions = np.searchsorted(self.keys, [lower, upper])
+        return tuple(self.offsets[positions].tolist())
+
+    def get(self, key, field):
+        """
+        Get the values of a key
+
+        :param key: int
+        :param field: string - name of the field
+        :returns: numpy.ndarray or None if there is no such key
+        """
+        position = int(np.searchsorted(self.keys, key))
+        if position == len(self.keys) or self.keys[position] != key:
+            return None
+        start, end = self.offsets[position:position + 2].tolist()
+        return self.fields[field][start:end]
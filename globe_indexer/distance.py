@@ -0,0 +1,235 @@
+# Filename: distance.py
+
+"""
+Globe Indexer Distance Module
+
+Vectorized counterpart of :func:`utils.get_distance`, computing Haversine
+distances from one or many origins to a set of points in a single array pass.
+
+Interface classes:
+    PointArray
+
+Interface functions:
+    bounding_box
+    haversine
+    select_nearest
+"""
+
+# Standard libraries
+import math
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer import config
+from globe_indexer.error import GlobeIndexerError
+
+
+# Interface functions
+def bounding_box(latitude, longitude, radius):
+    """
+    Get the latitude/longitude box enclosing every point within the radius of
+    the specified coordinate. A box crossing the antimeridian is split into
+    two longitude ranges, and a circle enclosing a pole spans every
+    longitude.
+
+    :param latitude: float (decimal degrees)
+    :param longitude: float (decimal degrees)
+    :param radius: float - in kilometers
+    :returns: tuple of (minimum latitude, maximum latitude, list of tuple
+              (minimum longitude, maximum longitude))
+    """
+    angle = radius / config.EARTH_RADIUS
+    min_lat = latitude - math.degrees(angle)
+    max_lat = latitude + math.degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    delta = math.degrees(math.asin(min(math.sin(angle) /
+                                       math.cos(math.radians(latitude)), 1.0)))
+    min_lon, max_lon = longitude - delta, longitude + delta
+    if min_lon < -180:
+        ranges = [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    elif max_lon > 180:
+        ranges = [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    else:
+        ranges = [(min_lon, max_lon)]
+    return min_lat, max_lat, ranges
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Calculate the great circle distance between points on the earth
+    (specified in decimal degrees). Arguments can be scalars or arrays that
+    are broadcastable against each other.
+
+    :param lon1: longitude of first point(s)
+    :param lat1: latitude of first point(s)
+    :param lon2: longitude of second point(s)
+    :param lat2: latitude of second point(s)
+    :returns: float or numpy.ndarray of float64
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(value, dtype=np.float64))
+                              for value in (lon1, lat1, lon2, lat2))
+    value = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.minimum(value, 1.0))) * config.EARTH_RADIUS
+
+
+def select_nearest(distances, ids, k=None, exclude=None):
+    """
+    Select the k smallest distances, with ties broken by the ID, using
+    :func:`numpy.argpartition` so that only the selected values get sorted
+
+    :param distances: 1D numpy.ndarray of float
+    :param ids: 1D numpy.ndarray of int
+    :param k: int - number of values to select. Select all when it's not
+              specified.
+    :param exclude: ID that should not be part of the results
+    :returns: a sorted list of tuple (distance, ID)
+    """
+    if exclude is not None:
+        mask = ids != exclude
+        distances, ids = distances[mask], ids[mask]
+
+    if k is not None and k < len(distances):
+        if k < 1:
+            return list()
+        kth = distances[np.argpartition(distances, k - 1)[k - 1]]
+        mask = distances <= kth
+        distances, ids = distances[mask], ids[mask]
+
+    order = np.lexsort((ids, distances))[:k]
+    return list(zip(distances[order].tolist(), ids[order].tolist()))
+
+
+# Interface classes
+class PointArray(object):
+    """
+    Contiguous arrays of IDs and coordinates of a set of points
+    """
+    def __init__(self, ids, latitudes, longitudes):
+        """
+        Constructor
+
+        :param ids: iterable of int
+        :param latitudes: iterable of float (decimal degrees)
+        :param longitudes: iterable of float (decimal degrees)
+        """
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        if not self.ids.shape == self.latitudes.shape == self.longitudes.shape:
+            fstr = "IDs, latitudes and longitudes should have the same length"
+            raise GlobeIndexerError(fstr)
+
+        self._lat_radians = np.radians(self.latitudes)
+        self._lon_radians = np.radians(self.longitudes)
+        self._cos_lat = np.cos(self._lat_radians)
+
+    def __len__(self):
+        """
+        Get the number of points
+
+        :returns: int
+        """
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Create an instance from rows of points
+
+        :param rows: iterable of tuple (ID, latitude, longitude)
+        :returns: instance of :class:`PointArray`
+        """
+        rows = list(rows)
+        if not rows:
+            return cls([], [], [])
+        ids, latitudes, longitudes = zip(*rows)
+        return cls(ids, latitudes, longitudes)
+
+    def distances(self, latitudes, longitudes):
+        """
+        Calculate the distances (in kilometers) from the origin(s) to all
+        points
+
+        :param latitudes: float or 1D array of float - latitude of origin(s)
+        :param longitudes: float or 1D array of float - longitude of origin(s)
+        :returns: numpy.ndarray - of shape (N,) for a single origin or of
+                  shape (M, N) for M origins
+        """
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))[..., None]
+        lon = np.radians(np.asarray(longitudes, dtype=np.float64))[..., None]
+        value = np.sin((self._lat_radians - lat) / 2) ** 2 + \
+            np.cos(lat) * self._cos_lat * \
+            np.sin((self._lon_radians - lon) / 2) ** 2
+        return 2 * np.arcsin(np.sqrt(np.minimum(value, 1.0))) * \
+            config.EARTH_RADIUS
+
+    def nearest(self, latitude, longitude, k=None, exclude=None):
+        """
+        Get the points closest to the specified coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param k: int - number of points to return. Return all points when
+                  it's not specified.
+        :param exclude: ID of a point that should not be part of the results
+        :returns: a sorted list where each element is a tuple of float and the
+                  ID of the point. The float value is the distance (in
+                  kilometers) from the specified coordinate.
+        """
+        return select_nearest(self.distances(latitude, longitude), self.ids,
+                              k=k, exclude=exclude)
+
+    def nearest_many(self, latitudes, longitudes, k=None, excludes=None,
+                     block_size=config.BATCH_BLOCK_SIZE):
+        """
+        Get the points closest to each of the specified coordinates. The
+        distances are computed for blocks of origins at once, each block
+        holding at most block_size distances.
+
+        :param latitudes: 1D array of float - latitude of the origins
+        :param longitudes: 1D array of float - longitude of the origins
+        :param k: int - number of points to return per origin. Return all
+                  points when it's not specified.
+        :param excludes: iterable of point ID (or None) to be left out of the
+                         results of the origin at the same position
+        :param block_size: int - maximum number of distances per block
+        :returns: list with a sorted list of tuple (distance, ID) per origin
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if excludes is None:
+            excludes = [None] * len(latitudes)
+        else:
+            excludes = list(excludes)
+
+        results = list()
+        step = max(1, block_size // max(1, len(self)))
+        for start in range(0, len(latitudes), step):
+            end = start + step
+            distances = self.distances(latitudes[start:end],
+                                       longitudes[start:end])
+            for row, exclude in zip(distances, excludes[start:end]):
+                results.append(select_nearest(row, self.ids, k=k,
+                                              exclude=exclude))
+        return results
+
+    def within(self, latitude, longitude, radius, exclude=None):
+        """
+        Get the points within the radius of the specified coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param radius: float - in kilometers
+        :param exclude: ID of a point that should not be part of the results
+        :returns: a sorted list of tuple (distance, ID)
+        """
+        distances = self.distances(latitude, longitude)
+        mask = distances <= radius
+        return select_nearest(distances[mask], self.ids[mask],
+                              exclude=exclude)
+
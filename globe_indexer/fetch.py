@@ -0,0 +1,316 @@
+# Filename: fetch.py
+
+"""
+Globe Indexer Fetch Module
+
+Download of the data set over HTTP. The file is split into byte ranges
+(segments) fetched in parallel into separate part files, so that an
+interrupted download resumes where each segment stopped. The file is only
+moved to its final path once complete and verified against its checksum.
+
+Interface functions:
+    fetch_file
+"""
+
+# Standard libraries
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import time
+
+# Requests
+import requests
+import urllib3
+
+# Globe Indexer
+from globe_indexer import config
+from globe_indexer.error import GlobeIndexerError
+
+
+# Constants
+LOGGER = logging.getLogger(__name__)
+READ_ERRORS = (requests.RequestException, urllib3.exceptions.HTTPError,
+               OSError)
+
+
+# Interface functions
+def fetch_file(url, fpath, checksum=None, algorithm='sha256',
+               connections=config.DATA_CONNECTIONS,
+               retries=config.DATA_RETRIES, backoff=config.DATA_RETRY_BACKOFF,
+               timeout=config.DATA_TIMEOUT, session=None):
+    """
+    Download a file, resuming the segments left by a previous attempt if the
+    remote file hasn't changed since (same size, ETag or Last-Modified)
+
+    :param url: string - URL of the resource
+    :param fpath: string - path to where to place the file
+    :param checksum: string - expected hexadecimal digest of the file. The
+                     file is not verified if it's None.
+    :param algorithm: string - name of the hash algorithm (see
+                      :func:`hashlib.new`)
+    :param connections: int - maximum number of parallel range requests
+    :param retries: int - number of times a segment is resumed after an
+                    error before giving up
+    :param backoff: float - delay (in seconds) before the first retry,
+                    doubled for each of the next ones
+    :param timeout: float - timeout (in seconds) of the connection and of
+                    each read
+    :param session: instance of :class:`requests.Session`
+    :returns: string - hexadecimal digest of the file
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(fpath)), exist_ok=True)
+    session = session if session is not None else requests.Session()
+    remote = _probe(session, url, timeout)
+    segments = _plan_segments(fpath, remote, connections)
+
+    def fetch(segment):
+        index, start, end = segment
+        _fetch_segment(session, url, _part_fpath(fpath, index), start, end,
+                       remote, retries, backoff, timeout)
+
+    start_time = time.time()
+    segments = [(index, start, end)
+                for index, (start, end) in enumerate(segments)]
+    if len(segments) == 1:
+        fetch(segments[0])
+    else:
+        with concurrent.futures.ThreadPoolExecutor(len(segments)) as executor:
+            list(executor.map(fetch, segments))
+
+    digest = _join_segments(fpath, len(segments), remote['size'], checksum,
+                            algorithm)
+    LOGGER.info("downloaded %s in %d segment(s) in %.1fs", url,
+                len(segments), time.time() - start_time)
+    return digest
+
+
+# Private functions
+def _copy(response, fout, expected):
+    """
+    Copy the body of the response into the file, adapting the size of the
+    reads to the throughput (see :data:`config.DATA_CHUNK_DURATION`)
+
+    :param response: instance of :class:`requests.Response`
+    :param fout: file object
+    :param expected: int - number of bytes to read or None until the end
+    """
+    size = config.DATA_CHUNK_SIZE
+    while expected is None or expected > 0:
+        start = time.perf_counter()
+        chunk = response.raw.read(size if expected is None else
+                                  min(size, expected))
+        if not chunk:
+            return
+        fout.write(chunk)
+        if expected is not None:
+            expected -= len(chunk)
+
+        elapsed = time.perf_counter() - start
+        if elapsed < config.DATA_CHUNK_DURATION / 2:
+            size = min(size * 2, config.DATA_MAX_CHUNK_SIZE)
+        elif elapsed > config.DATA_CHUNK_DURATION * 2:
+            size = max(size // 2, config.DATA_CHUNK_SIZE)
+
+
+def _fetch_segment(session, url, part_fpath, start, end, remote, retries,
+                   backoff, timeout):
+    """
+    Fetch a segment into its part file, resuming from the bytes already
+    written
+
+    :param session: instance of :class:`requests.Session`
+    :param url: string
+    :param part_fpath: string - path to the part file
+    :param start: int - offset of the first byte of the segment
+    :param end: int - offset of the last byte of the segment, or None if
+                the size of the file is unknown
+    :param remote: dict - see :func:`_probe`
+    :param retries: int
+    :param backoff: float
+    :param timeout: float
+    """
+    expected = None if end is None else end - start + 1
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            delay = backoff * 2 ** (attempt - 1)
+            LOGGER.warning("retrying %s in %.1fs: %s", part_fpath, delay,
+                           error)
+            time.sleep(delay)
+
+        done = os.path.getsize(part_fpath) \
+            if os.path.isfile(part_fpath) else 0
+        headers = {'Accept-Encoding': 'identity'}
+        if expected is not None and done == expected:
+            return
+        if not remote['ranges'] or expected is None or done > expected:
+            # Without range request the file is fetched again from the start
+            done = 0
+        else:
+            headers['Range'] = 'bytes={}-{}'.format(start + done, end)
+            if remote['validator']:
+                headers['If-Range'] = remote['validator']
+
+        try:
+            with session.get(url, headers=headers, stream=True,
+                             timeout=timeout) as response:
+                response.raise_for_status()
+                if 'Range' in headers and response.status_code != 206:
+                    fstr = "remote file changed while downloading: {}".format(
+                        url)
+                    raise GlobeIndexerError(fstr, hint="download it again")
+                with open(part_fpath, mode='ab' if done else 'wb') as fout:
+                    _copy(response, fout,
+                          None if expected is None else expected - done)
+        except requests.HTTPError as exc:
+            if exc.response.status_code < 500:
+                fstr = "cannot download {}".format(url)
+                raise GlobeIndexerError(fstr, details=str(exc))
+            error = str(exc)
+            continue
+        except READ_ERRORS as exc:
+            error = str(exc)
+            continue
+
+        if expected is None or os.path.getsize(part_fpath) == expected:
+            return
+        error = "incomplete response"
+
+    fstr = "cannot download {} after {} attempts".format(url, retries + 1)
+    raise GlobeIndexerError(fstr, details=error)
+
+
+def _join_segments(fpath, count, size, checksum, algorithm):
+    """
+    Concatenate the part files into the file, verifying its size and digest
+
+    :param fpath: string
+    :param count: int - number of segments
+    :param size: int - expected size or None if it's unknown
+    :param checksum: string - expected digest or None
+    :param algorithm: string
+    :returns: string - hexadecimal digest of the file
+    """
+    part_fpaths = [_part_fpath(fpath, index) for index in range(count)]
+    hasher = hashlib.new(algorithm)
+    tmp_fpath = fpath + '.part'
+    total = 0
+    with open(tmp_fpath, 'wb') as fout:
+        for part_fpath in part_fpaths:
+            with open(part_fpath, 'rb') as fin:
+                for block in iter(lambda: fin.read(
+                        config.DATA_MAX_CHUNK_SIZE), b''):
+                    hasher.update(block)
+                    fout.write(block)
+                    total += len(block)
+
+    digest = hasher.hexdigest()
+    for part_fpath in part_fpaths + [_state_fpath(fpath)]:
+        os.remove(part_fpath)
+    if size is not None and total != size:
+        os.remove(tmp_fpath)
+        fstr = "downloaded {} bytes instead of {}: {}".format(total, size,
+                                                              fpath)
+        raise GlobeIndexerError(fstr)
+    if checksum is not None and digest != checksum.lower():
+        os.remove(tmp_fpath)
+        fstr = "checksum mismatch of the downloaded file: {}".format(fpath)
+        raise GlobeIndexerError(fstr, details="expected {}, got {}".format(
+            checksum, digest))
+    os.replace(tmp_fpath, fpath)
+    return digest
+
+
+def _part_fpath(fpath, index):
+    """
+    Get the path to the part file of a segment
+
+    :param fpath: string
+    :param index: int
+    :returns: string
+    """
+    return '{}.part{}'.format(fpath, index)
+
+
+def _plan_segments(fpath, remote, connections):
+    """
+    Split the file into segments, reusing the segments of a previous attempt
+    if the remote file hasn't changed since. The plan is saved next to the
+    part files.
+
+    :param fpath: string
+    :param remote: dict - see :func:`_probe`
+    :param connections: int
+    :returns: list of tuple (start, end) - offsets of the first and last
+              bytes of each segment (end is None if the size of the file is
+              unknown)
+    """
+    state_fpath = _state_fpath(fpath)
+    try:
+        with open(state_fpath) as fin:
+            state = json.load(fin)
+    except (OSError, ValueError):
+        state = dict()
+    if state.get('remote') == remote:
+        return [tuple(segment) for segment in state['segments']]
+
+    # Stale part files of another version of the remote file
+    for index in range(len(state.get('segments', ()))):
+        if os.path.isfile(_part_fpath(fpath, index)):
+            os.remove(_part_fpath(fpath, index))
+
+    size = remote['size']
+    if not size:
+        segments = [(0, None)]
+    elif not remote['ranges']:
+        segments = [(0, size - 1)]
+    else:
+        count = max(1, min(connections,
+                           -(-size // config.DATA_MIN_SEGMENT_SIZE)))
+        bounds = [size * index // count for index in range(count + 1)]
+        segments = [(bounds[index], bounds[index + 1] - 1)
+                    for index in range(count)]
+
+    with open(state_fpath, 'w') as fout:
+        json.dump({'remote': remote, 'segments': segments}, fout)
+    return segments
+
+
+def _probe(session, url, timeout):
+    """
+    Get the size of the remote file, whether it can be fetched by ranges, and
+    its validator (ETag or Last-Modified)
+
+    :param session: instance of :class:`requests.Session`
+    :param url: string
+    :param timeout: float
+    :returns: dict
+    """
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout,
+                                headers={'Accept-Encoding': 'identity'})
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        LOGGER.warning("cannot probe %s: %s", url, exc)
+        return {'url': url, 'size': None, 'ranges': False, 'validator': None}
+
+    size = response.headers.get('Content-Length')
+    return {
+        'url': url,
+        'size': int(size) if size is not None else None,
+        'ranges': response.headers.get('Accept-Ranges') == 'bytes',
+        'validator': response.headers.get('ETag') or
+        response.headers.get('Last-Modified'),
+    }
+
+
+def _state_fpath(fpath):
+    """
+    Get the path to the file holding the segments of the download
+
+    :param fpath: string
+    :returns: string
+    """
+    return fpath + '.part.json'
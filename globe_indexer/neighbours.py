@@ -0,0 +1,301 @@
+# Filename: neighbours.py
+
+"""
+Globe Indexer Neighbours Module
+
+Precomputed table of the k nearest neighbours of every point, stored as
+NumPy arrays in a directory so that it can be memory mapped when serving.
+
+Interface classes:
+    NeighbourTable
+"""
+
+# Standard libraries
+import multiprocessing
+import os
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer import config
+from globe_indexer.distance import PointArray
+from globe_indexer.error import GlobeIndexerError
+from globe_indexer.spatial import KDTree
+
+
+# Constants
+FILE_NAMES = ('ids', 'coordinates', 'neighbours', 'distances')
+MISSING = -1
+
+# Tree and number of neighbours of a worker process, see
+# :func:`_initialize_worker`
+_WORKER_STATE = dict()
+
+
+# Interface classes
+class NeighbourTable(object):
+    """
+    Table holding, for every point, the IDs of and distances to its k nearest
+    other points, sorted by distance (ties broken by ID). Rows of points
+    having fewer than k other points are padded with an ID of -1.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.k = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._coordinates = np.empty((0, 2), dtype=np.float64)
+        self._neighbours = np.empty((0, 0), dtype=np.int32)
+        self._distances = np.empty((0, 0), dtype=np.float64)
+        self.dpath = None
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of rows
+
+        :returns: int
+        """
+        return len(self._ids)
+
+    def compute(self, points, k=config.KNN_TABLE_SIZE, processes=None):
+        """
+        (Re)compute the whole table
+
+        :param points: instance of :class:`distance.PointArray`
+        :param k: int - number of neighbours per point
+        :param processes: int - number of worker processes. Defaults to the
+                          number of CPUs.
+        """
+        points = _sort_points(points)
+        self.k = k
+        self._ids = points.ids
+        self._coordinates = np.column_stack((points.latitudes,
+                                             points.longitudes))
+        self._neighbours, self._distances = _compute_rows(
+            points, np.arange(len(points)), k, processes)
+        self.loaded = True
+
+    def lookup(self, point_id, limit):
+        """
+        Get the nearest neighbours of a point from the table
+
+        :param point_id: int
+        :param limit: int - maximum number of neighbours
+        :returns: a sorted list of tuple (distance, ID) or None if the table
+                  cannot answer (unknown point or limit greater than k)
+        """
+        if not self.loaded or limit is None or limit > self.k:
+            return None
+        position = int(np.searchsorted(self._ids, point_id))
+        if position == len(self._ids) or self._ids[position] != point_id:
+            return None
+
+        neighbours = self._neighbours[position, :limit].tolist()
+        distances = self._distances[position, :limit].tolist()
+        return [(distance, neighbour)
+                for distance, neighbour in zip(distances, neighbours)
+                if neighbour != MISSING]
+
+    def load(self, dpath):
+        """
+        Load a table saved with :meth:`NeighbourTable.save`, memory mapping
+        its arrays
+
+        :param dpath: string - path to the directory
+        """
+        arrays = [np.load(os.path.join(dpath, name + '.npy'), mmap_mode='r')
+                  for name in FILE_NAMES]
+        self._ids, self._coordinates, self._neighbours, self._distances = \
+            arrays
+        self.k = self._neighbours.shape[1]
+        self.dpath = dpath
+        self.loaded = True
+
+    def unload(self):
+        """
+        Release the table, e.g. when the points it was computed from change
+        """
+        self.k = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._coordinates = np.empty((0, 2), dtype=np.float64)
+        self._neighbours = np.empty((0, 0), dtype=np.int32)
+        self._distances = np.empty((0, 0), dtype=np.float64)
+        self.dpath = None
+        self.loaded = False
+
+    def save(self, dpath):
+        """
+        Write the arrays of the table into a directory. Each file is written
+        under a temporary name first and then renamed, so that readers never
+        see a partial file.
+
+        :param dpath: string - path to the directory
+        """
+        os.makedirs(dpath, exist_ok=True)
+        arrays = (self._ids, self._coordinates, self._neighbours,
+                  self._distances)
+        for name, array in zip(FILE_NAMES, arrays):
+            fpath = os.path.join(dpath, name + '.npy')
+            tmp_fpath = os.path.join(dpath, name + '.tmp.npy')
+            np.save(tmp_fpath, array)
+            os.replace(tmp_fpath, fpath)
+
+    def update(self, points, k=config.KNN_TABLE_SIZE, processes=None):
+        """
+        Bring the table up to date with the points, recomputing only the rows
+        that can be affected by the points added, moved or removed since the
+        table was computed: the rows of these points, the rows that list them
+        as neighbours, and the rows whose k-th neighbour is farther than one
+        of the new positions.
+
+        :param points: instance of :class:`distance.PointArray`
+        :param k: int - number of neighbours per point
+        :param processes: int - number of worker processes
+        :returns: int - number of rows recomputed
+        """
+        points = _sort_points(points)
+        # Tables saved in single precision are computed again
+        if not self.loaded or k != self.k or \
+                self._distances.dtype != np.float64:
+            self.compute(points, k=k, processes=processes)
+            return len(points)
+
+        coordinates = np.column_stack((points.latitudes, points.longitudes))
+        old_positions = np.searchsorted(self._ids, points.ids)
+        old_positions = np.minimum(old_positions, max(len(self._ids) - 1, 0))
+        common = np.zeros(len(points), dtype=bool)
+        if len(self._ids):
+            common = self._ids[old_positions] == points.ids
+        unchanged = common.copy()
+        unchanged[common] = np.all(
+            self._coordinates[old_positions[common]] == coordinates[common],
+            axis=1)
+
+        # Positions of the old points that were removed or moved
+        kept = np.zeros(len(self._ids), dtype=bool)
+        kept[old_positions[unchanged]] = True
+        stale_ids = self._ids[~kept]
+        if unchanged.all() and not len(stale_ids):
+            return 0
+
+        neighbours = np.full((len(points), k), MISSING, dtype=np.int32)
+        distances = np.full((len(points), k), np.inf, dtype=np.float64)
+        neighbours[common] = self._neighbours[old_positions[common]]
+        distances[common] = self._distances[old_positions[common]]
+
+        affected = ~unchanged
+        affected |= np.isin(neighbours, stale_ids).any(axis=1)
+        changed = np.flatnonzero(~unchanged)
+        if len(changed):
+            # Rows whose k-th neighbour is farther than a new position (with
+            # a tolerance for the rounding of the distances)
+            kth = distances[:, -1] + 1e-6
+            step = max(1, config.BATCH_BLOCK_SIZE // max(1, len(points)))
+            for start in range(0, len(changed), step):
+                block = changed[start:start + step]
+                values = points.distances(points.latitudes[block],
+                                          points.longitudes[block])
+                affected |= (values <= kth).any(axis=0)
+
+        positions = np.flatnonzero(affected)
+        neighbours[positions], distances[positions] = _compute_rows(
+            points, positions, k, processes)
+
+        self._ids = points.ids
+        self._coordinates = coordinates
+        self._neighbours = neighbours
+        self._distances = distances
+        return len(positions)
+
+
+# Private functions
+def _compute_chunk(positions):
+    """
+    Compute the rows of the given points with the tree of the worker
+
+    :param positions: numpy.ndarray of int - positions of the points
+    :returns: tuple of arrays (neighbour IDs, distances)
+    """
+    return _nearest_rows(_WORKER_STATE['tree'], positions, _WORKER_STATE['k'])
+
+
+def _compute_rows(points, positions, k, processes=None):
+    """
+    Compute the rows of the given points, splitting the work across worker
+    processes
+
+    :param points: instance of :class:`distance.PointArray` sorted by ID
+    :param positions: numpy.ndarray of int - positions of the points
+    :param k: int - number of neighbours per point
+    :param processes: int - number of worker processes
+    :returns: tuple of arrays (neighbour IDs, distances) of shape
+              (len(positions), k)
+    """
+    if k < 1:
+        fstr = "number of neighbours should be positive: {}".format(k)
+        raise GlobeIndexerError(fstr)
+
+    processes = processes or os.cpu_count() or 1
+    chunks = [chunk for chunk in np.array_split(positions, processes * 4)
+              if len(chunk)]
+    if processes == 1 or len(chunks) < 2:
+        tree = KDTree(points)
+        results = [_nearest_rows(tree, chunk, k) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_initialize_worker,
+                                  initargs=(points, k)) as pool:
+            results = pool.map(_compute_chunk, chunks)
+
+    if not results:
+        return (np.empty((0, k), dtype=np.int32),
+                np.empty((0, k), dtype=np.float64))
+    return (np.concatenate([value[0] for value in results]),
+            np.concatenate([value[1] for value in results]))
+
+
+def _initialize_worker(points, k):
+    """
+    Build the tree used by a worker process
+
+    :param points: instance of :class:`distance.PointArray`
+    :param k: int - number of neighbours per point
+    """
+    _WORKER_STATE['tree'] = KDTree(points)
+    _WORKER_STATE['k'] = k
+
+
+def _nearest_rows(tree, positions, k):
+    """
+    Compute the rows of the given points
+
+    :param tree: instance of :class:`spatial.KDTree`
+    :param positions: numpy.ndarray of int - positions of the points
+    :param k: int - number of neighbours per point
+    :returns: tuple of arrays (neighbour IDs, distances)
+    """
+    points = tree.points
+    neighbours = np.full((len(positions), k), MISSING, dtype=np.int32)
+    distances = np.full((len(positions), k), np.inf, dtype=np.float64)
+    results = tree.nearest_many(points.latitudes[positions],
+                                points.longitudes[positions], k=k,
+                                excludes=points.ids[positions].tolist())
+    for row, values in enumerate(results):
+        if values:
+            distances[row, :len(values)], neighbours[row, :len(values)] = \
+                zip(*values)
+    return neighbours, distances
+
+
+def _sort_points(points):
+    """
+    Sort the points by ID
+
+    :param points: instance of :class:`distance.PointArray`
+    :returns: instance of :class:`distance.PointArray`
+    """
+    order = np.argsort(points.ids, kind='stable')
+    return PointArray(points.ids[order], points.latitudes[order],
+                      points.longitudes[order])
@@ -0,0 +1,331 @@
+# Filename: prefix.py
+
+"""
+Globe Indexer Prefix Module
+
+Interface classes:
+    PrefixIndex
+
+Interface functions:
+    write_prefix_index
+"""
+
+# Standard libraries
+import bisect
+import heapq
+import os
+import sys
+import tempfile
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer.disk import (
+    ArrayWriter,
+    StringColumn,
+    StringWriter,
+    open_array,
+)
+from globe_indexer.utils import normalize_name
+
+
+# Constants
+ARRAY_NAMES = ('offsets', 'ids', 'ranks', 'key_positions')
+
+
+# Interface functions
+def write_prefix_index(dpath, chunks):
+    """
+    Write the index to a directory, to be memory mapped by
+    :meth:`PrefixIndex.open`. The (name, ID) pairs of each chunk are sorted
+    and written to a temporary run file, then the runs are merged, so that
+    no more than one chunk of pairs is held in memory.
+
+    :param dpath: string - path to the directory
+    :param chunks: callable returning an iterable of lists of tuple (ID,
+                   names, rank) as given to :meth:`PrefixIndex.load`, sorted
+                   by ID across the lists
+    :returns: int - number of (name, ID) pairs written
+    """
+    os.makedirs(dpath, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=dpath) as tmp_dpath:
+        run_fpaths = list()
+        for rows in chunks():
+            pairs = dict()
+            for value_id, values, rank in rows:
+                for name in values:
+                    key = normalize_name(name)
+                    if key and (key, value_id) not in pairs:
+                        pairs[(key, value_id)] = (rank or 0, name)
+
+            run_fpaths.append(os.path.join(tmp_dpath, str(len(run_fpaths))))
+            with open(run_fpaths[-1], 'w', encoding='utf-8') as fout:
+                for (key, value_id), (rank, name) in sorted(pairs.items()):
+                    fout.write('{}\t{}\t{}\t{}\n'.format(key, value_id, rank,
+                                                        name))
+
+        writers = [ArrayWriter(os.path.join(dpath, name), np.int64)
+                   for name in ARRAY_NAMES]
+        offsets, ids, ranks, key_positions = writers
+        with StringWriter(os.path.join(dpath, 'keys')) as keys, \
+                StringWriter(os.path.join(dpath, 'names')) as names:
+            previous = None
+            for key, value_id, rank, name in heapq.merge(
+                    *[_iter_run(fpath) for fpath in run_fpaths]):
+                if key != previous:
+                    # The name of a key is the one of its lowest ID
+                    offsets.add(ids.count)
+                    keys.add(key)
+                    names.add(name)
+                    previous = key
+                ids.add(value_id)
+                ranks.add(rank)
+                key_positions.add(offsets.count - 1)
+            offsets.add(ids.count)
+        for writer in writers:
+            writer.close()
+    return ids.count
+
+
+# Interface classes
+class PrefixIndex(object):
+    """
+    Sorted array of normalized names (see :func:`utils.normalize_name`) for
+    prefix (type-ahead) lookups.
+
+    Every (name, ID) pair is stored in name order, so the pairs whose name
+    starts with a prefix form one contiguous slice of the arrays, found with
+    two binary searches. An index written by :func:`write_prefix_index` is
+    memory mapped by :meth:`PrefixIndex.open` and cannot be updated.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._keys = list()
+        self._names = list()
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._ranks = np.empty(0, dtype=np.int64)
+        self._key_positions = np.empty(0, dtype=np.int64)
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of indexed (name, ID) pairs
+
+        :returns: int
+        """
+        return len(self._ids)
+
+    def load(self, rows):
+        """
+        (Re)build the index
+
+        :param rows: iterable of tuple (ID, names, rank) where names is an
+                     iterable of string and higher ranks come first
+        """
+        pairs = set()
+        names = dict()
+        ranks = dict()
+        for value_id, values, rank in rows:
+            ranks[value_id] = rank or 0
+            for name in values:
+                key = normalize_name(name)
+                if not key:
+                    continue
+                names.setdefault(key, name)
+                pairs.add((key, value_id))
+
+        keys = list()
+        offsets = [0]
+        ids = list()
+        for key, value_id in sorted(pairs):
+            if not keys or keys[-1] != key:
+                if keys:
+                    offsets.append(len(ids))
+                keys.append(key)
+            ids.append(value_id)
+        offsets.append(len(ids))
+
+        offsets = np.array(offsets if keys else [0], dtype=np.int64)
+        self._keys = keys
+        self._names = [names[key] for key in keys]
+        self._offsets = offsets
+        self._ids = np.array(ids, dtype=np.int64)
+        self._ranks = np.array([ranks[value_id] for value_id in ids],
+                               dtype=np.int64)
+        self._key_positions = np.repeat(np.arange(len(keys), dtype=np.int64),
+                                        np.diff(offsets))
+        self.loaded = True
+
+    def memory_usage(self):
+        """
+        Get the approximate memory held by the index
+
+        :returns: dict with the number of indexed pairs, the total size in
+                  bytes, and the size per indexed pair
+        """
+        size = sys.getsizeof(self._keys) + sys.getsizeof(self._names)
+        size += sum(sys.getsizeof(key) for key in self._keys)
+        size += sum(sys.getsizeof(name) for name in self._names)
+        size += sum(array.nbytes for array in (self._offsets, self._ids,
+                                               self._ranks,
+                                               self._key_positions))
+        return {
+            'names': len(self),
+            'bytes': size,
+            'bytes_per_name': size / len(self) if len(self) else 0.0,
+        }
+
+    def open(self, dpath):
+        """
+        Map an index written by :func:`write_prefix_index`
+
+        :param dpath: string - path to the directory
+        """
+        self._keys = StringColumn(os.path.join(dpath, 'keys'))
+        self._names = StringColumn(os.path.join(dpath, 'names'))
+        self._offsets, self._ids, self._ranks, self._key_positions = [
+            open_array(os.path.join(dpath, name), np.int64)
+            for name in ARRAY_NAMES]
+        self.loaded = True
+
+    def search(self, prefix, limit):
+        """
+        Get the highest ranked IDs whose names start with the prefix (case
+        and accent insensitive). Each ID is returned once, with the first
+        name that matched.
+
+        :param prefix: string
+        :param limit: int - maximum number of results
+        :returns: list of tuple (name, ID)
+        """
+        prefix = normalize_name(prefix)
+        if not prefix or limit < 1:
+            return list()
+
+        lower = bisect.bisect_left(self._keys, prefix)
+        upper = bisect.bisect_left(self._keys, prefix[:-1] +
+                                   chr(ord(prefix[-1]) + 1), lo=lower)
+        start, end = int(self._offsets[lower]), int(self._offsets[upper])
+        if start == end:
+            return list()
+
+        ids = self._ids[start:end]
+        ranks = self._ranks[start:end]
+
+        # A city can match through several of its names, so consider more
+        # candidates than needed before falling back to the whole slice
+        candidates = min(len(ids), limit * 4)
+        while True:
+            if candidates < len(ids):
+                # Keep every candidate tied with the lowest selected rank so
+                # that ties are broken by ID as in a full sort
+                threshold = -np.partition(-ranks, candidates - 1)[
+                    candidates - 1]
+                selected = np.flatnonzero(ranks >= threshold)
+            else:
+                selected = np.arange(len(ids))
+            selected = selected[np.lexsort((ids[selected], -ranks[selected]))]
+
+            results = list()
+            seen = set()
+            for position in selected.tolist():
+                value_id = int(ids[position])
+                if value_id in seen:
+                    continue
+                seen.add(value_id)
+                key_position = self._key_positions[start + position]
+                results.append((self._names[key_position], value_id))
+                if len(results) == limit:
+                    return results
+
+            if candidates >= len(ids):
+                return results
+            candidates = len(ids)
+
+    def update(self, rows, removed):
+        """
+        Update the index in place of rebuilding it, merging the new pairs
+        into the sorted arrays
+
+        :param rows: list of tuple (ID, names, rank) to add, replacing the
+                     pairs of the same IDs
+        :param removed: list of tuple (ID, names, rank) whose pairs are
+                        removed
+        """
+        dropped = [row[0] for row in removed] + [row[0] for row in rows]
+        kept = ~np.isin(self._ids, dropped)
+
+        pairs = set()
+        names = dict()
+        for value_id, values, rank in rows:
+            for name in values:
+                key = normalize_name(name)
+                if key:
+                    names.setdefault(key, name)
+                    pairs.add((key, value_id, rank or 0))
+
+        # Position of the keys once the new ones are inserted
+        inserted = list()
+        for key in sorted(names):
+            position = bisect.bisect_left(self._keys, key)
+            if position == len(self._keys) or self._keys[position] != key:
+                inserted.append((position, key))
+        insert_positions = np.array([value[0] for value in inserted],
+                                    dtype=np.int64)
+        old_positions = np.arange(len(self._keys), dtype=np.int64) + \
+            np.searchsorted(insert_positions, np.arange(len(self._keys)),
+                            side='right')
+        keys = [None] * (len(self._keys) + len(inserted))
+        key_names = [None] * len(keys)
+        for position, key, name in zip(old_positions.tolist(), self._keys,
+                                       self._names):
+            keys[position], key_names[position] = key, name
+        for index, (position, key) in enumerate(inserted):
+            keys[position + index], key_names[position + index] = \
+                key, names[key]
+        key_positions = {key: position for position, key in enumerate(keys)
+                         if key in names}
+
+        pairs = sorted(pairs)
+        positions = np.concatenate((
+            old_positions[self._key_positions[kept]],
+            np.array([key_positions[key] for key, _, _ in pairs],
+                     dtype=np.int64)))
+        ids = np.concatenate((self._ids[kept], np.array(
+            [value_id for _, value_id, _ in pairs], dtype=np.int64)))
+        ranks = np.concatenate((self._ranks[kept], np.array(
+            [rank for _, _, rank in pairs], dtype=np.int64)))
+        order = np.lexsort((ids, positions))
+        positions, ids, ranks = positions[order], ids[order], ranks[order]
+
+        # Drop the keys left without any pair
+        counts = np.bincount(positions, minlength=len(keys))
+        used = counts > 0
+        positions = (np.cumsum(used) - 1)[positions]
+        self._keys = [key for key, value in zip(keys, used.tolist()) if value]
+        self._names = [name for name, value in zip(key_names, used.tolist())
+                       if value]
+        self._offsets = np.concatenate(([0], np.cumsum(counts[used]))).astype(
+            np.int64)
+        self._ids = ids
+        self._ranks = ranks
+        self._key_positions = positions
+        self.loaded = True
+
+
+# Private functions
+def _iter_run(fpath):
+    """
+    Read the pairs of a run file written by :func:`write_prefix_index`
+
+    :param fpath: string - path to the run file
+    :returns: generator of tuple (key, ID, rank, name)
+    """
+    with open(fpath, encoding='utf-8') as fin:
+        for line in fin:
+            key, value_id, rank, name = line.rstrip('\n').split('\t')
+            yield key, int(value_id), int(rank), name
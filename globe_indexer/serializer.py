@@ -0,0 +1,166 @@
+# Filename: serializer.py
+
+"""
+Globe Indexer Serializer Module
+
+Compact JSON encoding for the API responses. The orjson package is used as
+the encoder when it is installed.
+
+Interface classes:
+    FragmentStore
+
+Interface functions:
+    dumps
+    dumps_object
+    json_response
+"""
+
+# Standard libraries
+import json
+
+# Flask
+import flask
+
+# orjson (optional)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Constants
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+# Interface functions
+def dumps(value):
+    """
+    Encode the value as compact JSON, keeping non ASCII characters as is
+
+    :param value: JSON serializable value
+    :returns: string
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps_object(values, **fragments):
+    """
+    Encode a JSON object from regular values and from already encoded JSON
+    fragments
+
+    :param values: dict of JSON serializable values
+    :param fragments: dict of string - encoded JSON values
+    :returns: string
+    """
+    parts = list()
+    if values:
+        parts.append(dumps(values)[1:-1])
+    for key, fragment in fragments.items():
+        parts.append('{}:{}'.format(dumps(key), fragment))
+    return '{' + ','.join(parts) + '}'
+
+
+def json_response(body, status=200):
+    """
+    Create a response out of an encoded JSON body
+
+    :param body: string
+    :param status: int or http.HTTPStatus member
+    :returns: Flask response
+    """
+    app = flask.current_app
+    mimetype = app.config.get('JSONIFY_MIMETYPE', 'application/json')
+    return app.response_class(body, status=status, mimetype=mimetype)
+
+
+# Interface classes
+class FragmentStore(object):
+    """
+    Resident store of encoded JSON fragments keyed by ID, so that responses
+    can be assembled without querying and encoding every value again.
+
+    The values can be looked up and encoded on demand instead (see
+    :meth:`FragmentStore.open`), in which case the store cannot be updated.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._fragments = dict()
+        self._lookup = None
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of fragments
+
+        :returns: int
+        """
+        return len(self._fragments)
+
+    def load(self, rows):
+        """
+        (Re)build the store
+
+        :param rows: iterable of tuple (ID, JSON serializable value)
+        """
+        self._fragments = {value_id: dumps(value) for value_id, value in rows}
+        self._lookup = None
+        self.loaded = True
+
+    def get(self, value_id):
+        """
+        Get the fragment of the given ID
+
+        :param value_id: int
+        :returns: string or None if there is no fragment for the ID
+        """
+        if self._lookup is not None:
+            values = self.select([value_id])
+            return values[0][1] if values else None
+        return self._fragments.get(value_id)
+
+    def open(self, lookup):
+        """
+        Encode the values looked up on demand (e.g. from a memory mapped
+        snapshot) in place of holding the fragments
+
+        :param lookup: callable taking a list of IDs and returning a list of
+                       tuple (ID, JSON serializable value) in the same order,
+                       skipping the IDs that cannot be found
+        """
+        self._fragments = dict()
+        self._lookup = lookup
+        self.loaded = True
+
+    def select(self, value_ids):
+        """
+        Get the fragments of the given IDs
+
+        :param value_ids: iterable of int
+        :returns: list of tuple (ID, fragment) in the same order as the IDs.
+                  IDs without a fragment are skipped.
+        """
+        if self._lookup is not None:
+            return [(value_id, dumps(value))
+                    for value_id, value in self._lookup(list(value_ids))]
+        fragments = self._fragments
+        return [(value_id, fragments[value_id]) for value_id in value_ids
+                if value_id in fragments]
+
+    def update(self, rows, removed):
+        """
+        Update the store in place of rebuilding it
+
+        :param rows: iterable of tuple (ID, JSON serializable value) to add,
+                     replacing the fragments with the same IDs
+        :param removed: iterable of tuple (ID, value) of the fragments to
+                        remove
+        """
+        for value_id, _ in removed:
+            self._fragments.pop(value_id, None)
+        self._fragments.update((value_id, dumps(value))
+                               for value_id, value in rows)
+        self.loaded = True
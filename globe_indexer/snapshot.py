@@ -0,0 +1,300 @@
+# Filename: snapshot.py
+
+"""
+Globe Indexer Snapshot Module
+
+Binary columnar snapshot of the cities, written once after the data is
+imported and memory mapped by every process, so that the pages of the file
+are shared through the page cache.
+
+The file starts with a magic string and the length of a JSON header
+describing the columns, followed by the columns themselves (aligned). Numeric
+columns are plain little endian arrays. String columns are stored as a heap
+of UTF-8 bytes and an array of offsets into it.
+
+Interface classes:
+    Row
+    Snapshot
+
+Interface functions:
+    write_snapshot
+"""
+
+# Standard libraries
+import collections
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer.disk import ArrayWriter, StringWriter
+from globe_indexer.error import GlobeIndexerError
+
+
+# Constants
+ALIGNMENT = 64
+FIELDS = ('id', 'name', 'ascii_name', 'alternate_names', 'latitude',
+          'longitude', 'country_code', 'cc2', 'population')
+MAGIC = b'GISNAP01'
+MISSING_INT = -1
+NUMERIC_COLUMNS = {
+    'id': '<i8',
+    'latitude': '<f8',
+    'longitude': '<f8',
+    'population': '<i8',
+}
+STRING_COLUMNS = ('name', 'ascii_name', 'alternate_names', 'country_code',
+                  'cc2')
+VERSION = 1
+
+
+# Interface functions
+def write_snapshot(fpath, rows):
+    """
+    Write a snapshot of the rows. The columns are first written to temporary
+    files next to the snapshot, so that only one row is held in memory, and
+    then copied into the snapshot. The file is written under a temporary
+    name and renamed once complete, so that readers never open a partial
+    file.
+
+    :param fpath: string - path to the snapshot file
+    :param rows: iterable of tuple with the values of :data:`FIELDS`, sorted
+                 by ID
+    :returns: int - number of rows written
+    """
+    dpath = os.path.dirname(os.path.abspath(fpath))
+    with tempfile.TemporaryDirectory(dir=dpath) as tmp_dpath:
+        numbers = {name: ArrayWriter(os.path.join(tmp_dpath, name), dtype)
+                   for name, dtype in NUMERIC_COLUMNS.items()}
+        strings = {name: StringWriter(os.path.join(tmp_dpath, name))
+                   for name in STRING_COLUMNS}
+
+        previous_id = None
+        for row in rows:
+            values = dict(zip(FIELDS, row))
+            if previous_id is not None and values['id'] <= previous_id:
+                fstr = "rows should be sorted by ID: {}".format(values['id'])
+                raise GlobeIndexerError(fstr)
+            previous_id = values['id']
+
+            for name, column in numbers.items():
+                value = values[name]
+                column.add(MISSING_INT if value is None else value)
+            for name, column in strings.items():
+                column.add(values[name] or '')
+        for column in list(numbers.values()) + list(strings.values()):
+            column.close()
+
+        columns = list()
+        for name, dtype in sorted(NUMERIC_COLUMNS.items()):
+            columns.append((name, dtype, os.path.join(tmp_dpath, name)))
+        for name in STRING_COLUMNS:
+            for suffix, dtype in (('.offsets', '<i8'), ('.heap', '|u1')):
+                columns.append((name + suffix, dtype,
+                                os.path.join(tmp_dpath, name + suffix)))
+
+        count = numbers['id'].count
+        header = {'version': VERSION, 'count': count, 'columns': dict()}
+        # Encode the header with placeholder offsets at least as long as the
+        # actual ones, so that the position of the first column is known
+        for name, dtype, column_fpath in columns:
+            header['columns'][name] = [dtype, 10 ** 15,
+                                       os.path.getsize(column_fpath)]
+        header_size = len(_encode_header(header, 0))
+        position = _align(len(MAGIC) + 8 + header_size)
+        for name, dtype, column_fpath in columns:
+            size = os.path.getsize(column_fpath)
+            header['columns'][name] = [dtype, position, size]
+            position = _align(position + size)
+
+        tmp_fpath = fpath + '.tmp'
+        with open(tmp_fpath, 'wb') as fout:
+            encoded = _encode_header(header, header_size)
+            fout.write(MAGIC + struct.pack('<Q', len(encoded)) + encoded)
+            for name, _, column_fpath in columns:
+                fout.seek(header['columns'][name][1])
+                with open(column_fpath, 'rb') as fin:
+                    shutil.copyfileobj(fin, fout)
+            fout.truncate(position)
+        os.replace(tmp_fpath, fpath)
+    return count
+
+
+# Interface classes
+Row = collections.namedtuple('Row', FIELDS)
+
+
+class Snapshot(object):
+    """
+    Read only, memory mapped view of a snapshot file
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.fpath = None
+        self._mmap = None
+        self._columns = dict()
+        self._count = 0
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of rows
+
+        :returns: int
+        """
+        return self._count
+
+    def close(self):
+        """
+        Release the mapping of the file
+        """
+        self._columns = dict()
+        self._count = 0
+        self.loaded = False
+        if self._mmap is not None:
+            mapping, self._mmap = self._mmap, None
+            try:
+                mapping.close()
+            except BufferError:
+                # Arrays handed out are still referring to the mapping, which
+                # is released along with them
+                pass
+
+    def column(self, name):
+        """
+        Get a numeric column
+
+        :param name: string - one of :data:`NUMERIC_COLUMNS`
+        :returns: read only numpy.ndarray
+        """
+        return self._columns[name]
+
+    def open(self, fpath):
+        """
+        Map the snapshot file
+
+        :param fpath: string - path to the snapshot file
+        """
+        with open(fpath, 'rb') as fin:
+            mapping = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start = len(MAGIC) + 8
+        if mapping[:len(MAGIC)] != MAGIC:
+            mapping.close()
+            fstr = "not a snapshot file: {}".format(fpath)
+            raise GlobeIndexerError(fstr)
+        size = struct.unpack('<Q', mapping[len(MAGIC):start])[0]
+        header = json.loads(mapping[start:start + size].decode('utf-8'))
+        if header['version'] != VERSION:
+            mapping.close()
+            fstr = "unsupported snapshot version: {}".format(
+                header['version'])
+            raise GlobeIndexerError(fstr)
+
+        self.close()
+        self._columns = {
+            name: np.frombuffer(mapping, dtype=dtype,
+                                count=length // np.dtype(dtype).itemsize,
+                                offset=offset)
+            for name, (dtype, offset, length) in header['columns'].items()
+        }
+        self._mmap = mapping
+        self._count = header['count']
+        self.fpath = fpath
+        self.loaded = True
+
+    def position(self, value_id):
+        """
+        Get the position of the row with the given ID
+
+        :param value_id: int
+        :returns: int or None if there is no such row
+        """
+        ids = self._columns['id']
+        position = int(np.searchsorted(ids, value_id))
+        if position < len(ids) and ids[position] == value_id:
+            return position
+        return None
+
+    def rows(self, start=0, end=None):
+        """
+        Get the rows of the snapshot, or of a range of it
+
+        :param start: int - position of the first row
+        :param end: int - position after the last row. Defaults to the
+                    number of rows.
+        :returns: iterator of :class:`Row`, with None for missing values
+        """
+        columns = dict()
+        for name in NUMERIC_COLUMNS:
+            columns[name] = self._columns[name][start:end].tolist()
+        columns['population'] = [None if value == MISSING_INT else value
+                                 for value in columns['population']]
+        for name in STRING_COLUMNS:
+            columns[name] = [value or None
+                             for value in self.strings(name, start, end)]
+        return (Row(*values)
+                for values in zip(*[columns[name] for name in FIELDS]))
+
+    def string(self, name, position):
+        """
+        Get a value of a string column
+
+        :param name: string - one of :data:`STRING_COLUMNS`
+        :param position: int - position of the row
+        :returns: string
+        """
+        offsets = self._columns[name + '.offsets']
+        start, end = int(offsets[position]), int(offsets[position + 1])
+        return self._columns[name + '.heap'][start:end].tobytes().decode(
+            'utf-8')
+
+    def strings(self, name, start=0, end=None):
+        """
+        Get the values of a string column, or of a range of it
+
+        :param name: string - one of :data:`STRING_COLUMNS`
+        :param start: int - position of the first row
+        :param end: int - position after the last row. Defaults to the
+                    number of rows.
+        :returns: generator of string
+        """
+        end = self._count if end is None else min(end, self._count)
+        offsets = self._columns[name + '.offsets'][start:end + 1].tolist()
+        if not offsets:
+            return iter(())
+        base = offsets[0]
+        heap = self._columns[name + '.heap'][base:offsets[-1]].tobytes()
+        return (heap[lower - base:upper - base].decode('utf-8')
+                for lower, upper in zip(offsets, offsets[1:]))
+
+
+# Private functions
+def _align(position):
+    """
+    Round the position up to the alignment of the columns
+
+    :param position: int
+    :returns: int
+    """
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _encode_header(header, size):
+    """
+    Encode the header, padded with spaces to the given size
+
+    :param header: dict
+    :param size: int - minimum size in bytes
+    :returns: bytes
+    """
+    encoded = json.dumps(header, sort_keys=True).encode('utf-8')
+    return encoded.ljust(size, b' ') if size >= len(encoded) else encoded
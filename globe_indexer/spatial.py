@@ -0,0 +1,568 @@
+# Filename: spatial.py
+
+"""
+Globe Indexer Spatial Module
+
+Interface classes:
+    Grid
+    GridTree
+    KDTree
+
+Interface functions:
+    chord_to_distance
+    to_cartesian
+    write_grid
+"""
+
+# Standard libraries
+import heapq
+import json
+import math
+import os
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer import config
+from globe_indexer.disk import (
+    ArrayWriter,
+    Groups,
+    StringColumn,
+    StringWriter,
+    open_array,
+    write_groups,
+)
+from globe_indexer.distance import PointArray, bounding_box
+
+
+# Constants
+LEAF = -1
+POINT_FIELDS = {'ids': np.int64, 'latitudes': np.float64,
+                'longitudes': np.float64}
+
+
+# Interface functions
+def chord_to_distance(squared_chord):
+    """
+    Convert the squared chord length between two points on the unit sphere
+    into the great circle distance on the earth (in kilometers). This gives
+    the same value as the Haversine formula.
+
+    :param squared_chord: float
+    :returns: float
+    """
+    half_chord = min(1.0, math.sqrt(squared_chord) / 2)
+    return 2 * math.asin(half_chord) * config.EARTH_RADIUS
+
+
+def to_cartesian(latitude, longitude):
+    """
+    Project a coordinate (specified in decimal degrees) onto the unit sphere
+
+    :param latitude: float
+    :param longitude: float
+    :returns: tuple of three floats (x, y, z)
+    """
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)
+
+
+def write_grid(dpath, chunks, cell_size=config.SCALE_GRID_CELL_SIZE):
+    """
+    Write the points to a directory, to be memory mapped by :class:`Grid`,
+    without holding more than one chunk of points in memory. As in the
+    resident spatial index, a point belongs to the partition of all points,
+    to the partition of its country code and to the partitions of its
+    alternate country codes.
+
+    :param dpath: string - path to the directory
+    :param chunks: callable returning an iterable of lists of tuple (ID,
+                   latitude, longitude, country code, alternate country
+                   codes separated by comma or None), sorted by ID across the
+                   lists. It's called three times.
+    :param cell_size: float - size of the cells (in degrees)
+    :returns: int - number of points written
+    """
+    os.makedirs(dpath, exist_ok=True)
+    codes = set()
+    with ArrayWriter(os.path.join(dpath, 'ids'), np.int64) as ids, \
+            ArrayWriter(os.path.join(dpath, 'latitudes'),
+                        np.float64) as latitudes, \
+            ArrayWriter(os.path.join(dpath, 'longitudes'),
+                        np.float64) as longitudes, \
+            StringWriter(os.path.join(dpath, 'country_codes')) as \
+            country_codes, \
+            ArrayWriter(os.path.join(dpath, 'alternate_ids'),
+                        np.int64) as alternate_ids, \
+            StringWriter(os.path.join(dpath, 'alternate_codes')) as \
+            alternate_codes:
+        for rows in chunks():
+            for geoname_id, latitude, longitude, country_code, cc2 in rows:
+                ids.add(geoname_id)
+                latitudes.add(latitude)
+                longitudes.add(longitude)
+                country_codes.add(country_code or '')
+                row_codes = _alternate_codes(country_code, cc2)
+                if row_codes:
+                    alternate_ids.add(geoname_id)
+                    alternate_codes.add(','.join(sorted(row_codes)))
+                if country_code:
+                    codes.add(country_code)
+                codes.update(row_codes)
+
+    codes = sorted(codes)
+    with open(os.path.join(dpath, 'grid.json'), 'w') as fout:
+        json.dump({'cell_size': cell_size, 'codes': codes}, fout)
+    grid = Grid(dpath, partitions=False)
+    partitions = {code: position for position, code in enumerate(codes, 1)}
+
+    def entries():
+        for rows in chunks():
+            values = list()
+            for geoname_id, latitude, longitude, country_code, cc2 in rows:
+                row_codes = _alternate_codes(country_code, cc2)
+                if country_code:
+                    row_codes.add(country_code)
+                values.append((0, geoname_id, latitude, longitude))
+                values.extend((partitions[code], geoname_id, latitude,
+                               longitude) for code in row_codes)
+            columns = [np.array(column) for column in zip(*values)] or \
+                [np.empty(0)] * 4
+            keys = columns[0].astype(np.int64) * grid.cell_count + \
+                grid.cells(columns[2], columns[3])
+            yield keys, dict(zip(('ids', 'latitudes', 'longitudes'),
+                                 columns[1:]))
+
+    write_groups(os.path.join(dpath, 'points'), entries, POINT_FIELDS)
+    return ids.count
+
+
+# Interface classes
+class Grid(object):
+    """
+    Read only, memory mapped grid of points written by :func:`write_grid`.
+    The points are grouped by partition and then by cell (row by row), so
+    the points of a partition are contiguous, and so are the points of the
+    consecutive cells of a row.
+    """
+    def __init__(self, dpath, partitions=True):
+        """
+        Constructor
+
+        :param dpath: string - path to the directory
+        :param partitions: boolean - whether to map the points of the
+                           partitions, which are written last
+        """
+        with open(os.path.join(dpath, 'grid.json')) as fin:
+            header = json.load(fin)
+        self.cell_size = header['cell_size']
+        self.codes = header['codes']
+        self.rows = int(math.ceil(180 / self.cell_size))
+        self.columns = int(math.ceil(360 / self.cell_size))
+        self.cell_count = self.rows * self.columns
+        self.points = None
+        if partitions:
+            self.points = Groups(os.path.join(dpath, 'points'),
+                                 POINT_FIELDS)
+
+        self.locations = _Locations(dpath)
+        alternate_codes = StringColumn(os.path.join(dpath, 'alternate_codes'))
+        self.alternate_codes = {
+            geoname_id: frozenset(value.split(','))
+            for geoname_id, value in zip(
+                open_array(os.path.join(dpath, 'alternate_ids'),
+                           np.int64).tolist(),
+                alternate_codes.slice(0, len(alternate_codes)))
+        }
+
+    def cells(self, latitudes, longitudes):
+        """
+        Get the cells of coordinates
+
+        :param latitudes: 1D array of float
+        :param longitudes: 1D array of float
+        :returns: numpy.ndarray of int
+        """
+        return self.row(latitudes) * self.columns + self.column(longitudes)
+
+    def column(self, longitudes):
+        """
+        Get the columns of the grid holding longitudes
+
+        :param longitudes: float or array of float
+        :returns: int or numpy.ndarray of int
+        """
+        values = np.floor((np.asarray(longitudes, dtype=np.float64) + 180) /
+                          self.cell_size)
+        return np.clip(values, 0, self.columns - 1).astype(np.int64)
+
+    def row(self, latitudes):
+        """
+        Get the rows of the grid holding latitudes
+
+        :param latitudes: float or array of float
+        :returns: int or numpy.ndarray of int
+        """
+        values = np.floor((np.asarray(latitudes, dtype=np.float64) + 90) /
+                          self.cell_size)
+        return np.clip(values, 0, self.rows - 1).astype(np.int64)
+
+    def trees(self):
+        """
+        Get the partitions of the grid
+
+        :returns: dict - country code (None for all points) to instance of
+                  :class:`GridTree`
+        """
+        return {code: GridTree(self, partition)
+                for partition, code in enumerate([None] + self.codes)}
+
+
+class GridTree(object):
+    """
+    Partition of a :class:`Grid`, searched like a :class:`KDTree`: the cells
+    within a radius of the coordinate are scanned, the radius growing until
+    enough points are found.
+    """
+    def __init__(self, grid, partition):
+        """
+        Constructor
+
+        :param grid: instance of :class:`Grid`
+        :param partition: int - position of the partition
+        """
+        self._grid = grid
+        self._base = partition * grid.cell_count
+        self._start, self._end = grid.points.bounds(
+            self._base, self._base + grid.cell_count)
+
+    def __len__(self):
+        """
+        Get the number of points held by the partition
+
+        :returns: int
+        """
+        return self._end - self._start
+
+    @property
+    def points(self):
+        """
+        Get the points of the partition
+
+        :returns: instance of :class:`distance.PointArray`
+        """
+        return self._points(self._start, self._end)
+
+    def nearest(self, latitude, longitude, k=None, exclude=None):
+        """
+        Get the points closest to the specified coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param k: int - number of points to return. Return all points when
+                  it's not specified.
+        :param exclude: ID of a point that should not be part of the results
+        :returns: a sorted list of tuple (distance in kilometers, ID)
+        """
+        if k is None or k >= len(self):
+            return self.points.nearest(latitude, longitude, k=k,
+                                       exclude=exclude)
+        if k < 1:
+            return list()
+
+        # Radius of a cap holding k points if they were evenly spread
+        radius = 2 * config.EARTH_RADIUS * math.sqrt(k / len(self))
+        while True:
+            results = self._within(latitude, longitude, radius, exclude)
+            if len(results) >= k or radius >= math.pi * config.EARTH_RADIUS:
+                return results[:k]
+            radius *= 2
+
+    def nearest_many(self, latitudes, longitudes, k=None, excludes=None):
+        """
+        Get the points closest to each of the specified coordinates
+
+        :param latitudes: 1D array of float - latitude of the origins
+        :param longitudes: 1D array of float - longitude of the origins
+        :param k: int - number of points to return per origin. Return all
+                  points when it's not specified.
+        :param excludes: iterable of point ID (or None) to be left out of the
+                         results of the origin at the same position
+        :returns: list with a sorted list of tuple (distance, ID) per origin
+        """
+        if k is None or k >= len(self):
+            return self.points.nearest_many(latitudes, longitudes, k=k,
+                                            excludes=excludes)
+        if excludes is None:
+            excludes = [None] * len(latitudes)
+        return [self.nearest(latitude, longitude, k=k, exclude=exclude)
+                for latitude, longitude, exclude in zip(
+                    np.asarray(latitudes, dtype=np.float64).tolist(),
+                    np.asarray(longitudes, dtype=np.float64).tolist(),
+                    excludes)]
+
+    def _points(self, start, end):
+        """
+        Get the points between two positions of the grid
+
+        :param start: int
+        :param end: int - excluded
+        :returns: instance of :class:`distance.PointArray`
+        """
+        fields = self._grid.points.fields
+        return PointArray(fields['ids'][start:end],
+                          fields['latitudes'][start:end],
+                          fields['longitudes'][start:end])
+
+    def _within(self, latitude, longitude, radius, exclude):
+        """
+        Get the points of the partition within the radius of a coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param radius: float - in kilometers
+        :param exclude: ID of a point that should not be part of the results
+        :returns: a sorted list of tuple (distance, ID)
+        """
+        grid = self._grid
+        min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude,
+                                                    radius)
+        rows = np.arange(grid.row(min_lat), grid.row(max_lat) + 1)
+        lowers = list()
+        uppers = list()
+        for lower, upper in lon_ranges:
+            keys = self._base + rows * grid.columns
+            lowers.append(keys + grid.column(lower))
+            uppers.append(keys + grid.column(upper) + 1)
+
+        # Consecutive cells of a row are one slice of the grid
+        points = grid.points
+        starts = points.offsets[np.searchsorted(points.keys,
+                                                np.concatenate(lowers))]
+        ends = points.offsets[np.searchsorted(points.keys,
+                                              np.concatenate(uppers))]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths,
+                              lengths) + np.arange(int(lengths.sum()))
+        fields = points.fields
+        candidates = PointArray(fields['ids'][positions],
+                                fields['latitudes'][positions],
+                                fields['longitudes'][positions])
+        return candidates.within(latitude, longitude, radius,
+                                 exclude=exclude)
+
+
+class KDTree(object):
+    """
+    K-dimensional tree over the 3D (unit sphere) projection of coordinates.
+
+    Euclidean (chord) distances between points on the unit sphere preserve
+    the ordering of great circle distances, so the k nearest points by chord
+    are also the k nearest cities on the globe.
+    """
+    def __init__(self, points, leaf_size=config.SPATIAL_LEAF_SIZE):
+        """
+        Constructor
+
+        :param points: instance of :class:`distance.PointArray` or iterable of
+                       tuple (ID, latitude, longitude)
+        :param leaf_size: int - maximum number of points held by a leaf
+        """
+        if not isinstance(points, PointArray):
+            points = PointArray.from_rows(points)
+        self.points = points
+
+        lat, lon = np.radians(points.latitudes), np.radians(points.longitudes)
+        coords = np.column_stack((np.cos(lat) * np.cos(lon),
+                                  np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+        self._leaf_size = max(1, leaf_size)
+        order = np.arange(len(points))
+        self._root = self._build(coords, order, 0, len(order))
+
+        # Plain lists are faster than arrays for the scalar operations
+        # performed while traversing the tree
+        self._order = order.tolist()
+        self._ids = points.ids.tolist()
+        self._coords = [tuple(value) for value in coords.tolist()]
+
+    def __len__(self):
+        """
+        Get the number of points held by the tree
+
+        :returns: int
+        """
+        return len(self.points)
+
+    def _build(self, coords, order, start, end):
+        """
+        Recursively partition the points between start and end (exclusive)
+        of the ordering along the axis with the largest spread
+
+        :param coords: numpy.ndarray of shape (N, 3)
+        :param order: numpy.ndarray - permutation of the points
+        :param start: int
+        :param end: int
+        :returns: tuple representing the node
+        """
+        if end - start <= self._leaf_size:
+            return LEAF, start, end
+
+        chunk = order[start:end]
+        values = coords[chunk]
+        axis = int(np.argmax(values.max(axis=0) - values.min(axis=0)))
+
+        middle = (end - start) // 2
+        order[start:end] = chunk[np.argpartition(values[:, axis], middle)]
+
+        middle += start
+        split = float(coords[order[middle], axis])
+        return (axis, split, self._build(coords, order, start, middle),
+                self._build(coords, order, middle, end))
+
+    def _search(self, node, point, k, heap, exclude):
+        """
+        Visit the node and update the heap of the best candidates found so far
+
+        :param node: tuple representing the node
+        :param point: tuple of three floats (x, y, z)
+        :param k: int
+        :param heap: list - max heap of (-squared chord, -ID, ID)
+        :param exclude: ID to be left out of the results
+        """
+        if node[0] == LEAF:
+            x_pos, y_pos, z_pos = point
+            for index in self._order[node[1]:node[2]]:
+                point_id = self._ids[index]
+                if point_id == exclude:
+                    continue
+                x_other, y_other, z_other = self._coords[index]
+                squared = ((x_pos - x_other) ** 2 + (y_pos - y_other) ** 2 +
+                           (z_pos - z_other) ** 2)
+                entry = (-squared, -point_id, point_id)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            return
+
+        axis, split, left, right = node
+        diff = point[axis] - split
+        near, far = (left, right) if diff < 0 else (right, left)
+        self._search(near, point, k, heap, exclude)
+        if len(heap) < k or diff * diff <= -heap[0][0]:
+            self._search(far, point, k, heap, exclude)
+
+    def nearest(self, latitude, longitude, k=None, exclude=None):
+        """
+        Get the points closest to the specified coordinate
+
+        :param latitude: float
+        :param longitude: float
+        :param k: int - number of points to return. Return all points when
+                  it's not specified.
+        :param exclude: ID of a point that should not be part of the results
+        :returns: a sorted list where each element is a tuple of float and the
+                  ID of the point. The float value is the distance (in
+                  kilometers) from the specified coordinate.
+        """
+        if k is None or k >= len(self._ids):
+            return self.points.nearest(latitude, longitude, k=k,
+                                       exclude=exclude)
+        if k < 1:
+            return list()
+
+        heap = list()
+        self._search(self._root, to_cartesian(latitude, longitude), k, heap,
+                     exclude)
+        squared_chords = [(-entry[0], entry[2]) for entry in heap]
+        return sorted((chord_to_distance(squared), point_id)
+                      for squared, point_id in squared_chords)
+
+    def nearest_many(self, latitudes, longitudes, k=None, excludes=None):
+        """
+        Get the points closest to each of the specified coordinates. Small
+        sets of points are scanned with vectorized distances for blocks of
+        origins (see :meth:`distance.PointArray.nearest_many`), larger ones
+        are searched through the tree with the origins projected at once.
+
+        :param latitudes: 1D array of float - latitude of the origins
+        :param longitudes: 1D array of float - longitude of the origins
+        :param k: int - number of points to return per origin. Return all
+                  points when it's not specified.
+        :param excludes: iterable of point ID (or None) to be left out of the
+                         results of the origin at the same position
+        :returns: list with a sorted list of tuple (distance, ID) per origin
+        """
+        if k is None or k >= len(self._ids) or \
+                len(self._ids) <= config.BATCH_SCAN_SIZE:
+            return self.points.nearest_many(latitudes, longitudes, k=k,
+                                            excludes=excludes)
+
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+        coords = np.column_stack((np.cos(lat) * np.cos(lon),
+                                  np.cos(lat) * np.sin(lon), np.sin(lat)))
+        if excludes is None:
+            excludes = [None] * len(coords)
+
+        results = list()
+        for point, exclude in zip(coords.tolist(), excludes):
+            if k < 1:
+                results.append(list())
+                continue
+            heap = list()
+            self._search(self._root, point, k, heap, exclude)
+            results.append(sorted((chord_to_distance(-entry[0]), entry[2])
+                                  for entry in heap))
+        return results
+
+
+# Private functions
+def _alternate_codes(country_code, cc2):
+    """
+    Get the alternate country codes of a point other than its country code
+
+    :param country_code: string
+    :param cc2: string - codes separated by comma, or None
+    :returns: set of string
+    """
+    return {code for code in (cc2 or '').split(',')
+            if code and code != country_code}
+
+
+# Private classes
+class _Locations(object):
+    """
+    Memory mapped locations of the points of a grid, looked up like the
+    dictionary of the location of each ID
+    """
+    def __init__(self, dpath):
+        """
+        Constructor
+
+        :param dpath: string - path to the directory of the grid
+        """
+        self._ids = open_array(os.path.join(dpath, 'ids'), np.int64)
+        self._latitudes = open_array(os.path.join(dpath, 'latitudes'),
+                                     np.float64)
+        self._longitudes = open_array(os.path.join(dpath, 'longitudes'),
+                                      np.float64)
+        self._country_codes = StringColumn(os.path.join(dpath,
+                                                        'country_codes'))
+
+    def __getitem__(self, geoname_id):
+        """
+        Get the location of a point
+
+        :param geoname_id: int
+        :returns: tuple of (latitude, longitude, country code)
+        """
+        position = int(np.searchsorted(self._ids, geoname_id))
+        if position == len(self._ids) or self._ids[position] != geoname_id:
+            raise KeyError(geoname_id)
+        return (float(self._latitudes[position]),
+                float(self._longitudes[position]),
+                self._country_codes[position] or None)
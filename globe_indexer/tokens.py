@@ -0,0 +1,150 @@
+# Filename: tokens.py
+
+"""
+Globe Indexer Tokens Module
+
+Interface classes:
+    TokenIndex
+"""
+
+# Standard libraries
+import bisect
+import collections
+import os
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer.disk import StringColumn, open_array
+from globe_indexer.utils import normalize_name
+
+
+# Interface classes
+class TokenIndex(object):
+    """
+    Hash index from normalized names (see :func:`utils.normalize_name`) to
+    the IDs of the values having that name, e.g. "bombay" or "muenchen".
+
+    The sorted names of a prefix index written by
+    :func:`prefix.write_prefix_index` hold the same mapping, so they are
+    memory mapped by :meth:`TokenIndex.open` rather than written twice.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._ids = dict()
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of distinct normalized names
+
+        :returns: int
+        """
+        return len(self._ids)
+
+    def load(self, rows):
+        """
+        (Re)build the index
+
+        :param rows: iterable of tuple (ID, names) where names is an iterable
+                     of string
+        """
+        tokens = collections.defaultdict(set)
+        for value_id, names in rows:
+            for name in names:
+                token = normalize_name(name)
+                if token:
+                    tokens[token].add(value_id)
+
+        self._ids = {token: tuple(sorted(ids)) for token, ids in tokens.items()}
+        self.loaded = True
+
+    def open(self, dpath):
+        """
+        Map the names of a prefix index written by
+        :func:`prefix.write_prefix_index`
+
+        :param dpath: string - path to the directory of the prefix index
+        """
+        self._ids = _SortedTokens(dpath)
+        self.loaded = True
+
+    def search(self, name):
+        """
+        Get the IDs of the values having the name once normalized
+
+        :param name: string
+        :returns: tuple of int sorted by ID
+        """
+        return self._ids.get(normalize_name(name), tuple())
+
+    def update(self, rows, removed):
+        """
+        Update the index in place of rebuilding it
+
+        :param rows: iterable of tuple (ID, names) to add
+        :param removed: iterable of tuple (ID, names) of the values to
+                        remove, with the names they were added with
+        """
+        changes = collections.defaultdict(lambda: (set(), set()))
+        for value_id, names in removed:
+            for name in names:
+                token = normalize_name(name)
+                if token:
+                    changes[token][1].add(value_id)
+        for value_id, names in rows:
+            for name in names:
+                token = normalize_name(name)
+                if token:
+                    changes[token][0].add(value_id)
+
+        for token, (added, dropped) in changes.items():
+            ids = set(self._ids.get(token, ())).difference(dropped)
+            ids.update(added)
+            if ids:
+                self._ids[token] = tuple(sorted(ids))
+            else:
+                self._ids.pop(token, None)
+        self.loaded = True
+
+
+# Private classes
+class _SortedTokens(object):
+    """
+    Memory mapped names of a prefix index, looked up like the dictionary of
+    the IDs of each normalized name
+    """
+    def __init__(self, dpath):
+        """
+        Constructor
+
+        :param dpath: string - path to the directory of the prefix index
+        """
+        self._keys = StringColumn(os.path.join(dpath, 'keys'))
+        self._offsets = open_array(os.path.join(dpath, 'offsets'), np.int64)
+        self._ids = open_array(os.path.join(dpath, 'ids'), np.int64)
+
+    def __len__(self):
+        """
+        Get the number of distinct normalized names
+
+        :returns: int
+        """
+        return len(self._keys)
+
+    def get(self, token, default=None):
+        """
+        Get the IDs of the values having the normalized name
+
+        :param token: string - normalized name
+        :param default: value returned if no value has the name
+        :returns: tuple of int sorted by ID
+        """
+        position = bisect.bisect_left(self._keys, token)
+        if position == len(self._keys) or self._keys[position] != token:
+            return default
+        start, end = self._offsets[position:position + 2].tolist()
+        return tuple(self._ids[start:end].tolist())
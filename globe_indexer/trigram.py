@@ -0,0 +1,313 @@
+# Filename: trigram.py
+
+"""
+Globe Indexer Trigram Module
+
+Interface classes:
+    TrigramIndex
+
+Interface functions:
+    like_to_regex
+    pattern_trigrams
+    trigram_code
+    trigrams
+    write_trigram_index
+"""
+
+# Standard libraries
+import collections
+import os
+import re
+
+# NumPy
+import numpy as np
+
+# Globe Indexer
+from globe_indexer.disk import (
+    ArrayWriter,
+    Groups,
+    StringColumn,
+    StringWriter,
+    open_array,
+    write_groups,
+)
+
+
+# Constants
+START = '\x02'
+END = '\x03'
+WILDCARDS_RGX = re.compile(r'[%_]')
+
+
+# Interface functions
+def like_to_regex(pattern):
+    """
+    Convert an SQL LIKE pattern into an equivalent regular expression
+
+    :param pattern: string - with % and _ as wildcards
+    :returns: compiled regular expression to be matched against the whole
+              value
+    """
+    parts = list()
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.DOTALL)
+
+
+def pattern_trigrams(pattern):
+    """
+    Get the trigrams (see :func:`trigrams`) that every value matching the SQL
+    LIKE pattern must contain
+
+    :param pattern: string - with % and _ as wildcards
+    :returns: set of string
+    """
+    runs = WILDCARDS_RGX.split(pattern)
+    values = set()
+    if runs[0]:
+        values.add(START + runs[0][0])
+    if runs[-1]:
+        values.add(runs[-1][-1] + END)
+
+    runs[0] = START + runs[0]
+    runs[-1] = runs[-1] + END
+    for run in runs:
+        values.update(run[index:index + 3] for index in range(len(run) - 2))
+    return values
+
+
+def trigram_code(trigram):
+    """
+    Encode a trigram (or an anchored bigram) as an integer, each character
+    taking 21 bits
+
+    :param trigram: string - see :func:`trigrams`
+    :returns: int
+    """
+    code = 0
+    for char in trigram:
+        code = (code << 21) | ord(char)
+    return code
+
+
+def trigrams(value):
+    """
+    Get the trigrams of the value, including the ones anchored at its start
+    and end. The anchored bigrams (first and last character) are included as
+    well so that short prefixes and suffixes can still be looked up.
+
+    :param value: string
+    :returns: set of string
+    """
+    value = START + value + END
+    values = {value[index:index + 3] for index in range(len(value) - 2)}
+    values.update((value[:2], value[-2:]))
+    return values
+
+
+def write_trigram_index(dpath, chunks):
+    """
+    Write the index to a directory, to be memory mapped by
+    :meth:`TrigramIndex.open`, without holding more than one chunk of values
+    in memory
+
+    :param dpath: string - path to the directory
+    :param chunks: callable returning an iterable of lists of tuple (ID,
+                   value), sorted by ID across the lists. It's called three
+                   times.
+    :returns: int - number of values written
+    """
+    os.makedirs(dpath, exist_ok=True)
+    with ArrayWriter(os.path.join(dpath, 'ids'), np.int64) as ids, \
+            StringWriter(os.path.join(dpath, 'values')) as values:
+        for rows in chunks():
+            for value_id, value in rows:
+                ids.add(value_id)
+                values.add(value.lower())
+
+    def postings():
+        position = 0
+        for rows in chunks():
+            codes = list()
+            positions = list()
+            for _, value in rows:
+                for trigram in trigrams(value.lower()):
+                    codes.append(trigram_code(trigram))
+                    positions.append(position)
+                position += 1
+            yield (np.array(codes, dtype=np.int64),
+                   {'positions': np.array(positions, dtype=np.int32)})
+
+    write_groups(os.path.join(dpath, 'postings'), postings,
+                 {'positions': np.int32})
+    return ids.count
+
+
+# Interface classes
+class TrigramIndex(object):
+    """
+    Inverted index from the trigrams of lowercased values to their positions,
+    answering SQL LIKE patterns (including leading wildcards) without
+    scanning every value.
+
+    Values removed by :meth:`TrigramIndex.update` are left as tombstones
+    until they outnumber the live values, at which point the index is
+    compacted. An index written by :func:`write_trigram_index` is memory
+    mapped by :meth:`TrigramIndex.open` and cannot be updated.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._ids = np.empty(0, dtype=np.int64)
+        self._values = list()
+        self._postings = dict()
+        self._removed = 0
+        self.loaded = False
+
+    def __len__(self):
+        """
+        Get the number of indexed values
+
+        :returns: int
+        """
+        return len(self._values) - self._removed
+
+    def load(self, rows):
+        """
+        (Re)build the index
+
+        :param rows: iterable of tuple (ID, value) sorted by ID
+        """
+        ids = list()
+        values = list()
+        postings = collections.defaultdict(list)
+        for position, (value_id, value) in enumerate(rows):
+            value = value.lower()
+            ids.append(value_id)
+            values.append(value)
+            for trigram in trigrams(value):
+                postings[trigram].append(position)
+
+        self._ids = np.array(ids, dtype=np.int64)
+        self._values = values
+        self._postings = {trigram: np.array(positions, dtype=np.int32)
+                          for trigram, positions in postings.items()}
+        self._removed = 0
+        self.loaded = True
+
+    def open(self, dpath):
+        """
+        Map an index written by :func:`write_trigram_index`
+
+        :param dpath: string - path to the directory
+        """
+        self._ids = open_array(os.path.join(dpath, 'ids'), np.int64)
+        self._values = StringColumn(os.path.join(dpath, 'values'))
+        self._postings = _Postings(os.path.join(dpath, 'postings'))
+        self._removed = 0
+        self.loaded = True
+
+    def search(self, pattern):
+        """
+        Get the IDs of the values matching the pattern (case insensitive)
+
+        :param pattern: string - SQL LIKE pattern with % and _ as wildcards
+        :returns: list of int sorted by ID
+        """
+        pattern = pattern.lower()
+        lists = list()
+        for trigram in pattern_trigrams(pattern):
+            positions = self._postings.get(trigram)
+            if positions is None:
+                return list()
+            lists.append(positions)
+
+        if lists:
+            lists.sort(key=len)
+            candidates = lists[0]
+            for positions in lists[1:]:
+                candidates = np.intersect1d(candidates, positions,
+                                            assume_unique=True)
+            candidates = candidates.tolist()
+        else:
+            # Too short to have any trigram, e.g. "%b%"
+            candidates = range(len(self._values))
+
+        regex = like_to_regex(pattern)
+        values = self._values
+        matches = [position for position in candidates
+                   if values[position] is not None and
+                   regex.fullmatch(values[position])]
+        return np.sort(self._ids[matches]).tolist()
+
+    def update(self, rows, removed):
+        """
+        Update the index in place of rebuilding it
+
+        :param rows: list of tuple (ID, value) to add, replacing the values
+                     with the same IDs
+        :param removed: list of tuple (ID, value) of the values to remove
+        """
+        dropped = [value_id for value_id, _ in removed]
+        dropped.extend(value_id for value_id, _ in rows)
+        for position in np.flatnonzero(np.isin(self._ids, dropped)).tolist():
+            if self._values[position] is not None:
+                self._values[position] = None
+                self._removed += 1
+
+        if self._removed > len(self):
+            live = [(value_id, value) for value_id, value in
+                    zip(self._ids.tolist(), self._values) if value is not None]
+            live.extend(rows)
+            self.load(sorted(live, key=lambda row: row[0]))
+            return
+
+        ids = list()
+        postings = collections.defaultdict(list)
+        for position, (value_id, value) in enumerate(rows, len(self._values)):
+            value = value.lower()
+            ids.append(value_id)
+            self._values.append(value)
+            for trigram in trigrams(value):
+                postings[trigram].append(position)
+
+        self._ids = np.concatenate((self._ids, np.array(ids, dtype=np.int64)))
+        for trigram, positions in postings.items():
+            positions = np.array(positions, dtype=np.int32)
+            if trigram in self._postings:
+                positions = np.concatenate((self._postings[trigram],
+                                            positions))
+            self._postings[trigram] = positions
+        self.loaded = True
+
+
+# Private classes
+class _Postings(object):
+    """
+    Memory mapped postings of an index, looked up like the dictionary of the
+    positions of each trigram
+    """
+    def __init__(self, fpath):
+        """
+        Constructor
+
+        :param fpath: string - path of the files, without extension
+        """
+        self._groups = Groups(fpath, {'positions': np.int32})
+
+    def get(self, trigram, default=None):
+        """
+        Get the positions of the values having the trigram
+
+        :param trigram: string
+        :param default: value returned if no value has the trigram
+        :returns: numpy.ndarray of int
+        """
+        positions = self._groups.get(trigram_code(trigram), 'positions')
+        return default if positions is None else positions
@@ -7,34 +7,44 @@ Interface functions:
     download_file
     formulate_json_error
     get_distance
+    get_memory_usage
     get_query_string
     has_invalid_chars
+    is_city_row
+    iter_geoname_table_file
+    iter_zip_blocks
     mkdirs
+    normalize_name
     parse_geoname_table_file
-    unzip
+    parse_geoname_table_text
+    split_file
 """
 
 # Standard libraries
+import contextlib
 import csv
+import io
 import math
 import re
 import os
+import resource
+import unicodedata
 import zipfile
 
 # Flask
 import flask
 
-# Requests
-import requests
-
 # Globe Indexer
 from globe_indexer import config
 from globe_indexer.error import GlobeIndexerError
+from globe_indexer.fetch import fetch_file
 
 
 ASTERISK_RGX = re.compile(r"\*")
 DUPLICATE_PERCENT_RGX = re.compile(r'%+')
 
+GEONAME_DELETES_HEADERS = ('geonameid', 'name', 'comment')
+
 GEONAME_TABLE_HEADERS = (
     'geonameid',
     'name',
@@ -60,21 +70,19 @@ GEONAME_TABLE_HEADERS = (
 INVALID_CHARS_RGX = re.compile(r"[`~!@#$%^&()+=[\]{}|\\:;\"\'<>?,./]+")
 
 
-def download_file(url, fpath):
+def download_file(url, fpath, **kwargs):
     """
     Download file from the specified URL (assuming that there is no
     authorization required)
 
     :param url: string - URL of the resource
     :param fpath: string - path to where to place the file
+    :param kwargs: dict - extra arguments to be passed to
+                   :func:`fetch.fetch_file`
+    :returns: string - hexadecimal digest of the file
     """
     mkdirs(os.path.dirname(fpath))
-
-    response = requests.get(url, stream=True)
-    with open(fpath, mode='wb') as fout:
-        for chunk in response.iter_content(chunk_size=config.DATA_CHUNK_SIZE):
-            if chunk:
-                fout.write(chunk)
+    return fetch_file(url, fpath, **kwargs)
 
 
 def formulate_json_error(message, error_type, returncode):
@@ -118,6 +126,34 @@ def get_distance(lon1, lat1, lon2, lat2):
     return value * config.EARTH_RADIUS
 
 
+def get_memory_usage():
+    """
+    Get the memory used by the process. The private part leaves out the
+    pages of mapped files, which are shared through the page cache and can
+    be dropped by the kernel at any time.
+
+    :returns: dict - resident memory ('rss'), its private part ('private')
+              and the peak resident memory ('peak'), in bytes. Without
+              /proc/self/status, all three are the peak resident memory.
+    """
+    fields = {'VmRSS': 'rss', 'RssAnon': 'private', 'VmHWM': 'peak'}
+    values = dict()
+    try:
+        with open('/proc/self/status') as fin:
+            for line in fin:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    values[fields[name]] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    if len(values) < len(fields):
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if os.uname().sysname == 'Darwin' else 1024
+        values = {name: peak for name in fields.values()}
+    return values
+
+
 def get_query_string(words):
     """
     Get the query string in a format that is SQL friendly after replacing *
@@ -149,6 +185,65 @@ def has_invalid_chars(value):
     return False
 
 
+def is_city_row(row, min_population=config.CITY_MIN_POPULATION):
+    """
+    Check if a row of the GeoNames table describes a city of the data set
+    (see :data:`config.CITY_FEATURE_CLASS`)
+
+    :param row: dict - row of the GeoNames table
+    :param min_population: int - minimum population of a city that is not
+                           the seat of an administrative division
+    :returns: boolean
+    """
+    feature_code = row['feature_code']
+    if row['feature_class'] != config.CITY_FEATURE_CLASS or \
+            feature_code in config.CITY_EXCLUDED_FEATURE_CODES:
+        return False
+    if feature_code in config.CITY_SEAT_FEATURE_CODES:
+        return True
+    return int(row['population'] or 0) >= min_population
+
+
+def iter_geoname_table_file(fpath, delimiter='\t',
+                            fieldnames=GEONAME_TABLE_HEADERS):
+    """
+    Parse the table given in a file one row at a time
+
+    :param fpath: string - path to the file
+    :param delimiter: string - delimiter between columns in the file
+    :param fieldnames: tuple of string - columns of the file, e.g.
+                       :data:`GEONAME_DELETES_HEADERS` for the daily
+                       deletion files
+    :returns: generator of dict
+    """
+    if not os.path.isfile(fpath):
+        fstr = "path is not a file: {}".format(fpath)
+        raise GlobeIndexerError(fstr)
+
+    full_fpath = os.path.realpath(fpath)
+    with open(full_fpath, encoding='utf-8') as fin:
+        yield from _iter_geoname_table(fin, delimiter, fieldnames)
+
+
+def iter_zip_blocks(fpath, size, member=None):
+    """
+    Read the text file held by a zip file in blocks of whole lines,
+    decompressing it on the fly
+
+    :param fpath: string - path to the zip file
+    :param size: int - approximate number of characters per block
+    :param member: string - name of the text file in the zip file. Defaults
+                   to the only .txt file of the zip file.
+    :returns: generator of string
+    """
+    with _open_zip_member(fpath, member) as fin:
+        while True:
+            lines = fin.readlines(size)
+            if not lines:
+                return
+            yield ''.join(lines)
+
+
 def mkdirs(dpath):
     """
     Create directory path (including the path of the parent directory if it
@@ -166,6 +261,20 @@ def mkdirs(dpath):
         raise GlobeIndexerError(fstr, details=str(exc))
 
 
+def normalize_name(value):
+    """
+    Normalize a name for lookups: case folded, stripped of accents and with
+    consecutive whitespaces collapsed (e.g. "  Sant Julià de Lòria" becomes
+    "sant julia de loria")
+
+    :param value: string
+    :returns: string
+    """
+    value = unicodedata.normalize('NFKD', value.casefold())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.split())
+
+
 def parse_geoname_table_file(fpath, delimiter='\t'):
     """
     Parse the table given in a file
@@ -174,28 +283,81 @@ def parse_geoname_table_file(fpath, delimiter='\t'):
     :param delimiter: string - delimiter between columns in the file
     :returns: list of dict
     """
-    if not os.path.isfile(fpath):
-        fstr = "path is not a file: {}".format(fpath)
-        raise GlobeIndexerError(fstr)
+    return list(iter_geoname_table_file(fpath, delimiter=delimiter))
 
-    full_fpath = os.path.realpath(fpath)
-    rows = list()
-    with open(full_fpath, encoding='utf-8') as fin:
-        reader = csv.DictReader(fin, fieldnames=GEONAME_TABLE_HEADERS,
-                                delimiter=delimiter, quoting=csv.QUOTE_NONE)
-        for line in reader:
-            rows.append(line)
 
-    return rows
+def parse_geoname_table_text(text, delimiter='\t',
+                             fieldnames=GEONAME_TABLE_HEADERS):
+    """
+    Parse the table given as text, e.g. a chunk of a file
+
+    :param text: string - whole lines of the table
+    :param delimiter: string - delimiter between columns
+    :param fieldnames: tuple of string - columns of the table
+    :returns: list of dict
+    """
+    # Translate the line endings as when reading a file in text mode
+    return list(_iter_geoname_table(io.StringIO(text, newline=None),
+                                    delimiter, fieldnames))
+
 
+def split_file(fpath, size):
+    """
+    Split a file into chunks of whole lines
 
-def unzip(fpath, dpath):
+    :param fpath: string - path to the file
+    :param size: int - approximate size of a chunk in bytes
+    :returns: list of tuple (start, end) - byte offsets of each chunk, the
+              end being excluded
     """
-    Unzip all files in the zip file at the specified directory
+    total = os.path.getsize(fpath)
+    offsets = [0]
+    with open(fpath, 'rb') as fin:
+        while offsets[-1] < total:
+            fin.seek(offsets[-1] + max(1, size) - 1)
+            fin.readline()
+            offsets.append(min(fin.tell(), total))
+    return list(zip(offsets, offsets[1:]))
+
+
+# Private functions
+@contextlib.contextmanager
+def _open_zip_member(fpath, member=None):
+    """
+    Open a text file held by a zip file, decompressing it on the fly
 
-    :param fpath: string - path to zip file
-    :param dpath: string - output path
+    :param fpath: string - path to the zip file
+    :param member: string - name of the text file in the zip file. Defaults
+                   to the only .txt file of the zip file.
+    :returns: text file object
     """
-    mkdirs(dpath)
+    if not zipfile.is_zipfile(fpath):
+        fstr = "path is not a zip file: {}".format(fpath)
+        raise GlobeIndexerError(fstr)
+
     with zipfile.ZipFile(fpath) as zip_fin:
-        zip_fin.extractall(path=dpath)
+        names = zip_fin.namelist()
+        if member is None:
+            members = [name for name in names if name.endswith('.txt')]
+            member = members[0] if len(members) == 1 else None
+        if member not in names:
+            fstr = "cannot find the table in the zip file: {}".format(fpath)
+            raise GlobeIndexerError(fstr, details=', '.join(names))
+
+        with zip_fin.open(member) as fin:
+            yield io.TextIOWrapper(fin, encoding='utf-8')
+
+
+def _iter_geoname_table(fin, delimiter, fieldnames):
+    """
+    Parse the table read from a text file object one row at a time
+
+    :param fin: text file object
+    :param delimiter: string - delimiter between columns
+    :param fieldnames: tuple of string - columns of the table
+    :returns: generator of dict
+    """
+    reader = csv.DictReader(fin, fieldnames=fieldnames, delimiter=delimiter,
+                            quoting=csv.QUOTE_NONE)
+    for line in reader:
+        yield line
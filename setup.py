@@ -19,11 +19,16 @@ setup(
         'Flask>=1.0.2',
         'Flask-SQLAlchemy>=2.3.2',
         'Flask-WTF>=0.14.2',
+        'numpy>=1.16.2',
         'pycountry>=18.12.8',
         'requests>=2.21.0',
         'SQLAlchemy>=1.3.0',
+        'urllib3>=1.21.1',
         'WTForms>=2.2.1',
     ],
+    extras_require={
+        'orjson': ['orjson>=2.0.0'],
+    },
     tests_require=[
         'Flask-Testing>=0.7.1',
         'coverage>=4.5.2',
@@ -45,7 +50,6 @@ setup(
         'Operating System :: POSIX :: Linux',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
     ],
@@ -16,6 +16,56 @@ from . import BaseTest
 
 
 class TestAPI(BaseTest):
+    def test_autocomplete(self):
+        response = self.app.get('/autocomplete')
+        self.assert400(response, "No prefix should return 400")
+
+        response = self.app.get('/autocomplete?prefix=')
+        self.assert400(response, "empty prefix should return 400")
+
+        response = self.app.get('/autocomplete?prefix=e&foo=bar')
+        self.assert400(response, "unsupported parameter should return 400")
+
+        for limit in ('0', 'foo', config.MAX_AUTOCOMPLETE_LIMIT + 1):
+            response = self.app.get('/autocomplete?prefix=e&limit={}'.format(
+                limit))
+            self.assert400(response, "invalid limit should return 400")
+
+        response = self.app.get('/autocomplete?prefix=en')
+        self.assert200(response, "valid prefix should return 200")
+        payload = json.loads(response.data.decode())
+        assert payload['limit'] == config.DEFAULT_AUTOCOMPLETE_LIMIT
+        assert payload['prefix'] == 'en'
+        assert payload['cities'] == [{
+            'city': GeoName.query.filter_by(id=3040686).first().json(),
+            'match': 'en kan pu',
+            'population': 11223,
+        }]
+
+        response = self.app.get('/autocomplete?prefix=xyz&limit=3')
+        self.assert200(response, "no match should still return 200")
+        payload = json.loads(response.data.decode())
+        assert payload['cities'] == list()
+
+    def test_countries(self):
+        response = self.app.get('/countries')
+        self.assert200(response, "country catalogue returns 200")
+        payload = json.loads(response.data.decode())
+        assert payload['countries'] == [
+            {'code': 'AD', 'name': 'Andorra', 'cities': 9}]
+        etag = response.headers['ETag']
+        assert etag == '"{}"'.format(payload['version'])
+        assert 'public' in response.headers['Cache-Control']
+
+        response = self.app.get('/countries',
+                                headers={'If-None-Match': etag})
+        self.assertStatus(response, 304, "same version returns 304")
+        assert response.data == b''
+
+        response = self.app.get('/countries',
+                                headers={'If-None-Match': '"other"'})
+        self.assert200(response, "other version returns 200")
+
     def test_health(self):
         response = self.app.get('/health')
         self.assert200(response, "Service is supposed to be running")
@@ -88,6 +138,59 @@ class TestAPI(BaseTest):
         response = self.app.get('/lexical?cityName={}'.format(city_name))
         self.assert200(response, "city with non ASCII character is supported")
 
+    def test_lexical_pagination(self):
+        url = '/lexical?cityName=*a*'
+        response = self.app.get(url)
+        self.assert200(response, "valid city name should return 200")
+        expected = json.loads(response.data.decode())['cities']
+        assert len(expected) == 8
+
+        cities = list()
+        after_id = None
+        while True:
+            page_url = url + '&limit=3'
+            if after_id is not None:
+                page_url += '&afterId={}'.format(after_id)
+            response = self.app.get(page_url)
+            self.assert200(response, "valid page should return 200")
+            payload = json.loads(response.data.decode())
+            assert payload['total'] == 8
+            assert payload['limit'] == 3
+            assert len(payload['cities']) <= 3
+            cities.extend(payload['cities'])
+            after_id = payload['next_after_id']
+            if after_id is None:
+                break
+        assert cities == expected
+
+        response = self.app.get(url + '&afterId={}'.format(expected[-1]['id']))
+        self.assert200(response, "page after the last city should return 200")
+        assert json.loads(response.data.decode())['cities'] == list()
+
+        for param in ('limit=0', 'limit=foo', 'afterId=-1', 'format=xml'):
+            response = self.app.get('{}&{}'.format(url, param))
+            self.assert400(response, "invalid {} should return 400".format(
+                param))
+
+        response = self.app.get('/lexical?limit=3')
+        self.assert400(response, "missing cityName should return 400")
+
+    def test_lexical_ndjson(self):
+        response = self.app.get('/lexical?cityName=*a*&format=ndjson')
+        self.assert200(response, "streamed response should return 200")
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.data.decode().splitlines()
+        cities = [json.loads(line) for line in lines]
+        assert len(cities) == 8
+        assert [city['id'] for city in cities] == \
+            sorted(city['id'] for city in cities)
+
+        response = self.app.get('/lexical?cityName=*a*&format=ndjson&limit=2'
+                                '&afterId={}'.format(cities[0]['id']))
+        self.assert200(response, "streamed page should return 200")
+        lines = response.data.decode().splitlines()
+        assert [json.loads(line) for line in lines] == cities[1:3]
+
     def test_proximity(self):
         response = self.app.get('/proximity')
         self.assert404(response, "No city ID for proximity should return 400")
@@ -116,6 +219,12 @@ class TestAPI(BaseTest):
         response = self.app.get('/proximity/{}?k={}'.format(city_id, k))
         self.assert400(response, "invalid k value should return 400")
 
+        k = config.MAX_PROXIMITY_LIMIT + 1
+        response = self.app.get('/proximity/{}?k={}'.format(city_id, k))
+        self.assert400(response, "k above the maximum should return 400")
+        payload = json.loads(response.data.decode())
+        assert payload['error']['type'] == 'VALIDATION_ERROR'
+
         k = 2
         response = self.app.get('/proximity/{}?k={}'.format(city_id, k))
         self.assert200(response, "valid city ID and k returns 200")
@@ -148,3 +257,125 @@ class TestAPI(BaseTest):
 
         response = self.app.get('/proximity/{}?foo=bar&k=2'.format(city_id))
         self.assert400(response, "extra parameter version 2 should return 400")
+
+    def test_radius(self):
+        response = self.app.get('/radius/3039678')
+        self.assert400(response, "missing radius should return 400")
+
+        response = self.app.get('/radius?r=5&lat=42.5')
+        self.assert400(response, "missing longitude should return 400")
+
+        response = self.app.get('/radius?r=-1&lat=42.5&lon=1.5')
+        self.assert400(response, "negative radius should return 400")
+
+        for value in ('inf', '1e400', 'nan', config.MAX_RADIUS + 1):
+            response = self.app.get('/radius/3039678?r={}'.format(value))
+            self.assert400(response, "radius above the maximum should "
+                                     "return 400")
+
+        response = self.app.get('/radius?r=5&lat=91&lon=1.5')
+        self.assert400(response, "invalid latitude should return 400")
+
+        response = self.app.get('/radius/3039678?r=5&lat=42.5')
+        self.assert400(response, "coordinate and city ID should return 400")
+
+        response = self.app.get('/radius/0?r=5')
+        self.assert404(response, "invalid city ID should return 404")
+
+        response = self.app.get('/radius/3039678?r=6')
+        self.assert200(response, "valid city ID and radius returns 200")
+        payload = json.loads(response.data.decode())
+        assert payload['radius'] == 6
+        assert payload['total'] == len(payload['cities']) == 5
+        distances = [city['distance'] for city in payload['cities']]
+        assert distances == sorted(distances)
+        assert all(value <= 6 for value in distances)
+        assert 3039678 not in [city['city']['id']
+                               for city in payload['cities']]
+
+        response = self.app.get('/radius?r=1&lat=42.55623&lon=1.53319')
+        self.assert200(response, "valid coordinate and radius returns 200")
+        payload = json.loads(response.data.decode())
+        assert [city['city']['id'] for city in payload['cities']] == \
+            [3039678]
+
+        response = self.app.get('/radius?r=5000&lat=0&lon=179.9&'
+                                'countryCode=AD')
+        self.assert200(response, "coordinate across the antimeridian "
+                                 "returns 200")
+        payload = json.loads(response.data.decode())
+        assert payload['total'] == 0
+
+    def test_reverse(self):
+        response = self.app.get('/reverse?lat=42.5')
+        self.assert400(response, "missing longitude should return 400")
+
+        response = self.app.get('/reverse?lat=42.5&lon=181')
+        self.assert400(response, "invalid longitude should return 400")
+
+        response = self.app.get('/reverse?lat=42.5&lon=1.5&k=0')
+        self.assert400(response, "invalid k value should return 400")
+
+        response = self.app.get('/reverse?lat=42.5&lon=1.5&k={}'.format(
+            config.MAX_REVERSE_LIMIT + 1))
+        self.assert400(response, "k above the maximum should return 400")
+        payload = json.loads(response.data.decode())
+        assert payload['error']['type'] == 'VALIDATION_ERROR'
+
+        response = self.app.get('/reverse?lat=42.5&lon=1.5&foo=bar')
+        self.assert400(response, "unsupported parameter should return 400")
+
+        response = self.app.get('/reverse?lat=42.5074&lon=1.5341')
+        self.assert200(response, "valid coordinate returns 200")
+        payload = json.loads(response.data.decode())
+        assert payload['limit'] == config.DEFAULT_REVERSE_LIMIT
+        assert [city['city']['id'] for city in payload['cities']] == \
+            [3040051]
+
+        response = self.app.get('/reverse?lat=42.5074&lon=1.5341&k=20')
+        self.assert200(response, "valid coordinate and k returns 200")
+        payload = json.loads(response.data.decode())
+        assert len(payload['cities']) == 9
+        distances = [city['distance'] for city in payload['cities']]
+        assert distances == sorted(distances)
+
+        response = self.app.get('/reverse?lat=42.5&lon=1.5&countryCode=ID')
+        self.assert200(response, "country code not in the database will "
+                                 "return 200")
+        payload = json.loads(response.data.decode())
+        assert payload['cities'] == list()
+
+    def test_batch_proximity(self):
+        url = '/batch/proximity'
+        response = self.app.get(url)
+        self.assert405(response, "GET is not supported")
+
+        for body in (None, [3039678], {'origins': []},
+                     {'origins': [3039678], 'k': 0},
+                     {'origins': [3039678, 3039163],
+                      'k': config.MAX_BATCH_RESULTS // 2 + 1},
+                     {'origins': [{'lat': 91, 'lon': 0}]},
+                     {'origins': ['3039678']},
+                     {'origins': [3039678], 'foo': 'bar'},
+                     {'origins': [0]}):
+            response = self.app.post(url, json=body)
+            self.assert400(response, "invalid body should return 400: "
+                                     "{}".format(body))
+
+        response = self.app.post(url, json={
+            'origins': [3039163, {'lat': 42.5074, 'lon': 1.5341}], 'k': 2})
+        self.assert200(response, "valid origins return 200")
+        payload = json.loads(response.data.decode())
+        assert payload['limit'] == 2
+        assert len(payload['results']) == 2
+        assert all(len(value['cities']) == 2 for value in payload['results'])
+        assert payload['results'][1]['cities'][0]['city']['id'] == 3040051
+        assert 3039163 not in [city['city']['id'] for city in
+                               payload['results'][0]['cities']]
+
+        response = self.app.post(url, json={'origins': [3039163],
+                                            'countryCode': 'id'})
+        self.assert200(response, "country code not in the database will "
+                                 "return 200")
+        payload = json.loads(response.data.decode())
+        assert payload['results'] == [{'cities': []}]
@@ -0,0 +1,131 @@
+# Filename: test_asgi.py
+
+"""
+Test content of the api/asgi.py
+"""
+
+# Standard libraries
+import asyncio
+import json
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer.api.asgi import AsgiApplication
+
+# Test
+from . import BaseTest
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine in a new event loop
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsgi(BaseTest):
+    def setUp(self):
+        super(TestAsgi, self).setUp()
+        self.asgi = AsgiApplication(flask.current_app._get_current_object(),
+                                    workers=2)
+
+    def request(self, path, query_string=b'', method='GET', body=b''):
+        """
+        Send a request through the ASGI application
+
+        :returns: tuple (status, headers, list of the chunks of the body)
+        """
+        messages = list()
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method,
+                 'scheme': 'http', 'path': path, 'root_path': '',
+                 'query_string': query_string,
+                 'headers': [(b'content-type', b'application/json')],
+                 'client': ('127.0.0.1', 50000),
+                 'server': ('localhost', 8000)}
+        run_coroutine(self.asgi(scope, receive, send))
+        assert messages[0]['type'] == 'http.response.start'
+        assert not messages[-1].get('more_body', False)
+        return (messages[0]['status'], dict(messages[0]['headers']),
+                [message['body'] for message in messages[1:]])
+
+    def test_endpoints(self):
+        for path, query_string in (('/3039678', b''),
+                                   ('/3039678000', b''),
+                                   ('/lexical', b'cityName=ordino'),
+                                   ('/lexical', b'cityName=Jak*'),
+                                   ('/lexical', b'cityName=o*&limit=0'),
+                                   ('/proximity/3039678', b'k=3'),
+                                   ('/proximity/3039678', b'countryCode=FR'),
+                                   ('/autocomplete', b'prefix=en'),
+                                   ('/reverse', b'lat=42.5&lon=1.5&k=2'),
+                                   ('/radius/3039678', b'r=10'),
+                                   ('/radius', b'r=inf&lat=42.5&lon=1.5'),
+                                   ('/countries', b''),
+                                   ('/health', b'')):
+            expected = self.app.get(path, query_string=query_string)
+            status, headers, body = self.request(path, query_string)
+            assert status == expected.status_code
+            assert headers[b'content-type'].decode() == expected.content_type
+            assert b''.join(body) == expected.data
+
+    def test_lexical_ndjson(self):
+        query_string = b'cityName=*a*&format=ndjson'
+        expected = self.app.get('/lexical', query_string=query_string)
+        status, headers, body = self.request('/lexical', query_string)
+        assert status == 200
+        assert headers[b'content-type'] == b'application/x-ndjson'
+        # One chunk per city
+        assert len(body) == expected.data.count(b'\n') > 1
+        assert b''.join(body) == expected.data
+
+    def test_batch_proximity(self):
+        body = json.dumps({'origins': [3039678, {'lat': 42.5, 'lon': 1.5}],
+                           'k': 2}).encode()
+        expected = self.app.post('/batch/proximity', data=body,
+                                 content_type='application/json')
+        status, _, chunks = self.request('/batch/proximity', method='POST',
+                                         body=body)
+        assert status == expected.status_code == 200
+        assert b''.join(chunks) == expected.data
+
+    def test_not_served(self):
+        status, _, body = self.request('/form/lexical')
+        assert status == 404
+        payload = json.loads(b''.join(body).decode())
+        assert payload['error']['type'] == 'INVALID_PATH'
+
+        status, _, _ = self.request('/static/style.css')
+        assert status == 404
+
+        # Answered by the application
+        status, _, _ = self.request('/foo/bar')
+        assert status == 404
+        status, _, _ = self.request('/lexical', method='POST')
+        assert status == 405
+
+    def test_lifespan(self):
+        events = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        messages = list()
+
+        async def receive():
+            return events.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        run_coroutine(self.asgi({'type': 'lifespan'}, receive, send))
+        assert [message['type'] for message in messages] == [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,95 @@
+# Filename: test_cache.py
+
+"""
+Test content of the cache.py
+"""
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import cache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryCache:
+    def test_lru(self):
+        backend = cache.MemoryCache(max_size=2, ttl=None)
+        backend.set(('a',), 1)
+        backend.set(('b',), 2)
+        assert backend.get(('a',)) == 1
+
+        # ('b',) is now the least recently used entry
+        backend.set(('c',), 3)
+        assert len(backend) == 2
+        assert backend.get(('b',)) is None
+        assert backend.get(('a',)) == 1
+        assert backend.get(('c',)) == 3
+
+        backend.clear()
+        assert len(backend) == 0
+
+    def test_ttl(self):
+        clock = FakeClock()
+        backend = cache.MemoryCache(max_size=10, ttl=5, clock=clock)
+        backend.set(('a',), 1)
+        clock.now = 4.9
+        assert backend.get(('a',)) == 1
+        clock.now = 5
+        assert backend.get(('a',)) is None
+        assert len(backend) == 0
+
+    def test_disabled(self):
+        backend = cache.MemoryCache(max_size=0)
+        backend.set(('a',), 1)
+        assert backend.get(('a',)) is None
+
+
+class TestQueryCache:
+    def test_stats(self):
+        query_cache = cache.QueryCache(cache.MemoryCache(max_size=10))
+        assert query_cache.get(('a',)) is None
+        query_cache.set(('a',), 1)
+        assert query_cache.get(('a',)) == 1
+        assert query_cache.get(('a',)) == 1
+
+        stats = query_cache.stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 2 / 3
+
+    def test_invalidate(self):
+        query_cache = cache.QueryCache(cache.MemoryCache(max_size=10))
+        query_cache.set(('a',), 1)
+        generation = query_cache.generation
+        query_cache.invalidate()
+        assert query_cache.generation == generation + 1
+        assert query_cache.get(('a',)) is None
+
+    def test_init_app(self):
+        class App(object):
+            config = {'QUERY_CACHE_SIZE': 3, 'QUERY_CACHE_TTL': None}
+
+        query_cache = cache.QueryCache()
+        query_cache.init_app(App)
+        assert query_cache.backend.max_size == 3
+        assert query_cache.backend.ttl is None
+
+        App.config = {'QUERY_CACHE_BACKEND': 'globe_indexer.cache.MemoryCache'}
+        query_cache.init_app(App)
+        assert isinstance(query_cache.backend, cache.MemoryCache)
+
+        # An incomplete backend can't be created
+        class Backend(cache.CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            Backend()
@@ -0,0 +1,33 @@
+# Filename: test_countries.py
+
+"""
+Test content of the countries.py
+"""
+
+# Standard libraries
+import json
+
+# Globe Indexer
+from globe_indexer import countries
+
+
+class TestCountryCatalogue:
+    def test_load(self):
+        catalogue = countries.CountryCatalogue()
+        assert len(catalogue) == 0
+        assert catalogue.choices == [('', '')]
+
+        catalogue.load({'FR': 2, 'AD': 9, 'XK': 1})
+        assert len(catalogue) == 3
+        assert catalogue.choices == [('', ''), ('AD', 'AD - Andorra'),
+                                     ('FR', 'FR - France'), ('XK', 'XK - XK')]
+        payload = json.loads(catalogue.body)
+        assert payload['version'] == catalogue.version
+        assert payload['countries'][0] == {'code': 'AD', 'name': 'Andorra',
+                                           'cities': 9}
+
+        version = catalogue.version
+        catalogue.load({'FR': 2, 'AD': 9, 'XK': 1})
+        assert catalogue.version == version
+        catalogue.load({'FR': 2, 'AD': 10, 'XK': 1})
+        assert catalogue.version != version
@@ -0,0 +1,339 @@
+# Filename: test_database.py
+
+"""
+Test content of the api/database.py
+"""
+
+# Standard libraries
+import functools
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import zipfile
+
+# Flask
+import flask
+
+# pytest
+import pytest
+
+# SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Globe Indexer
+from globe_indexer.api import database, query
+from globe_indexer.api.index import (
+    city_snapshot,
+    neighbour_table,
+    spatial_index,
+)
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.error import GlobeIndexerError
+from globe_indexer.neighbours import NeighbourTable
+
+# Test
+from . import BaseTest
+
+
+class TestDatabase(BaseTest):
+    def setUp(self):
+        super(TestDatabase, self).setUp()
+        self.input_fpath = os.path.join(os.path.dirname(__file__), 'data',
+                                        'geoname_example.txt')
+
+    def test_initialize_db_batches(self):
+        db.drop_all()
+        db.create_all()
+
+        calls = list()
+        database.initialize_db(db, self.input_fpath, batch_size=4,
+                               progress=lambda count, _: calls.append(count))
+        assert calls == [4, 8, 9]
+        assert db.session.query(GeoName).count() == 9
+
+        city = GeoName.query.filter_by(id=3039163).first()
+        assert city.name == 'Sant Julià de Lòria'
+        assert city.population == 8022
+        assert city.date_created is not None
+
+        # Already loaded
+        calls = list()
+        database.initialize_db(db, self.input_fpath,
+                               progress=lambda count, _: calls.append(count))
+        assert calls == list()
+
+    def test_initialize_db_download(self):
+        db.drop_all()
+        db.create_all()
+        with tempfile.TemporaryDirectory() as dpath:
+            served_dpath = os.path.join(dpath, 'served')
+            os.mkdir(served_dpath)
+            zip_fpath = os.path.join(served_dpath, 'cities1000.zip')
+            with zipfile.ZipFile(zip_fpath, 'w', zipfile.ZIP_DEFLATED) as fout:
+                fout.write(self.input_fpath, 'cities1000.txt')
+            with open(zip_fpath, 'rb') as fin:
+                checksum = hashlib.sha256(fin.read()).hexdigest()
+
+            # Plain local server, without range requests
+            handler = functools.partial(
+                http.server.SimpleHTTPRequestHandler, directory=served_dpath)
+            server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                     handler)
+            thread = threading.Thread(target=server.serve_forever,
+                                      kwargs={'poll_interval': 0.05})
+            thread.start()
+            try:
+                url = 'http://127.0.0.1:{}/cities1000.zip'.format(
+                    server.server_address[1])
+                database.initialize_db(
+                    db, os.path.join(dpath, 'input', 'cities1000.txt'),
+                    url=url, checksum=checksum)
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+
+            # Parsed from the zip file without extracting it
+            assert os.listdir(os.path.join(dpath, 'input')) == ['cities.zip']
+        assert db.session.query(GeoName).count() == 9
+        assert query.lexical_id_query(('ordino',)) == [3039678]
+
+    def test_load_geoname_file(self):
+        expected = [city.json(compact=False)
+                    for city in GeoName.query.order_by(GeoName.id)]
+        with tempfile.TemporaryDirectory() as dpath:
+            zip_fpath = os.path.join(dpath, 'cities.zip')
+            with zipfile.ZipFile(zip_fpath, 'w', zipfile.ZIP_DEFLATED) as fout:
+                fout.write(self.input_fpath, 'cities1000.txt')
+
+            for fpath, processes in ((self.input_fpath, 1),
+                                     (self.input_fpath, 2), (zip_fpath, 2)):
+                db.drop_all()
+                db.create_all()
+                calls = list()
+                assert database.load_geoname_file(
+                    db, fpath, processes=processes, batch_size=4,
+                    chunk_size=1000,
+                    progress=lambda count, _: calls.append(count)) == 9
+                assert calls == [4, 8, 9]
+                assert [city.json(compact=False) for city in
+                        GeoName.query.order_by(GeoName.id)] == expected
+
+            with pytest.raises(GlobeIndexerError):
+                database.load_geoname_file(db, os.path.join(dpath, 'none'))
+
+    def test_load_invalid_batch_size(self):
+        with pytest.raises(GlobeIndexerError):
+            database.load_geoname_rows(db, [], batch_size=0)
+
+    def test_precompute_neighbours(self):
+        with tempfile.TemporaryDirectory() as dpath:
+            assert database.precompute_neighbours(db, dpath, k=3,
+                                                  processes=1) == 9
+            assert neighbour_table.loaded
+            assert neighbour_table.k == 3
+
+            city_id = 3039678
+            results = query.proximity_query(city_id, limit=3)
+            assert results == neighbour_table.lookup(city_id, 3)
+            assert results == query.proximity_query(city_id)[:3]
+
+            # Up to date
+            assert database.precompute_neighbours(db, dpath, k=3,
+                                                  processes=1) == 0
+
+            city = GeoName.query.filter_by(id=city_id).first()
+            city.latitude = 42.5
+            db.session.commit()
+            database.build_indexes(db)
+            assert not neighbour_table.loaded
+            assert 0 < database.precompute_neighbours(db, dpath, k=3,
+                                                      processes=1) <= 9
+            neighbour_table.unload()
+
+    def test_production_profile(self):
+        city_id = 3039678
+        expected = query.radius_query(42.55623, 1.53319, 20)
+        with tempfile.TemporaryDirectory() as dpath:
+            app = flask.Flask(__name__)
+            app.config.from_object('config.ProductionConfig')
+            app.config['SQLALCHEMY_DATABASE_URI'] = \
+                'sqlite:///' + os.path.join(dpath, 'globe indexer.db')
+            app.config['SQLITE_READERS'] = 2
+            db.init_app(app)
+            # The session is scoped by thread rather than by application
+            db.session.remove()
+            with app.app_context():
+                db.create_all()
+                database.initialize_db(db, self.input_fpath)
+                assert db.session.execute(
+                    text('PRAGMA journal_mode')).scalar() == 'wal'
+                assert db.engine.pool.size() == 1
+
+                # Queries go through the read only connections
+                assert db.reader is not db.session
+                assert db.reader.bind.pool.size() == 2
+                assert db.reader.execute(
+                    text('PRAGMA mmap_size')).scalar() == 256 * 1024 * 1024
+                assert query.radius_query(42.55623, 1.53319, 20) == expected
+                assert db.reader.query(GeoName).get(city_id).name == 'Ordino'
+                with pytest.raises(OperationalError):
+                    db.reader.execute(text('DELETE FROM geo_name'))
+                db.reader.rollback()
+
+                # Committed writes are seen by the readers
+                db.session.execute(text(
+                    'DELETE FROM geo_name WHERE id = {}'.format(city_id)))
+                db.session.commit()
+                db.reader.remove()
+                assert db.reader.query(GeoName).get(city_id) is None
+                db.reader.bind.dispose()
+                db.engine.dispose()
+
+        # Without read only connections, queries share the default session
+        assert db.reader is db.session
+
+    def test_snapshot(self):
+        city_id = 3039678
+        expected = query.proximity_query(city_id, limit=3)
+        with tempfile.TemporaryDirectory() as dpath:
+            fpath = os.path.join(dpath, 'cities.snapshot')
+            assert database.save_snapshot(db, fpath) == 9
+
+            db.drop_all()
+            db.create_all()
+            assert database.load_snapshot(db, fpath) == 9
+            assert city_snapshot.loaded
+            assert query.proximity_query(city_id, limit=3) == expected
+            assert [value[1] for value in query.fragment_query([city_id])] \
+                == ['{"id":3039678,"name":"Ordino","latitude":42.55623,'
+                    '"longitude":1.53319,"country_code":"AD"}']
+            assert query.lexical_id_query(('ordino',)) == [city_id]
+            city_snapshot.close()
+
+    def test_scale_indexes(self):
+        def results():
+            return (
+                [(name, city.id) for name, city in
+                 query.autocomplete_query('e')],
+                query.autocomplete_query('Sant Julia d')[0][1].id,
+                [query.lexical_id_query(names) for names in
+                 (('el', 'tarter'), ('*a*',), ('escaldes',),
+                  ('АРИНСАЛ',), ('*',), ('la*',))],
+                [[value[1] for value in query.proximity_query(
+                    city_id, country_code=country_code, limit=limit)]
+                 for city_id in (3039678, 3040051)
+                 for country_code in (None, 'AD', 'ID')
+                 for limit in (None, 3)],
+                query.proximity_total(3039678, country_code='AD'),
+                [value[1] for value in query.reverse_query(42.556, 1.533,
+                                                           limit=3)],
+                [[value[1] for value in values] for values in
+                 query.batch_proximity_query([3039678, (42.5, 1.5)],
+                                             limit=2)],
+                [city.json(compact=False) for city in
+                 query.city_query([3040132, 0, 3039163])],
+                query.fragment_query([3039678, 0]),
+                query.country_code_query(),
+            )
+
+        expected = results()
+        with tempfile.TemporaryDirectory() as dpath:
+            fpath = os.path.join(dpath, 'cities.snapshot')
+            scale_dpath = os.path.join(dpath, 'scale')
+            database.save_snapshot(db, fpath)
+            assert database.load_snapshot(db, fpath, scale_dpath=scale_dpath,
+                                          memory_budget=4 * 8192) == 9
+            assert spatial_index.dpath == os.path.join(scale_dpath, 'grid')
+            assert results() == expected
+            with pytest.raises(GlobeIndexerError):
+                query.proximity_query(-1)
+
+            # Written again once the snapshot changes, and kept in sync
+            manifest_fpath = os.path.join(scale_dpath, 'manifest.json')
+            mtime = os.stat(manifest_fpath).st_mtime_ns
+            database.load_snapshot(db, fpath, scale_dpath=scale_dpath)
+            assert os.stat(manifest_fpath).st_mtime_ns == mtime
+            database.sync_db(db, os.path.join(os.path.dirname(__file__),
+                                              'data', 'updates'))
+            assert os.stat(manifest_fpath).st_mtime_ns != mtime
+            assert spatial_index.dpath is not None
+            # Written in a new directory, renamed into place
+            assert sorted(os.listdir(dpath)) == ['cities.snapshot', 'scale']
+            assert query.lexical_id_query(('ordino',)) == \
+                [city.id for city in GeoName.query.filter(
+                    GeoName.name.ilike('ordino'))]
+
+            city_snapshot.close()
+            database.build_indexes(db)
+            assert spatial_index.dpath is None
+
+    def test_sync_db(self):
+        updates_dpath = os.path.join(os.path.dirname(__file__), 'data',
+                                     'updates')
+
+        def results():
+            return (
+                query.lexical_query(('Sol*',)),
+                query.lexical_id_query(('tarter',)),
+                query.lexical_id_query(('*a*',)),
+                query.autocomplete_query('s', limit=10),
+                query.autocomplete_query('tart'),
+                query.proximity_query(3039154),
+                query.reverse_query(42.5, 1.5, country_code='FR'),
+                query.reverse_query(42.57, 1.66, limit=3),
+                query.fragment_query([3039154, 3039999, 3039678]),
+                query.city_query([3039154, 3039604]),
+                query.country_catalogue_query().body,
+            )
+
+        with tempfile.TemporaryDirectory() as dpath:
+            database.precompute_neighbours(db, dpath, k=3, processes=1)
+            assert query.lexical_query(('Sol*',)) == list()
+
+            counts = database.sync_db(db, updates_dpath)
+            assert counts == {'inserted': 1, 'updated': 1, 'deleted': 2,
+                              'skipped': 3}
+            assert neighbour_table.loaded
+            assert neighbour_table.lookup(3039154, 3) == \
+                query.proximity_query(3039154)[:3]
+            # Saved for the other processes
+            table = NeighbourTable()
+            table.load(dpath)
+            assert table.lookup(3039154, 3) == \
+                neighbour_table.lookup(3039154, 3)
+            updated = results()
+            neighbour_table.unload()
+
+        assert db.session.query(GeoName).count() == 8
+        city = GeoName.query.filter_by(id=3039154).first()
+        assert city.population == 1200
+        assert city.date_updated is not None
+        assert GeoName.query.filter_by(id=3041519).first().name == 'Arinsal'
+        assert GeoName.query.filter_by(id=3039001).first() is None
+        assert [city.name for city in updated[0]] == ['Soldeu']
+        assert [value[1] for value in updated[6]] == [3039999]
+        assert updated[9][0].population == 1200 and len(updated[9]) == 1
+
+        # Same results as with indexes rebuilt from the database
+        database.build_indexes(db)
+        assert results() == updated
+
+        # Files already applied are applied again without any effect
+        counts = database.sync_db(db, updates_dpath)
+        assert counts['inserted'] == counts['deleted'] == 0
+
+    def test_sync_db_snapshot(self):
+        updates_dpath = os.path.join(os.path.dirname(__file__), 'data',
+                                     'updates')
+        with tempfile.TemporaryDirectory() as dpath:
+            fpath = os.path.join(dpath, 'cities.snapshot')
+            database.save_snapshot(db, fpath)
+            database.load_snapshot(db, fpath)
+            database.sync_db(db, updates_dpath)
+            assert len(city_snapshot) == 8
+            assert city_snapshot.position(3039999) is not None
+            city_snapshot.close()
@@ -0,0 +1,90 @@
+# Filename: test_disk.py
+
+"""
+Test content of the disk.py
+"""
+
+# Standard libraries
+import bisect
+import os
+
+# NumPy
+import numpy as np
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import disk
+
+
+class TestDisk:
+    def test_array(self, tmpdir):
+        fpath = os.path.join(str(tmpdir), 'values')
+        with disk.ArrayWriter(fpath, np.int64) as writer:
+            writer.add(1)
+            writer.append([2, 3])
+            writer.add(4)
+            assert not os.path.exists(fpath)
+        assert writer.count == 4
+        assert disk.open_array(fpath, np.int64).tolist() == [1, 2, 3, 4]
+
+        with disk.ArrayWriter(fpath, np.float64):
+            pass
+        assert len(disk.open_array(fpath, np.float64)) == 0
+
+        with pytest.raises(ValueError):
+            with disk.ArrayWriter(fpath, np.int64) as writer:
+                writer.add(5)
+                raise ValueError()
+        assert not os.path.exists(fpath + '.tmp')
+        assert len(disk.open_array(fpath, np.int64)) == 0
+
+    def test_strings(self, tmpdir):
+        fpath = os.path.join(str(tmpdir), 'names')
+        values = sorted(['andorra', '', 'sant julià de lòria', 'ordino',
+                         'лондон', 'escaldes'])
+        with disk.StringWriter(fpath) as writer:
+            for value in values:
+                writer.add(value)
+
+        column = disk.StringColumn(fpath)
+        assert len(column) == len(values)
+        assert [column[position] for position in range(len(values))] == \
+            values
+        assert column.slice(1, 4) == values[1:4]
+        assert column.slice(0, len(values)) == values
+        assert bisect.bisect_left(column, 'ordino') == values.index('ordino')
+        with pytest.raises(IndexError):
+            column[len(values)]
+
+        with disk.StringWriter(fpath):
+            pass
+        assert len(disk.StringColumn(fpath)) == 0
+
+    def test_groups(self, tmpdir):
+        fpath = os.path.join(str(tmpdir), 'groups')
+        chunks = [([5, 1, 5], [10, 11, 12]), ([1, 7], [13, 14]),
+                  ([], []), ([5], [15])]
+
+        def iter_chunks():
+            for keys, values in chunks:
+                yield (np.array(keys, dtype=np.int64),
+                       {'values': np.array(values, dtype=np.int32)})
+
+        assert disk.write_groups(fpath, iter_chunks,
+                                 {'values': np.int32}) == 6
+        groups = disk.Groups(fpath, {'values': np.int32})
+        assert len(groups) == 3
+        assert groups.get(1, 'values').tolist() == [11, 13]
+        assert groups.get(5, 'values').tolist() == [10, 12, 15]
+        assert groups.get(7, 'values').tolist() == [14]
+        assert groups.get(6, 'values') is None
+        assert groups.get(8, 'values') is None
+        assert groups.bounds(2, 8) == (2, 6)
+
+        assert disk.write_groups(fpath, lambda: iter(()),
+                                 {'values': np.int32}) == 0
+        groups = disk.Groups(fpath, {'values': np.int32})
+        assert groups.get(1, 'values') is None
+        assert groups.bounds(0, 10) == (0, 0)
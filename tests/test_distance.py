@@ -0,0 +1,119 @@
+# Filename: test_distance.py
+
+"""
+Test content of the distance.py
+"""
+
+# Standard libraries
+import random
+
+# NumPy
+import numpy as np
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import distance, utils
+from globe_indexer.error import GlobeIndexerError
+
+
+class TestPointArray:
+    @classmethod
+    def setup_class(cls):
+        generator = random.Random(2000)
+        cls.rows = [(index, generator.uniform(-90, 90),
+                     generator.uniform(-180, 180))
+                    for index in range(500)]
+        cls.points = distance.PointArray.from_rows(cls.rows)
+
+    def test_arrays(self):
+        assert len(self.points) == len(self.rows)
+        assert self.points.ids.dtype == np.int64
+        assert self.points.latitudes.dtype == np.float64
+        assert self.points.longitudes.flags['C_CONTIGUOUS']
+
+        with pytest.raises(GlobeIndexerError):
+            distance.PointArray([1, 2], [0.0], [0.0])
+
+    def test_haversine(self):
+        for _, latitude, longitude in self.rows[:20]:
+            for _, other_lat, other_lon in self.rows[-20:]:
+                assert distance.haversine(longitude, latitude, other_lon,
+                                          other_lat) == pytest.approx(
+                    utils.get_distance(longitude, latitude, other_lon,
+                                       other_lat))
+
+    def test_distances(self):
+        _, latitude, longitude = self.rows[7]
+        values = self.points.distances(latitude, longitude)
+        assert values.shape == (len(self.rows),)
+        expected = [utils.get_distance(longitude, latitude, lon, lat)
+                    for _, lat, lon in self.rows]
+        np.testing.assert_allclose(values, expected, atol=1e-6)
+
+        origins = np.array(self.rows[:3])
+        values = self.points.distances(origins[:, 1], origins[:, 2])
+        assert values.shape == (3, len(self.rows))
+        np.testing.assert_allclose(values[2],
+                                   self.points.distances(*self.rows[2][1:]))
+
+    def test_nearest(self):
+        point_id, latitude, longitude = self.rows[11]
+        expected = sorted((utils.get_distance(longitude, latitude, lon, lat),
+                           other_id)
+                          for other_id, lat, lon in self.rows
+                          if other_id != point_id)
+
+        results = self.points.nearest(latitude, longitude, k=10,
+                                      exclude=point_id)
+        assert [value[1] for value in results] == \
+            [value[1] for value in expected[:10]]
+
+        results = self.points.nearest(latitude, longitude, exclude=point_id)
+        assert len(results) == len(expected)
+        assert self.points.nearest(latitude, longitude, k=0) == list()
+
+    def test_nearest_many(self):
+        origins = self.rows[:7]
+        results = self.points.nearest_many(
+            [value[1] for value in origins], [value[2] for value in origins],
+            k=4, excludes=[value[0] for value in origins], block_size=1000)
+        assert results == [self.points.nearest(lat, lon, k=4, exclude=point_id)
+                           for point_id, lat, lon in origins]
+
+    def test_within(self):
+        _, latitude, longitude = self.rows[3]
+        results = self.points.within(latitude, longitude, 3000)
+        expected = [value for value in
+                    self.points.nearest(latitude, longitude)
+                    if value[0] <= 3000]
+        assert results == expected
+
+    def test_select_nearest_ties(self):
+        distances = np.array([1.0, 2.0, 1.0, 1.0, 0.5])
+        ids = np.array([9, 1, 7, 3, 5])
+        assert distance.select_nearest(distances, ids, k=3) == \
+            [(0.5, 5), (1.0, 3), (1.0, 7)]
+        assert distance.select_nearest(distances, ids, k=2, exclude=5) == \
+            [(1.0, 3), (1.0, 7)]
+
+    def test_bounding_box(self):
+        # Every point within the radius lies in the box, including around the
+        # antimeridian and the poles
+        for _, latitude, longitude in self.rows[:50]:
+            for radius in (100, 2000, 9000):
+                min_lat, max_lat, ranges = distance.bounding_box(
+                    latitude, longitude, radius)
+                for _, point_id in self.points.within(latitude, longitude,
+                                                      radius):
+                    _, lat, lon = self.rows[point_id]
+                    assert min_lat <= lat <= max_lat
+                    assert any(lower <= lon <= upper
+                               for lower, upper in ranges)
+
+        _, _, ranges = distance.bounding_box(0, 179.9, 100)
+        assert len(ranges) == 2
+        assert ranges[0][1] == 180 and ranges[1][0] == -180
+        _, _, ranges = distance.bounding_box(-89.5, 0, 100)
+        assert ranges == [(-180.0, 180.0)]
@@ -0,0 +1,166 @@
+# Filename: test_fetch.py
+
+"""
+Test content of the fetch.py against a local HTTP server
+"""
+
+# Standard libraries
+import hashlib
+import http.server
+import os
+import re
+import tempfile
+import threading
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import config, fetch
+from globe_indexer.error import GlobeIndexerError
+
+
+RANGE_RGX = re.compile(r'bytes=(\d+)-(\d+)?')
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve the payload of the server, with byte ranges unless disabled, and
+    cut the responses short as many times as requested
+    """
+    def log_message(self, *_):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        server = self.server
+        if self.path != '/cities.zip':
+            self.send_error(404)
+            return
+
+        payload = server.payload
+        start, end = 0, len(payload) - 1
+        match = RANGE_RGX.fullmatch(self.headers.get('Range', ''))
+        partial = match is not None and server.ranges and \
+            self.headers.get('If-Range', server.etag) == server.etag
+        if partial:
+            start = int(match.group(1))
+            end = int(match.group(2) or end)
+        if body:
+            server.requests.append((start, end) if partial else None)
+
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', server.etag)
+        if server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if partial:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, end, len(payload)))
+        self.end_headers()
+        if not body:
+            return
+
+        data = payload[start:end + 1]
+        with server.lock:
+            truncate = server.truncate > 0
+            server.truncate -= truncate
+        if truncate:
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(data)
+
+
+class TestFetchFile:
+    def setup_method(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      FileHandler)
+        self.server.payload = os.urandom(100000)
+        self.server.etag = '"v1"'
+        self.server.ranges = True
+        self.server.truncate = 0
+        self.server.requests = list()
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/cities.zip'.format(
+            self.server.server_address[1])
+        self.dpath = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.dpath.name, 'cities.zip')
+        self.checksum = hashlib.sha256(self.server.payload).hexdigest()
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.dpath.cleanup()
+
+    def fetch(self, **kwargs):
+        kwargs.setdefault('checksum', self.checksum)
+        kwargs.setdefault('backoff', 0)
+        return fetch.fetch_file(self.url, self.fpath, **kwargs)
+
+    def test_parallel(self, monkeypatch):
+        monkeypatch.setattr(config, 'DATA_MIN_SEGMENT_SIZE', 30000)
+        assert self.fetch(connections=8) == self.checksum
+        with open(self.fpath, 'rb') as fin:
+            assert fin.read() == self.server.payload
+        assert sorted(self.server.requests) == [
+            (0, 24999), (25000, 49999), (50000, 74999), (75000, 99999)]
+        assert os.listdir(self.dpath.name) == ['cities.zip']
+
+    def test_resume(self, monkeypatch):
+        monkeypatch.setattr(config, 'DATA_MIN_SEGMENT_SIZE', 50000)
+        self.server.truncate = 2
+        assert self.fetch(connections=2) == self.checksum
+        requests = sorted(self.server.requests)
+        assert len(requests) == 4
+        assert (25000, 49999) in requests and (75000, 99999) in requests
+
+    def test_resume_after_failure(self):
+        self.server.truncate = 10
+        with pytest.raises(GlobeIndexerError):
+            self.fetch(retries=1)
+        assert not os.path.isfile(self.fpath)
+        assert os.path.getsize(self.fpath + '.part0') == 75000
+
+        # Next attempt only fetches the rest of the file
+        self.server.truncate = 0
+        self.server.requests.clear()
+        assert self.fetch() == self.checksum
+        assert self.server.requests == [(75000, 99999)]
+
+    def test_remote_file_changed(self):
+        self.server.truncate = 1
+        with pytest.raises(GlobeIndexerError):
+            self.fetch(retries=0)
+
+        # Part files of the previous version are discarded
+        self.server.payload = os.urandom(1000)
+        self.server.etag = '"v2"'
+        self.server.requests.clear()
+        checksum = hashlib.sha256(self.server.payload).hexdigest()
+        assert self.fetch(checksum=checksum) == checksum
+        assert self.server.requests == [(0, 999)]
+
+    def test_without_ranges(self):
+        self.server.ranges = False
+        self.server.truncate = 1
+        assert self.fetch() == self.checksum
+        assert self.server.requests == [None, None]
+
+    def test_checksum_mismatch(self):
+        with pytest.raises(GlobeIndexerError):
+            self.fetch(checksum='0' * 64)
+        assert os.listdir(self.dpath.name) == list()
+
+    def test_not_found(self):
+        with pytest.raises(GlobeIndexerError):
+            fetch.fetch_file(self.url + '.missing', self.fpath, backoff=0)
@@ -0,0 +1,65 @@
+# Filename: test_index.py
+
+"""
+Test content of the api/index.py
+"""
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer.api.index import SpatialIndex
+from globe_indexer.error import GlobeIndexerError
+
+
+class TestSpatialIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.index = SpatialIndex()
+        cls.index.load([
+            (1, 42.5, 1.5, 'AD', None),
+            (2, 42.6, 1.6, 'AD', ''),
+            (3, 42.4, 1.7, 'ES', 'AD,FR'),
+            (4, 43.0, 2.0, 'FR', 'FR'),
+            (5, 40.4, -3.7, 'ES', None),
+        ])
+
+    def test_catalogue(self):
+        assert self.index.catalogue() == {'AD': 3, 'ES': 2, 'FR': 2}
+
+    def test_nearest(self):
+        assert [value[1] for value in self.index.nearest(1)] == \
+            [2, 3, 4, 5]
+        assert [value[1] for value in
+                self.index.nearest(1, country_code='AD')] == [2, 3]
+        assert [value[1] for value in
+                self.index.nearest(1, country_code='FR')] == [3, 4]
+        assert self.index.nearest(1, country_code='ID') == list()
+
+        with pytest.raises(GlobeIndexerError):
+            self.index.nearest(0)
+
+    def test_total(self):
+        assert self.index.total(1) == 4
+        assert self.index.total(1, country_code='AD') == 2
+        assert self.index.total(3, country_code='AD') == 2
+        assert self.index.total(3, country_code='FR') == 1
+        assert self.index.total(5, country_code='FR') == 2
+        assert self.index.total(5, country_code='ID') == 0
+
+    def test_update(self):
+        index = SpatialIndex()
+        index.load([
+            (1, 42.5, 1.5, 'AD', None),
+            (2, 42.6, 1.6, 'AD', ''),
+            (3, 42.4, 1.7, 'ES', 'AD,FR'),
+            (4, 43.0, 2.0, 'FR', 'FR'),
+        ])
+        index.update([(2, 42.45, 1.55, 'AD', None), (5, 40.4, -3.7, 'PT',
+                                                     None)],
+                     [(2, 42.6, 1.6, 'AD', ''), (3, 42.4, 1.7, 'ES',
+                                                 'AD,FR')])
+        assert index.catalogue() == {'AD': 2, 'FR': 1, 'PT': 1}
+        assert [value[1] for value in index.nearest(1)] == [2, 4, 5]
+        assert index.reverse(42.4, 1.7, country_code='ES') == list()
+        assert sorted(index.points().ids.tolist()) == [1, 2, 4, 5]
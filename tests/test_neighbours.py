@@ -0,0 +1,100 @@
+# Filename: test_neighbours.py
+
+"""
+Test content of the neighbours.py
+"""
+
+# Standard libraries
+import random
+
+# NumPy
+import numpy as np
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import neighbours
+from globe_indexer.distance import PointArray
+from globe_indexer.error import GlobeIndexerError
+from globe_indexer.spatial import KDTree
+
+
+class TestNeighbourTable:
+    @classmethod
+    def setup_class(cls):
+        generator = random.Random(3000)
+        cls.rows = [(index * 2 + 1, generator.uniform(-60, 60),
+                     generator.uniform(-180, 180))
+                    for index in range(1500)]
+        cls.points = PointArray.from_rows(cls.rows)
+        cls.table = neighbours.NeighbourTable()
+        cls.table.compute(cls.points, k=8, processes=2)
+
+    def assert_matches(self, table, rows, limit=8):
+        tree = KDTree(rows)
+        for point_id, latitude, longitude in rows[::25]:
+            expected = tree.nearest(latitude, longitude, k=limit,
+                                    exclude=point_id)
+            results = table.lookup(point_id, limit)
+            assert [value[1] for value in results] == \
+                [value[1] for value in expected]
+            # Same distances as the tree, to the last digit
+            assert [value[0] for value in results] == \
+                [value[0] for value in expected]
+
+    def test_lookup(self):
+        assert len(self.table) == len(self.rows)
+        self.assert_matches(self.table, self.rows)
+        self.assert_matches(self.table, self.rows, limit=3)
+
+        assert self.table.lookup(0, 3) is None
+        assert self.table.lookup(self.rows[0][0], 9) is None
+        assert self.table.lookup(self.rows[0][0], None) is None
+        assert neighbours.NeighbourTable().lookup(1, 1) is None
+
+    def test_padding(self):
+        table = neighbours.NeighbourTable()
+        table.compute(PointArray.from_rows(self.rows[:3]), k=5, processes=1)
+        assert len(table.lookup(self.rows[0][0], 5)) == 2
+
+        with pytest.raises(GlobeIndexerError):
+            table.compute(self.points, k=0, processes=1)
+
+    def test_save_load(self, tmpdir):
+        self.table.save(str(tmpdir))
+        table = neighbours.NeighbourTable()
+        table.load(str(tmpdir))
+        assert table.k == 8
+        assert isinstance(table._neighbours, np.memmap)
+        self.assert_matches(table, self.rows)
+
+        table.unload()
+        assert not table.loaded
+        assert table.lookup(self.rows[0][0], 1) is None
+
+    def test_update(self, tmpdir):
+        self.table.save(str(tmpdir))
+        table = neighbours.NeighbourTable()
+        table.load(str(tmpdir))
+        assert table.update(self.points, k=8) == 0
+
+        # Remove, move and add a few points
+        rows = self.rows[10:]
+        rows[5] = (rows[5][0], 0.0, 0.0)
+        rows.append((10 ** 6, 10.0, 10.0))
+        points = PointArray.from_rows(rows)
+        count = table.update(points, k=8, processes=1)
+        assert 0 < count < len(rows) // 4
+
+        expected = neighbours.NeighbourTable()
+        expected.compute(points, k=8, processes=1)
+        np.testing.assert_array_equal(table._neighbours, expected._neighbours)
+        self.assert_matches(table, rows)
+
+        # Another number of neighbours needs a full computation
+        assert table.update(points, k=4, processes=1) == len(rows)
+
+        # So does a table saved in single precision
+        table._distances = table._distances.astype(np.float32)
+        assert table.update(points, k=4, processes=1) == len(rows)
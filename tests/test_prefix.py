@@ -0,0 +1,87 @@
+# Filename: test_prefix.py
+
+"""
+Test content of the prefix.py
+"""
+
+# Globe Indexer
+from globe_indexer import prefix
+
+
+class TestPrefixIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.index = prefix.PrefixIndex()
+        cls.rows = [
+            (1, ['New York', 'NYC', 'New York City'], 8000000),
+            (2, ['Newark'], 280000),
+            (3, ['New Haven'], 130000),
+            (4, ['Newcastle', 'Newcastle upon Tyne'], 280000),
+            (5, ['Mumbai', 'Bombay'], 12000000),
+            (6, ['Newport', ''], None),
+            (7, ['München', 'Muenchen'], 1500000),
+        ]
+        cls.index.load(cls.rows)
+
+    def test_search(self):
+        assert self.index.search('new', 3) == [
+            ('New York', 1), ('Newark', 2), ('Newcastle', 4)]
+        assert self.index.search('NEW', 10)[-1] == ('Newport', 6)
+        assert self.index.search('new y', 5) == [('New York', 1)]
+        assert self.index.search('bom', 5) == [('Bombay', 5)]
+        assert self.index.search('munc', 5) == [('München', 7)]
+        assert self.index.search('MÜE', 5) == [('Muenchen', 7)]
+        assert self.index.search('nowhere', 5) == list()
+        assert self.index.search('', 5) == list()
+        assert self.index.search('new', 0) == list()
+
+    def test_unique_ids(self):
+        results = self.index.search('n', 10)
+        ids = [value[1] for value in results]
+        assert len(ids) == len(set(ids)) == 5
+        assert 7 not in ids
+
+    def test_memory_usage(self):
+        usage = self.index.memory_usage()
+        assert usage['names'] == len(self.index) == 12
+        assert usage['bytes'] > 0
+        assert usage['bytes_per_name'] == usage['bytes'] / 12
+
+    def test_open(self, tmpdir):
+        dpath = str(tmpdir)
+        assert prefix.write_prefix_index(
+            dpath, lambda: iter([self.rows[:3], [], self.rows[3:]])) == 12
+        index = prefix.PrefixIndex()
+        index.open(dpath)
+        assert len(index) == len(self.index)
+        for value, limit in (('new', 3), ('NEW', 10), ('n', 10), ('bom', 5),
+                             ('MÜE', 5), ('nowhere', 5), ('', 5), ('z', 1)):
+            assert index.search(value, limit) == \
+                self.index.search(value, limit), value
+
+        prefix.write_prefix_index(dpath, lambda: iter(()))
+        index.open(dpath)
+        assert index.search('a', 5) == list()
+
+    def test_empty(self):
+        index = prefix.PrefixIndex()
+        index.load([])
+        assert index.search('a', 5) == list()
+        assert index.memory_usage()['bytes_per_name'] == 0.0
+
+    def test_update(self):
+        index = prefix.PrefixIndex()
+        index.load([
+            (1, ['New York', 'NYC'], 8000000),
+            (2, ['Newark'], 280000),
+            (3, ['New Haven'], 130000),
+        ])
+        index.update([(2, ['Newark', 'Newark-on-Trent'], 10000000),
+                      (4, ['Newbury', 'Abingdon'], 40000)],
+                     [(2, ['Newark'], 280000), (3, ['New Haven'], 130000)])
+        assert len(index) == 6
+        assert index.search('new', 5) == [('Newark', 2), ('New York', 1),
+                                          ('Newbury', 4)]
+        assert index.search('new h', 5) == list()
+        assert index.search('a', 5) == [('Abingdon', 4)]
+        assert index.search('nyc', 5) == [('NYC', 1)]
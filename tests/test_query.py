@@ -7,8 +7,15 @@ Test content of the api/query.py
 # pytest
 import pytest
 
+# SQLAlchemy
+from sqlalchemy import event
+
 # Globe Indexer
+from globe_indexer import utils
 from globe_indexer.api import query
+from globe_indexer.api.database import build_indexes
+from globe_indexer.api.index import query_cache
+from globe_indexer.api.models import GeoName, db
 from globe_indexer.error import GlobeIndexerError
 
 # Test
@@ -16,10 +23,107 @@ from . import BaseTest
 
 
 class TestQuery(BaseTest):
+    def test_autocomplete(self):
+        results = query.autocomplete_query('e')
+        assert [city.id for _, city in results] == \
+            [3040051, 3040686, 3039154]
+        assert [name for name, _ in results] == \
+            ["Ehskal'des-Ehndzhordani", 'Ehnkam', 'Ehl Tarter']
+
+        results = query.autocomplete_query('E', limit=1)
+        assert [city.id for _, city in results] == [3040051]
+
+        assert query.autocomplete_query('Sant Julia d')[0][1].id == 3039163
+        assert query.autocomplete_query('Nowhere') == list()
+
+    def test_batch_proximity(self):
+        origins = [3039678, (42.55623, 1.53319), 3039678, 3040051]
+        results = query.batch_proximity_query(origins, limit=3)
+        expected = query.proximity_query(3039678, limit=3)
+        assert [value[1] for value in results[0]] == \
+            [value[1] for value in expected]
+        assert [value[0] for value in results[0]] == \
+            pytest.approx([value[0] for value in expected])
+        assert results[1][0] == (0.0, 3039678)
+        assert results[2] == results[0]
+        assert [value[1] for value in results[3]] == \
+            [value[1] for value in query.proximity_query(3040051, limit=3)]
+
+        assert query.batch_proximity_query(origins, country_code='ID') == \
+            [list()] * len(origins)
+        with pytest.raises(GlobeIndexerError):
+            query.batch_proximity_query([3039678, -1])
+
+    def test_cache(self):
+        city_id = 3039678
+        results = query.proximity_query(city_id, limit=3)
+        hits = query_cache.hits
+        assert query.proximity_query(city_id, limit=2) == results[:2]
+        assert query_cache.hits == hits + 1
+
+        # A greater limit can't be answered from the cached result
+        assert len(query.proximity_query(city_id, limit=5)) == 5
+        assert query_cache.hits == hits + 1
+
+        # Nor are listings of every city cached
+        misses = query_cache.misses
+        results = query.proximity_query(city_id)
+        assert query.proximity_query(city_id) == results
+        assert query_cache.hits == hits + 1
+        assert query_cache.misses == misses
+        # Or limits reaching every city
+        results = query.proximity_query(city_id, limit=100)
+        assert query.proximity_query(city_id, limit=100) == results
+        assert query_cache.hits == hits + 1
+
+        results = query.lexical_id_query(('El', 'Tarter'))
+        results.append(0)
+        assert query.lexical_id_query(('El', 'Tarter')) == [3039154]
+        assert query_cache.hits == hits + 2
+
+        generation = query_cache.generation
+        build_indexes(db)
+        assert query_cache.generation == generation + 1
+        assert query.lexical_id_query(('El', 'Tarter')) == [3039154]
+        assert query_cache.hits == hits + 2
+
     def test_country_codes(self):
         codes = query.country_code_query()
         assert [('', ''), ('AD', 'AD - Andorra')] == codes
 
+        # Served from memory
+        statements = list()
+
+        def count_statement(*_):
+            statements.append(None)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        assert query.country_code_query() == codes
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        assert statements == list()
+
+    def test_city_query(self):
+        city_ids = [3040132, 3039154, 0, 3039163]
+        cities = [city for city in map(GeoName.query.get, city_ids)
+                  if city is not None]
+        query.city_query([])
+
+        statements = list()
+
+        def count_statement(*_):
+            statements.append(None)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        results = query.city_query(city_ids)
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        assert statements == list()
+
+        assert results == cities
+        assert [city.json(compact=False) for city in results] == \
+            [city.json(compact=False) for city in cities]
+        assert [city.variable_name for city in results] == \
+            [city.variable_name for city in cities]
+
     def test_lexical(self):
         results = query.lexical_query(('El',))
         assert len(results) == 0
@@ -28,6 +132,25 @@ class TestQuery(BaseTest):
         assert len(results) == 1
         assert results[0].name == 'El Tarter'
 
+    def test_lexical_alternate_names(self):
+        for names, city_id in ((('escaldes',), 3040051),
+                               (('sant', 'julia', 'de', 'loria'), 3039163),
+                               (('la-massana',), 3040132),
+                               (('АРИНСАЛ',), 3041519)):
+            results = query.lexical_query(names)
+            assert [city.id for city in results] == [city_id], names
+
+        # Alternate names are only matched without wildcard
+        assert query.lexical_query(('escaldes*',)) == list()
+
+    def test_lexical_matches_ilike(self):
+        for names in (('*a*',), ('*de',), ('la*',), ('*',), ('sant*',),
+                      ('*ca*', '*a')):
+            value = utils.get_query_string(names)
+            expected = GeoName.query.filter(GeoName.name.ilike(value))
+            assert query.lexical_query(names) == \
+                expected.order_by(GeoName.id).all(), value
+
     def test_proximity(self):
         city_id = 3039678
         results = query.proximity_query(city_id)
@@ -41,3 +164,49 @@ class TestQuery(BaseTest):
 
         with pytest.raises(GlobeIndexerError):
             query.proximity_query(-1)
+
+    def test_proximity_limit(self):
+        city_id = 3039678
+        results = query.proximity_query(city_id)
+        for country_code in (None, 'AD'):
+            values = query.proximity_query(city_id, country_code=country_code,
+                                           limit=3)
+            assert [value[1] for value in values] == \
+                [value[1] for value in results[:3]]
+            for value, other in zip(values, results):
+                assert value[0] == pytest.approx(other[0])
+
+    def test_radius(self):
+        city_id = 3039678
+        city = GeoName.query.get(city_id)
+        expected = [value for value in query.proximity_query(city_id)
+                    if value[0] <= 6]
+        results = query.radius_query(city.latitude, city.longitude, 6,
+                                     exclude=city_id)
+        assert [value[1] for value in results] == \
+            [value[1] for value in expected]
+        assert results[0][0] == pytest.approx(expected[0][0])
+
+        results = query.radius_query(city.latitude, city.longitude, 0)
+        assert results == [(0.0, city_id)]
+        assert query.radius_query(city.latitude, city.longitude, 100,
+                                  country_code='ID') == list()
+
+    def test_reverse(self):
+        assert query.reverse_query(42.55623, 1.53319) == [(0.0, 3039678)]
+
+        results = query.reverse_query(42.556, 1.533, limit=3)
+        assert [value[1] for value in results] == \
+            [3039678] + [value[1] for value in
+                         query.proximity_query(3039678, limit=2)]
+        assert len(query.reverse_query(0, 0, limit=100)) == 9
+        assert query.reverse_query(0, 0, country_code='ID') == list()
+
+    def test_proximity_total(self):
+        city_id = 3039678
+        assert query.proximity_total(city_id) == 8
+        assert query.proximity_total(city_id, country_code='AD') == 8
+        assert query.proximity_total(city_id, country_code='ID') == 0
+
+        with pytest.raises(GlobeIndexerError):
+            query.proximity_total(-1)
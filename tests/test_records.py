@@ -0,0 +1,67 @@
+# Filename: test_records.py
+
+"""
+Test content of the api/records.py
+"""
+
+# Standard libraries
+import pickle
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer.api import records
+
+
+ROWS = [
+    (3039163, 'Sant Julià de Lòria', 'Sant Julia de Loria',
+     'San Julia,Sant Julia de Loria', 42.46372, 1.49129, 'AD', None, 8022),
+    (3040051, 'les Escaldes', 'les Escaldes', None, 42.50729, 1.53414, 'AD',
+     'FR,ES', None),
+    (3041563, 'Andorra la Vella', 'Andorra la Vella', None, 42.50779,
+     1.52109, 'AD', None, 20430),
+]
+
+
+class TestCityStore:
+    def test_select(self):
+        store = records.CityStore()
+        assert store.select([3039163]) == list()
+        store.load(ROWS)
+        assert len(store) == 3
+
+        results = store.select([3041563, 0, 3039163, 9999999, 3041563])
+        assert [city.id for city in results] == [3041563, 3039163, 3041563]
+        assert results[0].latitude == pytest.approx(42.50779)
+        assert results[1].population == 8022
+        assert store.select(set()) == list()
+
+        city = store.select([3040051])[0]
+        assert city.population is None
+        assert city.variable_name == 'lesEscaldes_3040051'
+        assert city.json() == {'id': 3040051, 'name': 'les Escaldes',
+                               'latitude': 42.50729, 'longitude': 1.53414,
+                               'country_code': 'AD'}
+        assert city.json(compact=False)['cc2'] == ['FR', 'ES']
+        assert 'population' not in city.json(compact=False)
+
+    def test_memory_usage(self):
+        store = records.CityStore()
+        assert store.memory_usage()['bytes_per_city'] == 0.0
+        store.load(ROWS)
+        usage = store.memory_usage()
+        assert usage['cities'] == 3
+        assert usage['bytes'] > 0
+
+
+class TestCity:
+    def test_slots(self):
+        city = records.City(*ROWS[2])
+        with pytest.raises(AttributeError):
+            city.elevation = 1
+        assert not hasattr(city, '__dict__')
+        assert city == records.City(*ROWS[2])
+        assert len({city, records.City(*ROWS[2])}) == 1
+        assert repr(city) == '<City 3041563>'
+        assert pickle.loads(pickle.dumps(city)).name == 'Andorra la Vella'
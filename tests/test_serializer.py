@@ -0,0 +1,56 @@
+# Filename: test_serializer.py
+
+"""
+Test content of the serializer.py
+"""
+
+# Standard libraries
+import json
+
+# Flask
+import flask
+
+# Globe Indexer
+from globe_indexer import serializer
+
+
+class TestSerializer:
+    def test_dumps(self, monkeypatch):
+        value = {'name': 'Sant Julià de Lòria', 'latitude': 42.46372,
+                 'ids': [1, 2], 'population': None}
+        for backend in (serializer.orjson, None):
+            monkeypatch.setattr(serializer, 'orjson', backend)
+            result = serializer.dumps(value)
+            assert json.loads(result) == value
+            assert 'Julià' in result
+            assert ' ' not in result.replace('Sant Julià de Lòria', '')
+
+    def test_dumps_object(self):
+        result = serializer.dumps_object({'distance': 1.5},
+                                         city='{"id":1}', other='[]')
+        assert json.loads(result) == {'distance': 1.5, 'city': {'id': 1},
+                                      'other': []}
+        assert serializer.dumps_object({}) == '{}'
+        assert json.loads(serializer.dumps_object({}, city='{}')) == \
+            {'city': {}}
+
+    def test_json_response(self):
+        app = flask.Flask(__name__)
+        app.config.from_object('config.TestConfig')
+        with app.app_context():
+            response = serializer.json_response('{"a":1}', status=201)
+        assert response.status_code == 201
+        assert response.mimetype == 'application/json'
+        assert json.loads(response.data.decode()) == {'a': 1}
+
+
+class TestFragmentStore:
+    def test_select(self):
+        store = serializer.FragmentStore()
+        assert store.loaded is False
+        store.load([(1, {'id': 1}), (2, {'id': 2, 'name': 'B'})])
+        assert len(store) == 2
+        assert store.get(2) == serializer.dumps({'id': 2, 'name': 'B'})
+        assert store.get(3) is None
+        assert store.select([2, 3, 1]) == [(2, store.get(2)),
+                                           (1, store.get(1))]
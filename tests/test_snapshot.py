@@ -0,0 +1,69 @@
+# Filename: test_snapshot.py
+
+"""
+Test content of the snapshot.py
+"""
+
+# Standard libraries
+import os
+
+# NumPy
+import numpy as np
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import snapshot
+from globe_indexer.error import GlobeIndexerError
+
+
+class TestSnapshot:
+    rows = [
+        (1, 'Zürich', 'Zurich', 'Zurigo,Zurich', 47.36667, 8.55, 'CH', None,
+         341730),
+        (7, 'Andorra la Vella', 'Andorra la Vella', None, 42.50779, 1.52109,
+         'AD', 'ES,FR', None),
+        (9, 'Москва', 'Moscow', 'Moskva', 55.75222, 37.61556, 'RU', None,
+         10381222),
+    ]
+
+    def test_write_open(self, tmpdir):
+        fpath = str(tmpdir.join('cities.snapshot'))
+        assert snapshot.write_snapshot(fpath, self.rows) == 3
+        assert not os.path.exists(fpath + '.tmp')
+
+        value = snapshot.Snapshot()
+        assert not value.loaded
+        value.open(fpath)
+        assert len(value) == 3
+        assert list(value.rows()) == [snapshot.Row(*row) for row in self.rows]
+
+        assert value.column('latitude').dtype == np.float64
+        assert not value.column('id').flags['WRITEABLE']
+        assert value.string('name', 2) == 'Москва'
+        assert value.string('cc2', 0) == ''
+        assert value.position(7) == 1
+        assert value.position(8) is None
+
+        value.close()
+        assert not value.loaded
+        assert len(value) == 0
+
+    def test_empty(self, tmpdir):
+        fpath = str(tmpdir.join('cities.snapshot'))
+        assert snapshot.write_snapshot(fpath, []) == 0
+        value = snapshot.Snapshot()
+        value.open(fpath)
+        assert list(value.rows()) == list()
+        assert value.position(1) is None
+
+    def test_invalid(self, tmpdir):
+        fpath = str(tmpdir.join('cities.snapshot'))
+        with pytest.raises(GlobeIndexerError):
+            snapshot.write_snapshot(fpath, self.rows[::-1])
+
+        with open(fpath, 'wb') as fout:
+            fout.write(b'not a snapshot file')
+        with pytest.raises(GlobeIndexerError):
+            snapshot.Snapshot().open(fpath)
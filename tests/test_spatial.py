@@ -0,0 +1,151 @@
+# Filename: test_spatial.py
+
+"""
+Test content of the spatial.py
+"""
+
+# Standard libraries
+import random
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer import spatial, utils
+
+
+class TestKDTree:
+    @classmethod
+    def setup_class(cls):
+        generator = random.Random(1000)
+        cls.points = [(index, generator.uniform(-90, 90),
+                       generator.uniform(-180, 180))
+                      for index in range(2000)]
+        cls.tree = spatial.KDTree(cls.points, leaf_size=8)
+
+    def brute_force(self, latitude, longitude, exclude=None):
+        return sorted((utils.get_distance(longitude, latitude, lon, lat),
+                       point_id)
+                      for point_id, lat, lon in self.points
+                      if point_id != exclude)
+
+    def test_len(self):
+        assert len(self.tree) == len(self.points)
+
+    def test_nearest(self):
+        for latitude, longitude in ((0, 0), (42.5, 1.5), (-89.9, 179.9),
+                                    (10, -179.99), (90, 0)):
+            expected = self.brute_force(latitude, longitude)
+            for k in (1, 5, 50):
+                results = self.tree.nearest(latitude, longitude, k=k)
+                assert [value[1] for value in results] == \
+                    [value[1] for value in expected[:k]]
+                for value, other in zip(results, expected):
+                    assert value[0] == pytest.approx(other[0], abs=1e-6)
+
+    def test_nearest_exclude(self):
+        point_id, latitude, longitude = self.points[42]
+        results = self.tree.nearest(latitude, longitude, k=3,
+                                    exclude=point_id)
+        expected = self.brute_force(latitude, longitude, exclude=point_id)
+        assert [value[1] for value in results] == \
+            [value[1] for value in expected[:3]]
+
+    def test_nearest_all(self):
+        results = self.tree.nearest(12.3, 45.6)
+        assert len(results) == len(self.points)
+        assert results == sorted(results)
+
+        assert self.tree.nearest(12.3, 45.6, k=0) == list()
+
+    def test_nearest_many(self):
+        origins = [(0, 0), (42.5, 1.5), (-89.9, 179.9), (42.5, 1.5)]
+        excludes = [None, None, None, 42]
+        small = spatial.KDTree(self.points[:500])
+        for tree in (self.tree, small):
+            results = tree.nearest_many([value[0] for value in origins],
+                                        [value[1] for value in origins],
+                                        k=5, excludes=excludes)
+            assert len(results) == len(origins)
+            for values, origin, exclude in zip(results, origins, excludes):
+                expected = tree.nearest(origin[0], origin[1], k=5,
+                                        exclude=exclude)
+                assert [value[1] for value in values] == \
+                    [value[1] for value in expected]
+                for value, other in zip(values, expected):
+                    assert value[0] == pytest.approx(other[0], abs=1e-6)
+
+        assert self.tree.nearest_many([0], [0], k=0) == [list()]
+
+    def test_empty(self):
+        tree = spatial.KDTree([])
+        assert len(tree) == 0
+        assert tree.nearest(0, 0, k=5) == list()
+        assert tree.nearest_many([0, 1], [0, 1], k=5) == [list(), list()]
+
+
+class TestGrid:
+    @classmethod
+    def setup_class(cls):
+        generator = random.Random(1000)
+        cls.rows = list()
+        for index in range(3000):
+            country_code = generator.choice(['AD', 'FR', 'ES', None])
+            cc2 = 'FR,ES' if index % 50 == 0 else None
+            # Dense cluster around Andorra
+            if index % 3 == 0:
+                latitude = 42.5 + generator.uniform(-0.3, 0.3)
+                longitude = 1.5 + generator.uniform(-0.3, 0.3)
+            else:
+                latitude = generator.uniform(-90, 90)
+                longitude = generator.uniform(-180, 180)
+            cls.rows.append((index, latitude, longitude, country_code, cc2))
+
+    def partition(self, code):
+        return [(point_id, latitude, longitude)
+                for point_id, latitude, longitude, country_code, cc2
+                in self.rows
+                if code is None or code == country_code or
+                code in (cc2 or '').split(',')]
+
+    def test_write_grid(self, tmpdir):
+        dpath = str(tmpdir)
+        assert spatial.write_grid(
+            dpath, lambda: iter([self.rows[:1000], self.rows[1000:]]),
+            cell_size=2.0) == len(self.rows)
+        grid = spatial.Grid(dpath)
+        assert grid.codes == ['AD', 'ES', 'FR']
+        assert grid.locations[50] == self.rows[50][1:4]
+        assert grid.alternate_codes[50] == {'FR', 'ES'} - {self.rows[50][3]}
+        with pytest.raises(KeyError):
+            grid.locations[len(self.rows)]
+
+        trees = grid.trees()
+        assert set(trees) == {None, 'AD', 'ES', 'FR'}
+        for code, tree in trees.items():
+            points = self.partition(code)
+            expected = spatial.KDTree(points)
+            assert len(tree) == len(points)
+            assert sorted(tree.points.ids.tolist()) == \
+                [point[0] for point in points]
+            for latitude, longitude, exclude in ((42.5, 1.5, None),
+                                                 (0, 0, None),
+                                                 (-89.9, 179.9, None),
+                                                 (10, -179.99, 3)):
+                for k in (1, 7, 60):
+                    results = tree.nearest(latitude, longitude, k=k,
+                                           exclude=exclude)
+                    values = expected.nearest(latitude, longitude, k=k,
+                                              exclude=exclude)
+                    assert [value[1] for value in results] == \
+                        [value[1] for value in values]
+                    for value, other in zip(results, values):
+                        assert value[0] == pytest.approx(other[0], abs=1e-6)
+
+        tree = trees[None]
+        results = tree.nearest_many([42.5, 0], [1.5, 0], k=3,
+                                    excludes=[0, None])
+        assert results == [tree.nearest(42.5, 1.5, k=3, exclude=0),
+                           tree.nearest(0, 0, k=3)]
+        assert len(tree.nearest(0, 0)) == len(self.rows)
+        assert tree.nearest(0, 0, k=0) == list()
@@ -0,0 +1,178 @@
+# Filename: test_startup.py
+
+"""
+Test content of the api/startup.py
+"""
+
+# Standard libraries
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+# Flask
+import flask
+
+# pytest
+import pytest
+
+# Globe Indexer
+from globe_indexer.api.controllers import api as api_blueprint
+from globe_indexer.api.database import initialize_db
+from globe_indexer.api.index import city_snapshot
+from globe_indexer.api.models import GeoName, db
+from globe_indexer.api.startup import Startup
+from globe_indexer.error import GlobeIndexerError
+
+# Test
+from . import BaseTest
+
+
+class TestStartup(BaseTest):
+    def setUp(self):
+        super(TestStartup, self).setUp()
+        self.input_fpath = os.path.join(os.path.dirname(__file__), 'data',
+                                        'geoname_example.txt')
+        self.dpath = tempfile.mkdtemp()
+        self.db_fpath = os.path.join(self.dpath, 'globe_indexer.db')
+        # The session is scoped by thread rather than by application
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        shutil.rmtree(self.dpath)
+        super(TestStartup, self).tearDown()
+
+    def create_startup(self, **kwargs):
+        """
+        Create an application on the database file, with its startup
+
+        :returns: instance of :class:`api.startup.Startup`
+        """
+        app = flask.Flask(__name__)
+        app.config.from_object('config.TestConfig')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + self.db_fpath
+        app.config.update(kwargs)
+        app.register_blueprint(api_blueprint)
+        db.init_app(app)
+        return Startup(app, self.input_fpath)
+
+    def get_json(self, startup, path):
+        """
+        Send a request to the application of the startup
+
+        :returns: tuple (status code, payload)
+        """
+        response = startup.app.test_client().get(path)
+        return response.status_code, json.loads(response.data.decode())
+
+    def test_background(self):
+        startup = self.create_startup()
+        status, payload = self.get_json(startup, '/health')
+        assert status == 503
+        assert payload['phase'] == 'starting'
+        assert payload['message'] == 'API is starting'
+        status, payload = self.get_json(startup, '/3039678')
+        assert status == 503
+        assert payload['error']['type'] == 'NOT_READY'
+
+        with mock.patch('globe_indexer.api.startup.initialize_db',
+                        wraps=initialize_db) as load:
+            startup.start()
+            with pytest.raises(GlobeIndexerError):
+                startup.start()
+            assert startup.wait(timeout=60)
+        # No worker process is forked from the thread
+        assert load.call_args[1]['processes'] == 1
+        status, payload = self.get_json(startup, '/health')
+        assert status == 200
+        assert payload['phase'] == 'ready'
+        assert payload['message'] == 'API is available'
+        status, payload = self.get_json(startup, '/3039678')
+        assert status == 200
+        assert payload['name'] == 'Ordino'
+        assert os.path.isfile(self.db_fpath + '.startup')
+
+    def test_attach(self):
+        self.create_startup().run()
+
+        # The data prepared by the first startup is reused
+        startup = self.create_startup()
+        with mock.patch('globe_indexer.api.startup.initialize_db') as load:
+            startup.run()
+        assert not load.called
+        assert startup.ready
+        status, payload = self.get_json(startup, '/lexical?cityName=Ordino')
+        assert status == 200
+        assert payload['total'] == 1
+
+    def test_reload(self):
+        snapshot_fpath = os.path.join(self.dpath, 'cities.snapshot')
+        startup = self.create_startup(SNAPSHOT_PATH=snapshot_fpath)
+        startup.run()
+        with startup.app.app_context():
+            GeoName.query.delete()
+            db.session.commit()
+            db.session.remove()
+        city_snapshot.close()
+
+        # The emptied database is loaded again, despite the snapshot
+        startup = self.create_startup(SNAPSHOT_PATH=snapshot_fpath)
+        startup.run()
+        status, payload = self.get_json(startup, '/radius/3039678?r=10')
+        assert status == 200
+        assert payload['cities']
+        city_snapshot.close()
+
+    def test_scale_sync(self):
+        updates_dpath = os.path.join(os.path.dirname(__file__), 'data',
+                                     'updates')
+        startup = self.create_startup(
+            CITY_MIN_POPULATION=None,
+            SCALE_INDEX_PATH=os.path.join(self.dpath, 'scale'),
+            SNAPSHOT_PATH=os.path.join(self.dpath, 'cities.snapshot'),
+            UPDATES_PATH=updates_dpath)
+        startup.run()
+
+        # Every modified place is kept, whatever its feature or population
+        with startup.app.app_context():
+            assert GeoName.query.get(3039604).population == 500
+            assert GeoName.query.get(3038999).feature_class == 'T'
+            db.session.remove()
+        status, payload = self.get_json(startup, '/3039604')
+        assert status == 200
+        assert payload['population'] == 500
+        status, payload = self.get_json(startup, '/3038999')
+        assert status == 200
+        assert payload['name'] == 'Pic de Coma Pedrosa'
+        city_snapshot.close()
+
+    def test_waiting(self):
+        lock_fpath = os.path.join(self.dpath, 'startup.lock')
+        startup = self.create_startup(STARTUP_LOCK_PATH=lock_fpath)
+        with open(lock_fpath, mode='a+') as fobj:
+            # Another process is preparing the data
+            fcntl.flock(fobj, fcntl.LOCK_EX)
+            startup.start()
+            deadline = time.time() + 10
+            while startup.phase != 'waiting' and time.time() < deadline:
+                time.sleep(0.01)
+            assert startup.phase == 'waiting'
+            fcntl.flock(fobj, fcntl.LOCK_UN)
+        assert startup.wait(timeout=60)
+
+    def test_failed(self):
+        startup = self.create_startup()
+        with mock.patch('globe_indexer.api.startup.initialize_db',
+                        side_effect=GlobeIndexerError('cannot download')):
+            with pytest.raises(GlobeIndexerError):
+                startup.run()
+        assert not startup.ready
+        status, payload = self.get_json(startup, '/health')
+        assert status == 503
+        assert payload['phase'] == 'failed'
+        assert payload['error'] == 'cannot download'
+        assert payload['message'] == 'API failed to start'
@@ -0,0 +1,58 @@
+# Filename: test_tokens.py
+
+"""
+Test content of the tokens.py
+"""
+
+# Globe Indexer
+from globe_indexer import prefix, tokens
+
+
+class TestTokenIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.index = tokens.TokenIndex()
+        cls.index.load([
+            (2643743, ['London', 'Londres', 'Лондон']),
+            (6058560, ['London', 'London Ontario']),
+            (2867714, ['München', 'Munich', 'Muenchen', 'Monaco di Baviera']),
+            (1275339, ['Mumbai', 'Bombay', '']),
+        ])
+
+    def test_search(self):
+        assert len(self.index) == 10
+        assert self.index.search('Bombay') == (1275339,)
+        assert self.index.search('muenchen') == (2867714,)
+        assert self.index.search('MUNCHEN') == (2867714,)
+        assert self.index.search('monaco  di baviera') == (2867714,)
+        assert self.index.search('лондон') == (2643743,)
+        assert self.index.search('london') == (2643743, 6058560)
+        assert self.index.search('Lond') == tuple()
+        assert self.index.search('') == tuple()
+
+    def test_open(self, tmpdir):
+        dpath = str(tmpdir)
+        prefix.write_prefix_index(dpath, lambda: iter([[
+            (1275339, ['Mumbai', 'Bombay', ''], None),
+            (2643743, ['London', 'Londres', 'Лондон'], None),
+            (2867714, ['München', 'Munich', 'Muenchen'], None),
+            (6058560, ['London', 'London Ontario'], None),
+        ]]))
+        index = tokens.TokenIndex()
+        index.open(dpath)
+        assert len(index) == 9
+        assert index.search('london') == (2643743, 6058560)
+        assert index.search('MUNCHEN') == (2867714,)
+        assert index.search('Lond') == tuple()
+        assert index.search('zurich') == tuple()
+
+    def test_update(self):
+        index = tokens.TokenIndex()
+        index.load([(1, ['London']), (2, ['London', 'London Ontario'])])
+        index.update([(1, ['London', 'Londinium']), (3, ['Paris'])],
+                     [(1, ['London']), (2, ['London', 'London Ontario'])])
+        assert index.search('london') == (1,)
+        assert index.search('londinium') == (1,)
+        assert index.search('paris') == (3,)
+        assert index.search('london ontario') == tuple()
+        assert len(index) == 3
@@ -0,0 +1,89 @@
+# Filename: test_trigram.py
+
+"""
+Test content of the trigram.py
+"""
+
+# Globe Indexer
+from globe_indexer import trigram
+
+
+class TestTrigram:
+    def test_like_to_regex(self):
+        regex = trigram.like_to_regex('%new%y_rk')
+        assert regex.fullmatch('west new york')
+        assert regex.fullmatch('newyork')
+        assert not regex.fullmatch('new york city')
+        assert trigram.like_to_regex('a.b').fullmatch('axb') is None
+
+    def test_pattern_trigrams(self):
+        assert trigram.pattern_trigrams('paris') == \
+            trigram.trigrams('paris')
+        assert trigram.pattern_trigrams('%york%') == {'yor', 'ork'}
+        assert trigram.pattern_trigrams('jak%') == {'\x02j', '\x02ja',
+                                                    'jak'}
+        assert trigram.pattern_trigrams('%a') == {'a\x03'}
+        assert trigram.pattern_trigrams('%a%') == set()
+
+
+class TestTrigramIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.names = ['New York', 'York', 'West New York', 'Yorkton',
+                     'Newark', 'Paris', 'Jakarta', 'Jakobstad', 'A']
+        cls.index = trigram.TrigramIndex()
+        cls.index.load(enumerate(cls.names))
+
+    def expected(self, pattern):
+        regex = trigram.like_to_regex(pattern.lower())
+        return [index for index, name in enumerate(self.names)
+                if regex.fullmatch(name.lower())]
+
+    def test_search(self):
+        assert len(self.index) == len(self.names)
+        for pattern in ('%york%', 'york', 'York%', '%york', 'new%york',
+                        'jak%', '%a%', 'a', '%', 'par_s', 'nowhere', '_',
+                        '%w%y%', 'a%k%n', 'j%', '%s', '%'):
+            assert self.index.search(pattern) == self.expected(pattern), \
+                pattern
+
+    def test_open(self, tmpdir):
+        rows = list(enumerate(self.names))
+        dpath = str(tmpdir)
+        assert trigram.write_trigram_index(
+            dpath, lambda: iter([rows[:4], rows[4:]])) == len(self.names)
+        index = trigram.TrigramIndex()
+        index.open(dpath)
+        assert len(index) == len(self.names)
+        for pattern in ('%york%', 'york', '%a%', '%', 'par_s', 'nowhere',
+                        '%w%y%', 'a%k%n'):
+            assert index.search(pattern) == self.index.search(pattern), \
+                pattern
+
+    def test_trigram_code(self):
+        codes = {trigram.trigram_code(value) for value in
+                 trigram.trigrams('new york') | trigram.trigrams('york')}
+        assert len(codes) == len(trigram.trigrams('new york') |
+                                 trigram.trigrams('york'))
+        assert trigram.trigram_code('ab') != trigram.trigram_code('\x02ab')
+
+    def test_empty(self):
+        index = trigram.TrigramIndex()
+        assert index.loaded is False
+        assert index.search('%a%') == list()
+
+    def test_update(self):
+        rows = list(enumerate(self.names))
+        index = trigram.TrigramIndex()
+        index.load(rows)
+        index.update([(1, 'Yorktown'), (9, 'Newbury')], [(1, 'York'),
+                                                          (4, 'Newark')])
+        assert len(index) == len(self.names)
+        assert index.search('new%') == [0, 9]
+        assert index.search('york%') == [1, 3]
+        assert index.search('%') == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+
+        # Compacted once the removed values outnumber the others
+        index.update(list(), rows[2:])
+        assert index.search('%') == [0, 1, 9]
+        assert len(index) == 3
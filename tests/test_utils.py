@@ -6,9 +6,15 @@ Test content of the utils.py
 
 # Standard libraries
 import os
+import tempfile
+import zipfile
+
+# pytest
+import pytest
 
 # Globe Indexer
 from globe_indexer import utils
+from globe_indexer.error import GlobeIndexerError
 
 
 class TestParseGeonameTable:
@@ -37,9 +43,62 @@ class TestUtils:
             words = [word.lower() for word in key.split()]
             assert utils.get_query_string(words) == value
 
+    def test_normalize_name(self):
+        values = {
+            "Sant Julià de Lòria": "sant julia de loria",
+            "  München ": "munchen",
+            "Muenchen": "muenchen",
+            "Straße": "strasse",
+            "Los\tAngeles": "los angeles",
+            "": "",
+        }
+        for key, value in values.items():
+            assert utils.normalize_name(key) == value
+
     def test_has_invalid_chars(self):
         for value in ("Jak*", "fooBar", "*", "", "*a*", "*Foo", "***", "Julià"):
             assert utils.has_invalid_chars(value) is False
 
         for value in ("../..", ".", "123.*123"):
             assert utils.has_invalid_chars(value) is True
+
+
+class TestParseGeonameZip:
+    def test_iter_zip_blocks(self):
+        input_fpath = os.path.join(os.path.dirname(__file__), 'data',
+                                   'geoname_example.txt')
+        with tempfile.TemporaryDirectory() as dpath:
+            fpath = os.path.join(dpath, 'cities.zip')
+            with zipfile.ZipFile(fpath, 'w', zipfile.ZIP_DEFLATED) as fout:
+                fout.write(input_fpath, 'cities1000.txt')
+
+            blocks = list(utils.iter_zip_blocks(fpath, 1000))
+            assert len(blocks) > 1
+            assert all(block.endswith('\n') for block in blocks)
+            rows = [row for block in blocks
+                    for row in utils.parse_geoname_table_text(block)]
+            assert rows == utils.parse_geoname_table_file(input_fpath)
+            assert rows[1]['name'] == 'Sant Julià de Lòria'
+            with pytest.raises(GlobeIndexerError):
+                list(utils.iter_zip_blocks(fpath, 1000, member='other.txt'))
+            with pytest.raises(GlobeIndexerError):
+                list(utils.iter_zip_blocks(input_fpath, 1000))
+
+    def test_split_file(self):
+        input_fpath = os.path.join(os.path.dirname(__file__), 'data',
+                                   'geoname_example.txt')
+        with open(input_fpath, 'rb') as fin:
+            data = fin.read()
+
+        for size in (1, 1000, len(data) * 2):
+            chunks = utils.split_file(input_fpath, size)
+            assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+            assert all(end == start for (_, end), (start, _) in
+                       zip(chunks, chunks[1:]))
+            # Chunks hold whole lines
+            assert all(data[end - 1:end] == b'\n' for _, end in chunks)
+            rows = [row for start, end in chunks
+                    for row in utils.parse_geoname_table_text(
+                        data[start:end].decode('utf-8'))]
+            assert rows == utils.parse_geoname_table_file(input_fpath)
+        assert len(utils.split_file(input_fpath, 1)) == 9